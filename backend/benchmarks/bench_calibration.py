@@ -0,0 +1,128 @@
+"""
+Calibration Budget
+--------------------
+Fits a season (92 days) of synthetic Tin, generated by the reference model
+from known parameters plus sensor noise, with calibration.calibrate at its
+defaults, and checks that
+
+1. the fit finishes within --budget seconds, and
+2. every fitted parameter comes back within its tolerance of the true value,
+   with residuals at the noise level,
+
+exiting non-zero otherwise. U_day is passed as known: U_day, U_night and ACH
+all act as conductance to outside and are not separately identifiable from
+Tin alone, so fitting all three would test the data, not the optimizer.
+
+Usage (from backend/):
+    python -m benchmarks.bench_calibration
+    python -m benchmarks.bench_calibration --budget 60 --days 92
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import calibration
+import model
+from weather import synthetic_weather
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────────────────────────────────────
+
+BUDGET_SECONDS = 60.0
+SEASON_DAYS = 92
+NOISE_K = 0.1           # sensor noise added to the reference Tin (1 sigma)
+
+TRUE_PARAMS = {
+    "U_day": 3.0,
+    "U_night": 0.5,
+    "ACH": 1.0,
+    "thermal_mass_kg": 30000.0,
+    "h_am": 5.0,
+    "soil_U": 0.8,
+    "T_mass_init": 12.0,
+    "T_soil_init": 10.0,
+}
+FIT = ["U_night", "ACH", "thermal_mass_kg", "h_am", "soil_U", "T_mass_init", "T_soil_init"]
+
+# relative tolerance, or absolute (K) for the initial temperatures
+TOLERANCES = {
+    "U_night": 0.10,
+    "ACH": 0.10,
+    "thermal_mass_kg": 0.10,
+    "h_am": 0.10,
+    "soil_U": 0.10,
+    "T_mass_init": 1.0,
+    "T_soil_init": 1.0,
+}
+RMSE_FACTOR = 1.5       # residual RMSE may exceed the noise by this much
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CHECK
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run(days: int, budget: float) -> dict:
+    weather_df = synthetic_weather("2023-03-01", 24 * days, seed=3)
+    reference = model.simulate_greenhouse(weather_df, TRUE_PARAMS)
+    rng = np.random.default_rng(1)
+    measured = reference["Tin"].to_numpy() + rng.normal(0.0, NOISE_K, len(weather_df))
+    known = {k: v for k, v in TRUE_PARAMS.items() if k not in FIT}
+
+    t0 = time.perf_counter()
+    result = calibration.calibrate(weather_df, measured, known, fit=FIT)
+    seconds = time.perf_counter() - t0
+
+    print(f"season fit ({days} days, {len(FIT)} parameters, "
+          f"{result['model']['integrator']}/{result['model']['substeps']}, "
+          f"{result['model']['reference_runs']} reference runs)")
+    params = []
+    for name in FIT:
+        true, fitted = TRUE_PARAMS[name], result["fitted"][name]
+        relative = name not in ("T_mass_init", "T_soil_init")
+        error = abs(fitted - true) / true if relative else abs(fitted - true)
+        passed = error <= TOLERANCES[name]
+        params.append({"name": name, "true": true, "fitted": fitted, "error": error, "passed": passed})
+        print(f"  {name:<16} true {true:>10.3f}  fitted {fitted:>10.3f}  "
+              f"{'err' if relative else 'err K'} {error:.3g}" + ("  OK" if passed else "  FAIL"))
+
+    rmse = result["residuals"]["rmse"]
+    rmse_ok = rmse <= RMSE_FACTOR * NOISE_K
+    time_ok = seconds <= budget
+    print(f"  rmse {rmse:.3f} K (noise {NOISE_K})" + ("  OK" if rmse_ok else "  FAIL"))
+    print(f"  time {seconds:.1f} s (budget {budget:.0f} s)" + ("  OK" if time_ok else "  FAIL"))
+
+    return {
+        "days": days,
+        "seconds": seconds,
+        "budget": budget,
+        "rmse": rmse,
+        "iterations": result["iterations"],
+        "model": result["model"],
+        "parameters": params,
+        "passed": time_ok and rmse_ok and all(p["passed"] for p in params),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and check a season-length calibration.")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="allowed wall time (s)")
+    parser.add_argument("--days", type=int, default=SEASON_DAYS, help="length of the synthetic log")
+    parser.add_argument("--out", help="write the report here as JSON")
+    args = parser.parse_args()
+
+    report = run(args.days, args.budget)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved → {args.out}")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Simulation Engine Microbenchmarks
+------------------------------------
+Times simulate_greenhouse, model.simulate_batch and
+calculate_heat_to_threshold across horizon lengths (1 day → 10 years),
+substep counts, batch sizes and integrator modes, on deterministic
+synthetic weather so it runs offline and is comparable between machines
+and commits.
+
+It also checks that the fast modes stay within an accuracy tolerance of
+the reference implementation; a tolerance failure exits non-zero.
+
+Cases predicted (from the per-hour cost of the previous horizon) to take
+longer than --max-seconds are recorded as "skipped" rather than run, so
+the full suite stays a few minutes even though the reference engine at
+10 years would take much longer.
+
+Usage (from backend/):
+    python -m benchmarks.bench_engine --out bench_results.json
+    python -m benchmarks.bench_engine --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_engine --compare benchmarks/baseline.json --threshold 0.25
+    python -m benchmarks.bench_engine --quick          # short horizons only
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import model
+from weather import synthetic_weather
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────────────────────────────────────
+
+HORIZONS = {            # label → hours
+    "1d":  24,
+    "1w":  24 * 7,
+    "1m":  24 * 30,
+    "1y":  24 * 365,
+    "10y": 24 * 3650,
+}
+QUICK_HORIZONS = ["1d", "1w"]
+
+SUBSTEPS = [1, 6, 60]
+BATCH_SIZES = [1, 16, 256]
+FAST_MODES = [          # (integrator, substeps) pairs timed on the batch engine
+    ("euler", 60),
+    ("implicit", 4),
+]
+
+MAX_SECONDS = 30.0      # skip a case predicted to take longer than this
+MIN_TIME = 0.2          # repeat short cases until they have run this long...
+MAX_REPEATS = 5         # ...or this many times, and keep the fastest
+
+# Accuracy of the fast modes vs the reference (Euler, 60 substeps) over ACCURACY_HOURS
+ACCURACY_HOURS = 24 * 14
+TOLERANCES = {
+    "euler":    {"max_abs_Tin": 1e-9, "mean_abs_Tin": 1e-9, "rel_heater_energy": 1e-9},
+    "implicit": {"max_abs_Tin": 1.0,  "mean_abs_Tin": 0.1,  "rel_heater_energy": 0.02},
+}
+
+# A small spread of designs so batches are not all identical
+DESIGNS = [
+    {},
+    {"setpoint": 10.0},
+    {"setpoint": 8.0, "heater_max_w": 1000.0, "thermal_mass_kg": 5000.0},
+    {"setpoint": None, "U_night": 0.6, "V": 250.0, "A_glass": 90.0},
+    {"setpoint": 12.0, "ACH": 1.5, "soil_U": 0.8, "heater_max_w": 8000.0},
+]
+
+
+# Accuracy designs add one whose heater regulates below heater_max_w in most
+# of its heating hours, so rel_heater_energy compares the two heater rules and
+# not just two runs pinned at the cap
+ACCURACY_DESIGNS = DESIGNS + [
+    {"setpoint": 5.0, "heater_max_w": 40000.0, "thermal_mass_kg": 500.0},
+]
+
+
+def designs(n: int) -> list:
+    return [dict(DESIGNS[i % len(DESIGNS)]) for i in range(n)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TIMING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def time_call(fn) -> float:
+    """Best-of-N wall time of fn()."""
+    best = float("inf")
+    total = 0.0
+    for _ in range(MAX_REPEATS):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = min(best, elapsed)
+        total += elapsed
+        if total >= MIN_TIME:
+            break
+    return best
+
+
+def run_case(results: list, name: str, fn, hours: int, batch: int, predicted: float, max_seconds: float, **info):
+    record = {"name": name, "hours": hours, "batch": batch, **info}
+    if predicted > max_seconds:
+        record.update(status="skipped", predicted_seconds=round(predicted, 2))
+    else:
+        seconds = time_call(fn)
+        record.update(
+            status="ok",
+            seconds=seconds,
+            sim_hours_per_s=hours * batch / seconds,
+        )
+    results.append(record)
+    status = f"{record['seconds']:.4f}s" if record["status"] == "ok" else f"skipped (~{predicted:.0f}s)"
+    print(f"  {name:<42} {status}")
+    return record
+
+
+def per_hour(record: dict) -> float:
+    return record["seconds"] / record["hours"] if record["status"] == "ok" else float("inf")
+
+
+def bench_reference(results, horizons, max_seconds):
+    print("simulate_greenhouse (reference)")
+    for substeps in SUBSTEPS:
+        cost = 0.0
+        for label in horizons:
+            hours = HORIZONS[label]
+            weather_df = synthetic_weather("2020-01-01", hours)
+            params = DESIGNS[1]
+            rec = run_case(
+                results, f"reference/{label}/sub={substeps}",
+                lambda: model.simulate_greenhouse(weather_df, params, substeps=substeps),
+                hours, 1, cost * hours, max_seconds,
+                engine="reference", substeps=substeps, integrator="euler",
+            )
+            cost = per_hour(rec)
+
+
+def bench_batch(results, horizons, max_seconds):
+    print("simulate_batch")
+    for integrator, substeps in FAST_MODES:
+        for batch in BATCH_SIZES:
+            cost = 0.0
+            params_list = designs(batch)
+            for label in horizons:
+                hours = HORIZONS[label]
+                weather_df = synthetic_weather("2020-01-01", hours)
+                rec = run_case(
+                    results, f"batch/{integrator}/{label}/sub={substeps}/B={batch}",
+                    lambda: model.simulate_batch(weather_df, params_list, substeps=substeps, integrator=integrator),
+                    hours, batch, cost * hours, max_seconds,
+                    engine="batch", substeps=substeps, integrator=integrator,
+                )
+                cost = per_hour(rec)
+
+
+def bench_heat_to_threshold(results):
+    print("calculate_heat_to_threshold")
+    n_calls = 10000
+    params = {"A_glass": 60.0, "U_day": 2.5, "U_night": 0.3, "V": 150.0, "ACH": 0.6, "current_hour": 3}
+    C_air = model.RHO_AIR * 150.0 * model.CP_AIR
+
+    def calls():
+        for i in range(n_calls):
+            model.calculate_heat_to_threshold(2.0 + i % 7, 6.0, 8.0, 10.0, C_air, 8e7, 2e8, -5.0, params)
+
+    seconds = time_call(calls)
+    results.append({
+        "name": "heat_to_threshold/10k_calls", "engine": "heat_to_threshold", "hours": 0, "batch": n_calls,
+        "status": "ok", "seconds": seconds, "calls_per_s": n_calls / seconds,
+    })
+    print(f"  {'heat_to_threshold/10k_calls':<42} {seconds:.4f}s")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ACCURACY
+# ─────────────────────────────────────────────────────────────────────────────
+
+def check_accuracy() -> list:
+    print("accuracy vs reference")
+    weather_df = synthetic_weather("2020-01-01", ACCURACY_HOURS)
+    params_list = ACCURACY_DESIGNS
+    reference = [model.simulate_greenhouse(weather_df, p) for p in params_list]
+    ref_Tin = np.vstack([r["Tin"].to_numpy() for r in reference])
+    ref_Q = np.vstack([r["Q_heater"].to_numpy() for r in reference])
+
+    checks = []
+    for integrator, substeps in FAST_MODES:
+        out = model.simulate_batch(weather_df, params_list, substeps=substeps, integrator=integrator)
+        err = np.abs(out["Tin"] - ref_Tin)
+        energy_ref = ref_Q.sum(axis=1)
+        energy = out["Q_heater"].sum(axis=1)
+        rel_energy = np.abs(energy - energy_ref) / np.maximum(energy_ref, 1.0)
+
+        metrics = {
+            "max_abs_Tin": float(err.max()),
+            "mean_abs_Tin": float(err.mean()),
+            "rel_heater_energy": float(rel_energy.max()),
+        }
+        tol = TOLERANCES[integrator]
+        passed = all(metrics[k] <= tol[k] for k in tol)
+        checks.append({"integrator": integrator, "substeps": substeps, **metrics, "tolerance": tol, "passed": passed})
+        print(f"  {integrator:<9} sub={substeps:<3} " +
+              "  ".join(f"{k}={v:.3g}" for k, v in metrics.items()) +
+              ("  OK" if passed else "  FAIL"))
+    return checks
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# BASELINE COMPARISON
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    """Cases that got slower than baseline by more than `threshold` (fractional)."""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"] if r.get("status") == "ok"}
+
+    print(f"\ncomparison vs {baseline_path} (threshold +{threshold:.0%})")
+    regressions = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if r.get("status") != "ok" or base is None:
+            continue
+        ratio = r["seconds"] / base["seconds"]
+        flag = ""
+        if ratio > 1.0 + threshold:
+            regressions.append({"name": r["name"], "baseline": base["seconds"], "current": r["seconds"], "ratio": ratio})
+            flag = "  REGRESSION"
+        print(f"  {r['name']:<42} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the greenhouse simulation engine.")
+    parser.add_argument("--out", default="bench_results.json", help="where to write results")
+    parser.add_argument("--save-baseline", help="also write results here as the new baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS, help="skip cases predicted to be slower")
+    parser.add_argument("--quick", action="store_true", help="short horizons only")
+    args = parser.parse_args()
+
+    horizons = QUICK_HORIZONS if args.quick else list(HORIZONS)
+
+    results = []
+    bench_reference(results, horizons, args.max_seconds)
+    bench_batch(results, horizons, args.max_seconds)
+    bench_heat_to_threshold(results)
+    accuracy = check_accuracy()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": str(datetime.now()),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "quick": args.quick,
+        },
+        "results": results,
+        "accuracy": accuracy,
+    }
+
+    failed = not all(c["passed"] for c in accuracy)
+    if args.compare:
+        report["regressions"] = compare(results, args.compare, args.threshold)
+        failed = failed or bool(report["regressions"])
+
+    for path in filter(None, [args.out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved → {path}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Backend Startup Budget
+------------------------
+Measures, in fresh interpreters:
+
+1. import time of main.py (median of --repeat runs), and
+2. time from process start to the first served request, for
+   `uvicorn main:app` and for serve.py (prefork, one worker), and
+3. for serve.py, how soon a re-forked worker serves again after its
+   predecessor is killed — the start-up cost of every worker after the
+   first, since they fork from the preloaded parent (Linux only),
+
+and exits non-zero when the import or first-request time exceeds its
+budget, so a new eager import of a heavy dependency (scipy, sklearn,
+torch) fails the check. `-X importtime` output for the slowest modules is
+printed to show what to make lazy.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --import-budget 0.8 --request-budget 1.2
+"""
+
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Loose enough for a noisy single core, tight enough that one eager import of
+# scipy.stats or sklearn (~0.6 s together) goes over
+IMPORT_BUDGET = 1.0     # seconds to import main
+REQUEST_BUDGET = 1.5    # seconds from `uvicorn main:app` start to the first response
+RESPAWN_BUDGET = 0.25   # seconds for a forked serve.py worker to serve
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env() -> dict:
+    # Throwaway history DB, and no retention pass competing with the first request
+    db = os.path.join(tempfile.mkdtemp(), "startup.json")
+    return {**os.environ, "SIMULATIONS_DB": db, "HISTORY_MAINTENANCE": "0"}
+
+
+def import_time(repeat: int) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(),
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def slowest_imports(n: int = 10) -> list:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                         env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            # Direct imports of main only (one level of nesting below it)
+            if name.startswith("   ") and not name.startswith("    "):
+                rows.append((int(parts[1]) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_response(port: int, t0: float, timeout: float) -> float:
+    while time.perf_counter() - t0 < timeout:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as r:
+                r.read()
+            return time.perf_counter() - t0
+        except OSError:
+            time.sleep(0.002)
+    raise RuntimeError(f"No response on port {port} within {timeout}s")
+
+
+def first_request_time(command: list, port: int, respawn: bool = False, timeout: float = 30.0) -> tuple:
+    """
+    (seconds from launching `command` until GET / on `port` answers, and with
+    `respawn` the seconds from killing its worker until a new one answers).
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=BACKEND_DIR, env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = _wait_for_response(port, t0, timeout)
+        again = None
+        children = f"/proc/{proc.pid}/task/{proc.pid}/children"
+        if respawn and os.path.exists(children):
+            with open(children) as f:
+                worker = int(f.read().split()[0])
+            t1 = time.perf_counter()
+            os.kill(worker, signal.SIGKILL)
+            again = _wait_for_response(port, t1, timeout)
+        return first, again
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check backend import and first-request time against budgets.")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--request-budget", type=float, default=REQUEST_BUDGET)
+    parser.add_argument("--respawn-budget", type=float, default=RESPAWN_BUDGET)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    t_import = import_time(args.repeat)
+    print(f"import main              {t_import:6.3f}s   (budget {args.import_budget}s)")
+
+    port = _free_port()
+    t_uvicorn, _ = first_request_time([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)], port)
+    print(f"uvicorn → first response {t_uvicorn:6.3f}s   (budget {args.request_budget}s)")
+
+    port = _free_port()
+    t_prefork, t_respawn = first_request_time([sys.executable, "serve.py", "--host", "127.0.0.1",
+                                               "--port", str(port), "--workers", "1"], port, respawn=True)
+    print(f"serve.py → first response{t_prefork:6.3f}s   (preloads lazy modules first; not budgeted)")
+    if t_respawn is not None:
+        print(f"serve.py worker respawn  {t_respawn:6.3f}s   (budget {args.respawn_budget}s)")
+
+    print("\nSlowest top-level imports of main:")
+    for seconds, name in slowest_imports():
+        print(f"  {seconds:6.3f}s  {name}")
+
+    failures = []
+    if t_import > args.import_budget:
+        failures.append(f"import main took {t_import:.3f}s > {args.import_budget}s")
+    if t_uvicorn > args.request_budget:
+        failures.append(f"first response took {t_uvicorn:.3f}s > {args.request_budget}s")
+    if t_respawn is not None and t_respawn > args.respawn_budget:
+        failures.append(f"worker respawn took {t_respawn:.3f}s > {args.respawn_budget}s")
+    if failures:
+        print("\nOVER BUDGET: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nWithin budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Parameter calibration against measured greenhouse sensor logs
+----------------------------------------------------------------
+Fits simulate_greenhouse parameters (U_day, U_night, ACH, thermal_mass_kg,
+h_am, soil_U, ...) so the simulated indoor temperature tracks a logged Tin
+series over the same weather.
+
+Method: bounded Levenberg-Marquardt on the hourly Tin residuals. Each
+iteration is ONE batched simulation (model.simulate_batch) holding every
+start's trial point plus a finite-difference perturbation per fitted
+parameter, so the Jacobians of all starts cost little more wall time than a
+single run. The best start is kept. Parameter uncertainty comes from the
+Gauss-Newton covariance at the optimum.
+
+The search runs on a coarse implicit model. Near its optimum the reference
+Euler model is run once, the difference between the two Tin series is added
+to the coarse model as a fixed correction, and the fit is polished from
+there; a couple of such rounds land on the reference optimum while only a
+handful of reference runs are paid for. Residuals are always reported
+against the reference model.
+
+Parameters are fitted in normalized [0, 1] coordinates between PARAM_BOUNDS
+(log-spaced for quantities that span orders of magnitude), which keeps the
+problem well scaled and the bounds trivially enforced.
+"""
+
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+
+import model
+
+DEFAULT_FIT = ["U_day", "U_night", "ACH", "thermal_mass_kg", "h_am", "soil_U", "T_mass_init", "T_soil_init"]
+
+# (low, high) search range for every parameter that can be fitted
+PARAM_BOUNDS = {
+    "U_day":                 (0.3, 10.0),
+    "U_night":               (0.05, 3.0),
+    "ACH":                   (0.02, 5.0),
+    "thermal_mass_kg":       (100.0, 500000.0),
+    "h_am":                  (0.2, 20.0),
+    "h_as":                  (0.1, 10.0),
+    "soil_U":                (0.02, 5.0),
+    "soil_C":                (2e5, 2e7),
+    "A_mass":                (1.0, 500.0),
+    "cp_mass":               (500.0, 4200.0),
+    "V":                     (5.0, 5000.0),
+    "evap_coeff":            (1e-11, 1e-6),
+    "lw_radiation_scale":    (0.05, 1.5),
+    "emissivity":            (0.5, 1.0),
+    "tau_glass":             (0.3, 0.98),
+    "fraction_solar_to_air": (0.05, 0.95),
+    "cloud_factor":          (0.0, 1.0),
+    "T_mass_init":           (-10.0, 40.0),
+    "T_soil_init":           (-10.0, 40.0),
+}
+
+# Fitted on a linear scale; everything else in PARAM_BOUNDS is log-scaled
+LINEAR_PARAMS = {
+    "emissivity", "tau_glass", "fraction_solar_to_air", "cloud_factor",
+    "T_mass_init", "T_soil_init",
+}
+
+FD_STEP = 1e-3      # finite-difference step in normalized coordinates
+# Coarse model the search runs on: implicit with 2 substeps tracks the reference
+# Tin to ~0.03 K mean over a season at a fraction of the cost
+CALIBRATION_SUBSTEPS = 2
+CALIBRATION_INTEGRATOR = "implicit"
+# The update simulate_greenhouse uses; the coarse optimum is refined against it so
+# fitted values reproduce in /run-simulation
+REFERENCE_SUBSTEPS = 60
+REFERENCE_INTEGRATOR = "euler"
+REFINE_ROUNDS = 2   # reference runs spent correcting the coarse optimum (plus one to score it)
+REFINE_CONVERGED = 1e-3  # normalized step below which the correction is considered settled
+# Initial node temperatures fitted whenever the caller neither fits nor gives them
+INITIAL_STATES = ("T_mass_init", "T_soil_init")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COORDINATE TRANSFORMS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _to_unit(name: str, value: float) -> float:
+    lo, hi = PARAM_BOUNDS[name]
+    value = min(max(float(value), lo), hi)
+    if name in LINEAR_PARAMS:
+        return (value - lo) / (hi - lo)
+    return (np.log(value) - np.log(lo)) / (np.log(hi) - np.log(lo))
+
+
+def _from_unit(name: str, z: float) -> float:
+    lo, hi = PARAM_BOUNDS[name]
+    z = min(max(float(z), 0.0), 1.0)
+    if name in LINEAR_PARAMS:
+        return lo + z * (hi - lo)
+    return float(np.exp(np.log(lo) + z * (np.log(hi) - np.log(lo))))
+
+
+def _unit_derivative(name: str, value: float) -> float:
+    # d(value) / dz, used to map the covariance back to physical units
+    lo, hi = PARAM_BOUNDS[name]
+    if name in LINEAR_PARAMS:
+        return hi - lo
+    return value * (np.log(hi) - np.log(lo))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MEASUREMENT ALIGNMENT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def align_measurements(weather_df: pd.DataFrame, measured) -> np.ndarray:
+    """
+    Line measured Tin up with the weather rows.
+
+    `measured` is either a plain list of numbers (one per weather row) or a
+    list of {"datetime": ..., "Tin": ...} records, which are averaged per
+    hour and matched on the weather datetime. Hours without a reading are NaN
+    and ignored by the fit.
+    """
+    if len(measured) == 0:
+        return np.full(len(weather_df), np.nan)
+
+    if not isinstance(measured[0], dict):
+        values = np.array([np.nan if v is None else float(v) for v in measured])
+        if len(values) != len(weather_df):
+            raise ValueError(
+                f"Got {len(values)} measurements for {len(weather_df)} weather rows; "
+                "pass timestamped records to align them by hour"
+            )
+        return values
+
+    m = pd.DataFrame(measured)
+    missing = {"datetime", "Tin"} - set(m.columns)
+    if missing:
+        raise ValueError(f"Measurement records need datetime and Tin, missing {sorted(missing)}")
+    m["datetime"] = pd.to_datetime(m["datetime"]).dt.floor("h")
+    hourly = m.groupby("datetime")["Tin"].mean()
+    hours = pd.to_datetime(weather_df["datetime"]).dt.floor("h")
+    return hours.map(hourly).to_numpy(dtype=float)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LEVENBERG-MARQUARDT (all starts of a group batched; runs inside a worker process)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _params_at(base_params, fit, z):
+    p = dict(base_params)
+    for name, zi in zip(fit, z):
+        p[name] = _from_unit(name, zi)
+    return p
+
+
+def _simulate_tin(weather_df, base_params, fit, z_points, substeps, integrator):
+    """Simulated Tin for every row of z_points in one batch, shape (n_points, n_hours)."""
+    params_list = [_params_at(base_params, fit, z) for z in z_points]
+    out = model.simulate_batch(weather_df, params_list, substeps=substeps, integrator=integrator,
+                               outputs=("Tin",))
+    return out["Tin"]
+
+
+def _jacobian_points(z: np.ndarray) -> np.ndarray:
+    # Forward differences, stepping backwards where the forward step would leave [0, 1]
+    steps = np.where(z + FD_STEP <= 1.0, FD_STEP, -FD_STEP)
+    return np.vstack([z, z + np.diag(steps)]), steps
+
+
+def _levenberg_marquardt(args: tuple) -> list:
+    """
+    Refine a group of starts together: every iteration simulates the trial
+    points and finite-difference perturbations of all still-active starts in
+    one batch. `offset` (per measured hour) is added to the simulated Tin;
+    it carries the reference-model correction during refinement.
+    """
+    weather_df, measured, base_params, fit, starts, max_iter, tol, substeps, integrator, offset = args
+    mask = ~np.isnan(measured)
+    n_fit = len(fit)
+
+    def evaluate(Z):
+        points, steps = zip(*(_jacobian_points(z) for z in Z))
+        tin = _simulate_tin(weather_df, base_params, fit, np.vstack(points), substeps, integrator)
+        R = (tin[:, mask] + offset - measured[mask]).reshape(len(Z), n_fit + 1, -1)
+        r = R[:, 0]
+        J = ((R[:, 1:] - r[:, None]) / np.array(steps)[:, :, None]).transpose(0, 2, 1)
+        return r, J
+
+    Z = np.atleast_2d(np.asarray(starts, dtype=float)).copy()
+    n_runs = len(Z)
+    r, J = evaluate(Z)
+    cost = np.einsum("ij,ij->i", r, r)
+    lam = np.full(n_runs, 1e-2)
+    active = np.ones(n_runs, dtype=bool)
+    iterations = np.zeros(n_runs, dtype=int)
+
+    for n_iter in range(1, max_iter + 1):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        Z_new = np.empty((idx.size, n_fit))
+        for k, i in enumerate(idx):
+            A = J[i].T @ J[i]
+            g = J[i].T @ r[i]
+            step = np.linalg.solve(A + lam[i] * np.diag(np.diag(A) + 1e-12), -g)
+            Z_new[k] = np.clip(Z[i] + step, 0.0, 1.0)
+
+        r_new, J_new = evaluate(Z_new)
+        cost_new = np.einsum("ij,ij->i", r_new, r_new)
+
+        for k, i in enumerate(idx):
+            iterations[i] = n_iter
+            if cost_new[k] < cost[i]:
+                improvement = (cost[i] - cost_new[k]) / max(cost[i], 1e-12)
+                Z[i], r[i], J[i], cost[i] = Z_new[k], r_new[k], J_new[k], cost_new[k]
+                lam[i] = max(lam[i] / 3.0, 1e-7)
+                if improvement < tol:
+                    active[i] = False
+            else:
+                lam[i] *= 4.0
+                if lam[i] > 1e7:
+                    active[i] = False
+
+    return [
+        {"z": Z[i], "residuals": r[i], "jacobian": J[i], "cost": float(cost[i]), "iterations": int(iterations[i])}
+        for i in range(n_runs)
+    ]
+
+
+def _refine(weather_df, measured, params, fit, best, max_iter, tol, substeps, integrator):
+    """
+    Move the coarse optimum onto the reference model. Each round runs the
+    reference model once at the current point and refits the coarse model
+    with the Tin difference added as a fixed correction; the residuals of
+    the returned fit are those of the reference model itself.
+    """
+    mask = ~np.isnan(measured)
+    z = best["z"]
+    iterations = best["iterations"]
+    reference_runs = 0
+    for _ in range(REFINE_ROUNDS):
+        reference = _simulate_tin(weather_df, params, fit, [z], REFERENCE_SUBSTEPS, REFERENCE_INTEGRATOR)[0]
+        coarse = _simulate_tin(weather_df, params, fit, [z], substeps, integrator)[0]
+        reference_runs += 1
+        offset = (reference - coarse)[mask]
+        best = _levenberg_marquardt(
+            (weather_df, measured, params, fit, [z], max_iter, tol, substeps, integrator, offset)
+        )[0]
+        iterations += best["iterations"]
+        moved = float(np.max(np.abs(best["z"] - z)))
+        z = best["z"]
+        if moved < REFINE_CONVERGED:
+            break
+
+    reference = _simulate_tin(weather_df, params, fit, [z], REFERENCE_SUBSTEPS, REFERENCE_INTEGRATOR)[0]
+    reference_runs += 1
+    r = reference[mask] - measured[mask]
+    return {**best, "residuals": r, "cost": float(r @ r), "iterations": iterations,
+            "reference_runs": reference_runs}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PUBLIC API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def calibrate(weather_df: pd.DataFrame, measured_tin, params: dict = None, fit: list = None,
+              n_starts: int = 4, max_iter: int = 25, tol: float = 1e-4, seed: int = 0,
+              substeps: int = CALIBRATION_SUBSTEPS, integrator: str = CALIBRATION_INTEGRATOR,
+              refine: bool = True, n_workers: int = None) -> dict:
+    """
+    Fit `fit` parameters so simulated Tin matches `measured_tin`.
+
+    `params` holds the known design values (anything not fitted is kept as
+    given; T_mass_init and T_soil_init are fitted unless given). The first
+    start is `params` itself, the rest are spread randomly over PARAM_BOUNDS.
+    The search runs on the `integrator`/`substeps` model; with `refine` (and
+    a model other than the reference) the optimum is then corrected onto the
+    reference Euler model. Starts are split into `n_workers` groups (default
+    1: batching the starts in one process is already cheap). Returns fitted values, 1-sigma uncertainties, 95%
+    intervals, the parameter correlation matrix, and residual statistics.
+    """
+    params = dict(params or {})
+    fit = list(fit or DEFAULT_FIT)
+    unknown = [name for name in fit if name not in PARAM_BOUNDS]
+    if unknown:
+        raise ValueError(f"Cannot calibrate {unknown}; supported: {sorted(PARAM_BOUNDS)}")
+
+    # The mass and soil would start at the first reading like the air node, but their
+    # real starting state is unknown and the soil remembers it for weeks
+    fit += [name for name in INITIAL_STATES if name not in fit and name not in params]
+
+    measured = np.asarray(measured_tin, dtype=float)
+    mask = ~np.isnan(measured)
+    n_obs = int(mask.sum())
+    if n_obs <= len(fit):
+        raise ValueError(f"Need more than {len(fit)} measured hours to fit {len(fit)} parameters, got {n_obs}")
+
+    # Start the air node at the first reading unless told otherwise
+    if "T_init" not in params:
+        params["T_init"] = float(measured[mask][0])
+
+    rng = np.random.default_rng(seed)
+    start_given = [_to_unit(name, params.get(name, model.PARAM_DEFAULTS.get(name, params["T_init"]))) for name in fit]
+    starts = [np.array(start_given)] + [rng.uniform(0.05, 0.95, len(fit)) for _ in range(max(0, n_starts - 1))]
+
+    n_workers = min(len(starts), n_workers or 1)
+    groups = [g for g in np.array_split(np.array(starts), n_workers) if len(g)]
+    no_offset = np.zeros(n_obs)
+    jobs = [(weather_df, measured, params, fit, g, max_iter, tol, substeps, integrator, no_offset) for g in groups]
+    if len(jobs) > 1:
+        with Pool(processes=len(jobs)) as pool:
+            results = [res for group in pool.map(_levenberg_marquardt, jobs) for res in group]
+    else:
+        results = _levenberg_marquardt(jobs[0])
+
+    best = min(results, key=lambda res: res["cost"])
+    reference_runs = 0
+    if refine and (integrator, substeps) != (REFERENCE_INTEGRATOR, REFERENCE_SUBSTEPS):
+        best = _refine(weather_df, measured, params, fit, best, max_iter, tol, substeps, integrator)
+        reference_runs = best["reference_runs"]
+    fitted = {name: _from_unit(name, zi) for name, zi in zip(fit, best["z"])}
+
+    # Gauss-Newton covariance in normalized coordinates, mapped to physical units
+    r, J = best["residuals"], best["jacobian"]
+    dof = max(1, n_obs - len(fit))
+    sigma2 = float(r @ r) / dof
+    cov_z = sigma2 * np.linalg.pinv(J.T @ J)
+    std_z = np.sqrt(np.clip(np.diag(cov_z), 0.0, None))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov_z / np.outer(std_z, std_z)
+
+    uncertainty = {}
+    for i, name in enumerate(fit):
+        uncertainty[name] = {
+            "std": float(abs(_unit_derivative(name, fitted[name])) * std_z[i]),
+            "ci95": [
+                _from_unit(name, best["z"][i] - 1.96 * std_z[i]),
+                _from_unit(name, best["z"][i] + 1.96 * std_z[i]),
+            ],
+        }
+
+    simulated = np.full(len(measured), np.nan)
+    simulated[mask] = measured[mask] + r
+    return {
+        "fitted": fitted,
+        "uncertainty": uncertainty,
+        "correlation": {
+            name: {other: float(np.nan_to_num(corr[i, j])) for j, other in enumerate(fit)}
+            for i, name in enumerate(fit)
+        },
+        "residuals": {
+            "rmse": float(np.sqrt(np.mean(r**2))),
+            "mae": float(np.mean(np.abs(r))),
+            "bias": float(np.mean(r)),
+            "max_abs": float(np.max(np.abs(r))),
+            "n_points": n_obs,
+            "series": [None if np.isnan(v) else float(v) for v in simulated - measured],
+        },
+        "iterations": best["iterations"],
+        "n_starts": len(starts),
+        "model": {"integrator": integrator, "substeps": substeps, "reference_runs": reference_runs},
+        "parameters": {**params, **fitted},
+    }
@@ -0,0 +1,326 @@
+"""
+Cross-run comparison
+----------------------
+Compares many stored runs in one pass: per-run heater energy, Tin mean and
+minimum and hours below a threshold, each run's Tin and energy against a
+baseline run on a common time axis, and a table ranked by any of them.
+
+The history store is one JSON document, so reading any column of any run
+means parsing every row of every run. Comparisons therefore go through a
+column cache next to it (<DB_PATH>.columns/): one uncompressed .npz per
+run holding only the columns compared here, written the first time a run
+is compared. An .npz member is read only when asked for, so a comparison
+touches a few hundred kB per annual run. An in-memory index of the runs
+(every field but the rows) is rebuilt only when the store file's size or
+modification time changes; a run compacted or rewritten since gets a new
+cache file because the file name includes its run_at and resolution.
+Cache files of runs no longer in the store are removed at that point;
+another worker may do so between a file's check and its read, in which
+case the file is simply filled again.
+
+A missing cache file is filled from the run's stored rows, read from the
+store by id (the index holds no rows). Only runs stored with
+storage="inputs" are re-simulated to fill it. Daily-compacted runs are
+compared at daily resolution, and hourly runs are averaged to days to
+match when both kinds are selected.
+"""
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import rollups
+import run_store
+
+MAX_RUNS = 200
+METRICS = ("heater_kwh", "Tin_mean", "Tin_min", "cold_hours", "delta_heater_kwh", "delta_cold_hours",
+           "Tin_diff_mean", "Tin_diff_mae", "Tin_diff_max", "Tin_diff_rmse")
+
+_index = {"stat": None, "runs": {}}
+_index_lock = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COLUMN CACHE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cache_name(doc_id: int, doc: dict) -> str:
+    tag = hashlib.sha1(f"{doc.get('run_at')}|{doc.get('resolution', 'hourly')}".encode()).hexdigest()[:10]
+    return f"{doc_id}-{tag}.npz"
+
+
+def _extract_columns(rows: list, resolution: str) -> dict:
+    """The compared columns of a run's rows as arrays; time is whole hours since the epoch."""
+    if not rows:
+        raise ValueError("A selected run has no rows to compare")
+    df = pd.DataFrame(rows)
+    t = pd.to_datetime(df["datetime"]).to_numpy().astype("datetime64[h]").astype(np.int64)
+    cols = {
+        "time": t,
+        "Tin": df["Tin"].to_numpy(dtype=float),
+        "Q_heater": df["Q_heater"].to_numpy(dtype=float),
+    }
+    if resolution == "daily":
+        cols["hours"] = df["hours"].to_numpy(dtype=float)
+        cols["Tin_min"] = df["Tin_min"].to_numpy(dtype=float)
+        for t in rollups.DEFAULT_THRESHOLDS:
+            name = rollups.threshold_column(t)
+            if name in df:
+                cols[name] = df[name].to_numpy(dtype=float)
+    return cols
+
+
+def refresh_index(table, lock, db_path: str, columns_dir: str) -> dict:
+    """The run index, re-read from the store only if the store file changed."""
+    with _index_lock:
+        stat = _stat(db_path)
+        if stat is not None and stat == _index["stat"]:
+            return _index["runs"]
+
+        os.makedirs(columns_dir, exist_ok=True)
+        with lock:
+            stat = _stat(db_path)
+            docs = table.all()
+        runs = {}
+        for doc in docs:
+            name = _cache_name(doc.doc_id, doc)
+            path = os.path.join(columns_dir, name)
+            # Documents holding rows are in memory right now: cache their columns while we have them
+            if doc.get("rows") and not os.path.exists(path):
+                _write_columns(path, _extract_columns(doc["rows"], doc.get("resolution", "hourly")))
+            runs[doc.doc_id] = {**{k: v for k, v in doc.items() if k != "rows"}, "id": doc.doc_id, "columns": name}
+
+        # Runs inserted after our read (by another worker) have higher ids: leave their files alone
+        keep = {r["columns"] for r in runs.values()}
+        newest = max(runs, default=0)
+        for name in os.listdir(columns_dir):
+            doc_id = name.split("-")[0]
+            if not name.endswith(".npz") or name in keep or (doc_id.isdigit() and int(doc_id) > newest):
+                continue
+            try:
+                os.remove(os.path.join(columns_dir, name))
+            except FileNotFoundError:
+                pass
+
+        _index.update(stat=stat, runs=runs)
+        return runs
+
+
+def _write_columns(path: str, cols: dict):
+    # Per-writer temporary name without the .npz suffix, so neither a concurrent writer nor cleanup touches it
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **cols)
+    os.replace(tmp, path)
+
+
+def _run_columns(entry: dict, table, lock) -> dict:
+    resolution = entry.get("resolution", "hourly")
+    if entry.get("storage", "full") == "inputs":
+        rows, _ = run_store.materialize(entry)
+        return _extract_columns(rows, resolution)
+    with lock:
+        doc = table.get(doc_id=entry["id"])
+    if doc is None:
+        raise ValueError(f"Run {entry['id']} is no longer stored")
+    return _extract_columns(doc.get("rows", []), doc.get("resolution", "hourly"))
+
+
+def load_columns(entry: dict, columns_dir: str, names: tuple, table, lock) -> dict:
+    """
+    Requested columns of one indexed run (those it has). A missing cache
+    file is filled from the run's stored rows in `table`, or by
+    re-simulating input-only runs.
+    """
+    path = os.path.join(columns_dir, entry["columns"])
+    try:
+        with np.load(path) as npz:
+            return {k: npz[k] for k in names if k in npz.files}
+    except FileNotFoundError:
+        pass
+    cols = _run_columns(entry, table, lock)
+    _write_columns(path, cols)
+    return {k: cols[k] for k in names if k in cols}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SELECTION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def select_runs(runs: dict, run_ids: list = None, filter: dict = None) -> list:
+    """
+    Index entries by id (in the given order) or by filter: name (substring),
+    location ({lat, lon}), start_date/end_date (exact), since/until (run_at).
+    """
+    if run_ids:
+        missing = [i for i in run_ids if int(i) not in runs]
+        if missing:
+            raise ValueError(f"Runs not found: {missing}")
+        selected = [runs[int(i)] for i in run_ids]
+    else:
+        f = filter or {}
+        selected = []
+        for r in sorted(runs.values(), key=lambda r: r["id"]):
+            if "name" in f and str(f["name"]).lower() not in str(r.get("name", "")).lower():
+                continue
+            if "location" in f and {k: r["location"].get(k) for k in ("lat", "lon")} != {
+                    k: f["location"].get(k) for k in ("lat", "lon")}:
+                continue
+            if any(k in f and r.get(k) != f[k] for k in ("start_date", "end_date")):
+                continue
+            if "since" in f and r.get("run_at", "") < f["since"]:
+                continue
+            if "until" in f and r.get("run_at", "") > f["until"]:
+                continue
+            selected.append(r)
+
+    if len(selected) < 2:
+        raise ValueError("Select at least two runs to compare")
+    if len(selected) > MAX_RUNS:
+        raise ValueError(f"At most {MAX_RUNS} runs per comparison ({len(selected)} selected)")
+    return selected
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMPARISON
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _to_daily(cols: dict, threshold: float) -> dict:
+    # Hour-weighted daily means of hourly columns, as rollups.daily_rows would store them
+    day = cols["time"] // 24
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    hours = np.diff(np.r_[starts, len(day)]).astype(float)
+    return {
+        "time": day[starts] * 24,
+        "hours": hours,
+        "Tin": np.add.reduceat(cols["Tin"], starts) / hours,
+        "Tin_min": np.minimum.reduceat(cols["Tin"], starts),
+        "Q_heater": np.add.reduceat(cols["Q_heater"], starts) / hours,
+        "cold": np.add.reduceat((cols["Tin"] < threshold).astype(float), starts),
+    }
+
+
+def _prepare(cols: dict, daily: bool, threshold: float) -> dict:
+    if "hours" not in cols:
+        if daily:
+            return _to_daily(cols, threshold)
+        return {**cols, "hours": np.ones(len(cols["Tin"])), "Tin_min": cols["Tin"],
+                "cold": (cols["Tin"] < threshold).astype(float)}
+    name = rollups.threshold_column(threshold)
+    if name not in cols:
+        raise ValueError(f"Daily-compacted runs only have cold hours for thresholds {rollups.DEFAULT_THRESHOLDS}")
+    return {**cols, "cold": cols[name]}
+
+
+def compare_columns(columns: list, threshold: float = 5.0, baseline: int = 0, align: str = "time") -> dict:
+    """
+    Metrics for runs given as column dicts (load_columns output), on a
+    common axis: the timestamps every run has (align="time") or the first
+    N rows of each (align="index", e.g. the same season in different
+    years). Returns {"metrics": {name: (runs,) array}, "time": axis}.
+    """
+    daily = any("hours" in c for c in columns)
+    runs = [_prepare(c, daily, threshold) for c in columns]
+
+    if align == "time":
+        common = runs[0]["time"]
+        for r in runs[1:]:
+            common = np.intersect1d(common, r["time"], assume_unique=True)
+        if len(common) == 0:
+            raise ValueError("The runs share no timestamps; use align='index' to compare them by position")
+        picks = [np.searchsorted(r["time"], common) for r in runs]
+    elif align == "index":
+        n = min(len(r["time"]) for r in runs)
+        common = runs[0]["time"][:n]
+        picks = [np.arange(n)] * len(runs)
+    else:
+        raise ValueError(f"Unknown align '{align}', expected 'time' or 'index'")
+
+    def stack(key):
+        return np.stack([r[key][p] for r, p in zip(runs, picks)])
+
+    hours, Tin, Q = stack("hours"), stack("Tin"), stack("Q_heater")
+    heater_kwh = (Q * hours).sum(axis=1) / 1000.0       # rows are mean watts over `hours`
+    cold = stack("cold").sum(axis=1)
+    diff = Tin - Tin[baseline]
+    w = hours / hours.sum(axis=1, keepdims=True)
+
+    metrics = {
+        "heater_kwh": heater_kwh,
+        "Tin_mean": (Tin * w).sum(axis=1),
+        "Tin_min": stack("Tin_min").min(axis=1),
+        "cold_hours": cold,
+        "delta_heater_kwh": heater_kwh - heater_kwh[baseline],
+        "delta_cold_hours": cold - cold[baseline],
+        "Tin_diff_mean": (diff * w).sum(axis=1),
+        "Tin_diff_mae": (np.abs(diff) * w).sum(axis=1),
+        "Tin_diff_max": np.abs(diff).max(axis=1),
+        "Tin_diff_rmse": np.sqrt((diff ** 2 * w).sum(axis=1)),
+    }
+    return {"metrics": metrics, "time": common, "daily": daily, "Tin": Tin}
+
+
+def compare(table, lock, db_path: str, columns_dir: str, run_ids: list = None, filter: dict = None,
+            threshold: float = 5.0, baseline: int = None, rank_by: str = "heater_kwh", descending: bool = False,
+            align: str = "time", include_series: bool = False) -> dict:
+    """Select, load and compare stored runs; the first selected run is the baseline unless one is given."""
+    if rank_by not in METRICS:
+        raise ValueError(f"Unknown rank_by '{rank_by}', expected one of {list(METRICS)}")
+    runs = refresh_index(table, lock, db_path, columns_dir)
+    selected = select_runs(runs, run_ids, filter)
+    ids = [r["id"] for r in selected]
+    if baseline is not None and int(baseline) not in ids:
+        raise ValueError("The baseline run must be one of the compared runs")
+    b = ids.index(int(baseline)) if baseline is not None else 0
+
+    names = ("time", "hours", "Tin", "Tin_min", "Q_heater") + tuple(
+        rollups.threshold_column(t) for t in rollups.DEFAULT_THRESHOLDS)
+    columns = [load_columns(r, columns_dir, names, table, lock) for r in selected]
+    result = compare_columns(columns, threshold=threshold, baseline=b, align=align)
+
+    metrics = result["metrics"]
+    order = np.argsort(metrics[rank_by], kind="stable")
+    if descending:
+        order = order[::-1]
+    table_rows = []
+    for rank, i in enumerate(order, start=1):
+        r = selected[i]
+        table_rows.append({
+            "rank": rank,
+            "id": r["id"],
+            "name": r.get("name"),
+            "location": r.get("location"),
+            "start_date": r.get("start_date"),
+            "end_date": r.get("end_date"),
+            **{k: round(float(v[i]), 4) for k, v in metrics.items()},
+        })
+
+    response = {
+        "baseline": ids[b],
+        "resolution": "daily" if result["daily"] else "hourly",
+        "aligned_rows": int(len(result["time"])),
+        "period": [str(np.datetime64(int(result["time"][0]), "h")), str(np.datetime64(int(result["time"][-1]), "h"))],
+        "ranking": table_rows,
+    }
+    if include_series:
+        # Daily mean Tin difference to the baseline: small enough to chart for every run
+        day = result["time"] // 24
+        starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        diff = result["Tin"] - result["Tin"][b]
+        means = np.add.reduceat(diff, starts, axis=1) / np.diff(np.r_[starts, len(day)])
+        response["series"] = {
+            "date": [str(np.datetime64(int(d), "D")) for d in day[starts]],
+            "Tin_diff": {str(i): np.round(means[k], 3).tolist() for k, i in enumerate(ids)},
+        }
+    return response
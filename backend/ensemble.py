@@ -0,0 +1,221 @@
+"""
+Monte Carlo ensembles
+-----------------------
+One simulate_greenhouse run hides how much its answer depends on inputs
+nobody knows exactly: cloudiness, night-time glazing losses, air leakage,
+and which year's weather the greenhouse actually gets. An ensemble draws
+those inputs from distributions, pairs each member with one of several
+historical weather years, and reports per-hour percentile bands (e.g.
+P10/P50/P90 of Tin) plus percentiles of each member's annual summary.
+
+Members run through model.simulate_batch in chunks (each member with
+its own weather year), and each chunk's hourly outputs are folded into a
+histogram sketch and then discarded. Memory therefore depends on the
+period length and the chunk size, not on the number of members. The sketch counts values in BINS
+equal bins over a fixed range, with separate counts for values sitting
+exactly at either end (heater off, temperature at its bound), so
+quantiles are exact there and within one bin width elsewhere (0.125 K for
+temperatures, heater_max_w / 400 for heat). Sketches from separate runs
+merge by adding their counts.
+
+Distribution specs, per parameter:
+    {"dist": "uniform", "low": 0.2, "high": 0.8}
+    {"dist": "normal", "mean": 0.5, "sd": 0.1}
+    {"dist": "lognormal", "median": 0.25, "sigma": 0.3}     # median defaults to the base value
+    {"dist": "triangular", "low": 0.3, "mode": 0.5, "high": 1.0}
+each optionally with "min"/"max" to clip the draws.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import model
+from weather import get_archive_weather
+
+DISTRIBUTIONS = {
+    "cloud_factor": {"dist": "uniform", "low": 0.2, "high": 0.8},
+    "U_night": {"dist": "lognormal", "sigma": 0.3},
+    "ACH": {"dist": "lognormal", "sigma": 0.4},
+}
+QUANTILES = (0.1, 0.5, 0.9)
+CHANNELS = ("Tin", "Q_heater")
+MAX_MEMBERS = 5000
+CHUNK_SIZE = 500        # members per simulate_batch call; bounds the (members × hours) outputs held at once
+BINS = 400
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SAMPLING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def sample_parameters(base: dict, distributions: dict, n: int, rng: np.random.Generator) -> list:
+    """`n` copies of `base` with each parameter in `distributions` drawn independently."""
+    draws = {}
+    for name, spec in distributions.items():
+        dist = spec.get("dist", "uniform")
+        default = base.get(name, model.PARAM_DEFAULTS.get(name))
+        if dist == "uniform":
+            x = rng.uniform(float(spec["low"]), float(spec["high"]), n)
+        elif dist == "normal":
+            x = rng.normal(float(spec.get("mean", default)), float(spec["sd"]), n)
+        elif dist == "lognormal":
+            x = float(spec.get("median", default)) * np.exp(rng.normal(0.0, float(spec["sigma"]), n))
+        elif dist == "triangular":
+            x = rng.triangular(float(spec["low"]), float(spec["mode"]), float(spec["high"]), n)
+        else:
+            raise ValueError(f"Unknown distribution '{dist}' for {name}")
+        draws[name] = np.clip(x, spec.get("min", -np.inf), spec.get("max", np.inf))
+    return [{**base, **{name: float(x[i]) for name, x in draws.items()}} for i in range(n)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# WEATHER YEARS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def fetch_years(location: dict, start_date: str, end_date: str, years: list) -> list:
+    """Archive weather for the start_date..end_date window shifted into each of `years`."""
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+
+    def shifted(year):
+        offset = pd.DateOffset(years=int(year) - start.year)
+        return get_archive_weather(location, str((start + offset).date()), str((end + offset).date()))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(years)))) as pool:
+        return list(pool.map(shifted, years))
+
+
+def align_years(frames: list) -> list:
+    """Drop 29 February and cut every year to the shortest, so all members share one hourly axis."""
+    aligned = []
+    for df in frames:
+        dt = pd.to_datetime(df["datetime"])
+        aligned.append(df[~((dt.dt.month == 2) & (dt.dt.day == 29))].reset_index(drop=True))
+    n = min(len(df) for df in aligned)
+    return [df.iloc[:n].reset_index(drop=True) for df in aligned]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# HOURLY QUANTILE SKETCH
+# ─────────────────────────────────────────────────────────────────────────────
+
+def new_sketch(n_hours: int, lo: float, hi: float, bins: int = BINS) -> dict:
+    # Column 0 counts values <= lo, column bins+1 values >= hi, the rest equal bins in between
+    return {"lo": float(lo), "hi": float(hi), "bins": bins, "n": 0,
+            "counts": np.zeros((n_hours, bins + 2), dtype=np.int32)}
+
+
+def add_to_sketch(sketch: dict, values: np.ndarray):
+    """Fold a (members × hours) block into the sketch."""
+    lo, hi, bins = sketch["lo"], sketch["hi"], sketch["bins"]
+    n_members, n_hours = values.shape
+    col = np.clip(((values - lo) / (hi - lo) * bins).astype(np.int64) + 1, 1, bins)
+    col[values <= lo] = 0
+    col[values >= hi] = bins + 1
+    flat = (np.arange(n_hours) * (bins + 2) + col).ravel()
+    sketch["counts"] += np.bincount(flat, minlength=n_hours * (bins + 2)).reshape(n_hours, bins + 2).astype(np.int32)
+    sketch["n"] += n_members
+
+
+def merge_sketches(a: dict, b: dict) -> dict:
+    if (a["lo"], a["hi"], a["bins"]) != (b["lo"], b["hi"], b["bins"]) or a["counts"].shape != b["counts"].shape:
+        raise ValueError("Sketches with different ranges or lengths cannot be merged")
+    return {**a, "n": a["n"] + b["n"], "counts": a["counts"] + b["counts"]}
+
+
+def sketch_quantiles(sketch: dict, quantiles) -> dict:
+    """{q: per-hour values}, interpolating linearly inside the bin holding the q-th member."""
+    lo, hi, bins, counts = sketch["lo"], sketch["hi"], sketch["bins"], sketch["counts"]
+    width = (hi - lo) / bins
+    cum = np.cumsum(counts, axis=1)
+    rows = np.arange(len(counts))
+    out = {}
+    for q in quantiles:
+        rank = np.maximum(q * sketch["n"], 1e-9)
+        col = np.minimum((cum < rank).sum(axis=1), bins + 1)
+        below = np.where(col > 0, cum[rows, np.maximum(col - 1, 0)], 0)
+        frac = (rank - below) / np.maximum(counts[rows, col], 1)
+        value = lo + (col - 1 + frac) * width
+        out[q] = np.where(col == 0, lo, np.where(col == bins + 1, hi, value))
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ENSEMBLE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _label(q: float) -> str:
+    return f"P{100 * q:g}"
+
+
+def run_ensemble(weather_frames: list, params: dict, distributions: dict = None, n_members: int = 1000,
+                 quantiles=QUANTILES, channels=CHANNELS, threshold: float = 5.0, seed: int = 0,
+                 substeps: int = 4, integrator: str = "implicit", T_bounds=(0, 50),
+                 chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    `n_members` runs of `params` with the `distributions` parameters drawn
+    at random, member i getting weather_frames[i % len(weather_frames)].
+    Returns per-hour bands for each channel and percentiles of every
+    member's summary (heater kWh, Tin minimum and mean, hours below
+    `threshold`). The implicit integrator keeps 1000 annual members to
+    seconds and follows the reference heater rule (heater energy within a
+    few tenths of a percent in benchmarks/bench_engine.py);
+    integrator="euler", substeps=60 runs the reference model itself. The
+    result names the integrator used.
+    """
+    if not 1 <= n_members <= MAX_MEMBERS:
+        raise ValueError(f"n_members must be between 1 and {MAX_MEMBERS}")
+    if not weather_frames or any(df.empty for df in weather_frames):
+        raise ValueError("No weather data for one of the requested years")
+    unknown = [c for c in channels if c not in ("Tin", "T_mass", "T_soil", "Q_heater", "Q_latent")]
+    if unknown:
+        raise ValueError(f"Unknown channels {unknown}")
+
+    frames = align_years(weather_frames) if len(weather_frames) > 1 else weather_frames
+    n_hours = len(frames[0])
+    rng = np.random.default_rng(seed)
+    distributions = DISTRIBUTIONS if distributions is None else distributions
+    members = sample_parameters(params, distributions, n_members, rng)
+
+    heater_max = max(m.get("heater_max_w", model.PARAM_DEFAULTS["heater_max_w"]) for m in members)
+    ranges = {"Q_heater": (0.0, heater_max), "Q_latent": (0.0, None)}
+    sketches = {}
+    for c in channels:
+        lo, hi = ranges.get(c, T_bounds)
+        sketches[c] = None if hi is None else new_sketch(n_hours, lo, hi)
+
+    summaries = {k: np.zeros(n_members) for k in ("heater_kwh", "Tin_min", "Tin_mean", "hours_below_threshold")}
+    recorded = set(channels) | {"Tin", "Q_heater"}
+    for start in range(0, n_members, chunk_size):
+        chunk = np.arange(start, min(start + chunk_size, n_members))
+        # Chunks mix weather years (per-member weather), so the number of
+        # simulate_batch calls depends only on n_members / chunk_size
+        out = model.simulate_batch([frames[i % len(frames)] for i in chunk], [members[i] for i in chunk],
+                                   substeps=substeps, T_bounds=T_bounds, integrator=integrator, outputs=recorded)
+        for c in channels:
+            if sketches[c] is None:
+                # Latent heat has no natural upper bound: size the range from the first chunk
+                sketches[c] = new_sketch(n_hours, 0.0, 2.0 * float(out[c].max()) or 1.0)
+            add_to_sketch(sketches[c], out[c])
+        summaries["heater_kwh"][chunk] = out["Q_heater"].sum(axis=1) / 1000.0     # hourly W → kWh
+        summaries["Tin_min"][chunk] = out["Tin"].min(axis=1)
+        summaries["Tin_mean"][chunk] = out["Tin"].mean(axis=1)
+        summaries["hours_below_threshold"][chunk] = (out["Tin"] < threshold).sum(axis=1)
+        del out
+
+    bands = {}
+    for c, sketch in sketches.items():
+        bands[c] = {_label(q): np.round(v, 3).tolist() for q, v in sketch_quantiles(sketch, quantiles).items()}
+    return {
+        "n_members": n_members,
+        "hours": n_hours,
+        "datetime": frames[0]["datetime"].astype(str).tolist() if "datetime" in frames[0] else None,
+        "bands": bands,
+        "summary": {
+            k: {_label(q): float(np.quantile(v, q)) for q in quantiles} for k, v in summaries.items()
+        },
+        "distributions": distributions,
+        "integrator": integrator,
+        "substeps": substeps,
+    }
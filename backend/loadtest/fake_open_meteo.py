@@ -0,0 +1,125 @@
+"""
+Local Open-Meteo stand-in
+----------------------------
+Serves deterministic hourly weather in the Open-Meteo JSON shape on
+/v1/forecast and /v1/archive, so the backend can be load tested offline and
+reproducibly. Each (lat, lon) gets its own fixed series from
+weather.synthetic_weather.
+
+Latency and failures can be injected to see how the backend behaves when
+the upstream is slow or flaky.
+
+Usage (from backend/):
+    python -m loadtest.fake_open_meteo --port 8999 --latency-ms 150 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from weather import synthetic_weather
+
+
+def hourly_payload(lat: float, lon: float, start_date: str, end_date: str) -> dict:
+    start = pd.Timestamp(start_date)
+    hours = int((pd.Timestamp(end_date) - start).days + 1) * 24
+    seed = zlib.crc32(f"{lat:.4f},{lon:.4f}".encode())
+    # Anchor the series at Jan 1 so overlapping requests see the same values
+    anchor = pd.Timestamp(year=start.year, month=1, day=1)
+    offset = int((start - anchor) / pd.Timedelta(hours=1))
+    df = synthetic_weather(str(anchor.date()), offset + hours, lat=lat, seed=seed).iloc[offset:]
+
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": {
+            "time": df["datetime"].dt.strftime("%Y-%m-%dT%H:%M").tolist(),
+            "temperature_2m": df["Tout"].round(1).tolist(),
+            "shortwave_radiation": df["G"].round(1).tolist(),
+            "relativehumidity_2m": (df["RH"] * 100).round().tolist(),
+        },
+    }
+
+
+class FakeOpenMeteo(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests_served = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.rng_lock:
+            delay = max(0.0, server.latency_ms + server.rng.uniform(-server.jitter_ms, server.jitter_ms))
+            fail = server.rng.random() < server.error_rate
+            server.requests_served += 1
+        time.sleep(delay / 1000.0)
+
+        url = urlparse(self.path)
+        if url.path not in ("/v1/forecast", "/v1/archive"):
+            return self._send(404, {"error": True, "reason": "not found"})
+        if fail:
+            return self._send(500, {"error": True, "reason": "injected failure"})
+
+        q = parse_qs(url.query)
+        try:
+            payload = hourly_payload(
+                float(q["latitude"][0]), float(q["longitude"][0]),
+                q["start_date"][0], q["end_date"][0],
+            )
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"error": True, "reason": str(e)})
+        self._send(200, payload)
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_in_thread(port=0, **kwargs) -> FakeOpenMeteo:
+    """Start the stand-in on a background thread; port 0 picks a free port (see server.server_port)."""
+    server = FakeOpenMeteo(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic local Open-Meteo stand-in.")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOpenMeteo(
+        ("127.0.0.1", args.port),
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+    )
+    print(f"Fake Open-Meteo on http://127.0.0.1:{args.port}/v1/forecast")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
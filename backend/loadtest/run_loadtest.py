@@ -0,0 +1,296 @@
+"""
+End-to-end Load Test
+-----------------------
+Starts the FastAPI app (main.py) under uvicorn against the local Open-Meteo
+stand-in and a throwaway history database, drives a configurable mix of
+/run-simulation, /history and /history/{id} traffic from concurrent clients,
+and reports throughput, latency percentiles and error rates.
+
+Results are written as JSON tagged with the git commit, and --compare
+prints the change against an earlier result file so capacity changes
+between commits are visible.
+
+Usage (from backend/):
+    python -m loadtest.run_loadtest --concurrency 8 --duration 30
+    python -m loadtest.run_loadtest --mix run-simulation=1,history=3,history-detail=2 \\
+        --latency-ms 200 --error-rate 0.05 --out load_results.json --compare load_baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+
+from loadtest.fake_open_meteo import start_in_thread
+
+
+DEFAULT_MIX = "run-simulation=2,history=5,history-detail=3"
+
+# Candidate sites; each run picks one, so cache behaviour depends on --locations
+SITES = [
+    {"lat": 41.88, "lon": -87.63}, {"lat": 44.98, "lon": -93.27}, {"lat": 42.36, "lon": -71.06},
+    {"lat": 39.74, "lon": -104.99}, {"lat": 47.61, "lon": -122.33}, {"lat": 45.51, "lon": -122.68},
+    {"lat": 42.33, "lon": -83.05}, {"lat": 40.76, "lon": -111.89}, {"lat": 43.07, "lon": -89.40},
+    {"lat": 46.87, "lon": -96.79}, {"lat": 43.62, "lon": -116.20}, {"lat": 35.08, "lon": -106.65},
+]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SERVER LIFECYCLE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def start_backend(port: int, weather_base: str, db_path: str, workers: int, cache_ttl: float) -> subprocess.Popen:
+    # Past dates route to the archive API, so both endpoints go to the stand-in
+    env = dict(os.environ)
+    env.update({
+        "OPEN_METEO_FORECAST_URL": f"{weather_base}/v1/forecast",
+        "OPEN_METEO_ARCHIVE_URL": f"{weather_base}/v1/archive",
+        "SIMULATIONS_DB": db_path,
+        "WEATHER_CACHE_TTL": str(cache_ttl),
+    })
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=backend_dir, env=env,
+    )
+
+
+def wait_until_up(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Backend did not come up at {base_url} within {timeout:.0f}s")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TRAFFIC
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, weight = part.split("=")
+        if name not in ("run-simulation", "history", "history-detail"):
+            raise ValueError(f"Unknown operation '{name}' in --mix")
+        mix[name] = float(weight)
+    return mix
+
+
+class Client:
+    def __init__(self, base_url: str, args, seed: int, known_ids: list, ids_lock: threading.Lock):
+        self.base_url = base_url
+        self.args = args
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+        self.known_ids = known_ids
+        self.ids_lock = ids_lock
+
+    def run_simulation(self):
+        site = SITES[self.rng.randrange(min(self.args.locations, len(SITES)))]
+        start = datetime(2024, 1, 1) + timedelta(days=self.rng.randrange(self.args.date_windows) * 7)
+        body = {
+            "name": "loadtest",
+            "location": site,
+            "start_date": str(start.date()),
+            "end_date": str((start + timedelta(days=self.args.days - 1)).date()),
+            "parameters": {"setpoint": 10.0},
+        }
+        r = self.session.post(self.base_url + "/run-simulation", json=body, timeout=self.args.timeout)
+        ok = r.status_code == 200 and r.json().get("status") == "ok"
+        # An "ok" run with no rows means the backend swallowed a weather failure
+        degraded = ok and not r.json().get("rows")
+        return ok, degraded, len(r.content)
+
+    def history(self):
+        r = self.session.get(self.base_url + "/history", timeout=self.args.timeout)
+        ok = r.status_code == 200 and r.json().get("status") == "ok"
+        if ok:
+            ids = [run["id"] for run in r.json()["runs"]]
+            with self.ids_lock:
+                self.known_ids[:] = ids
+        return ok, False, len(r.content)
+
+    def history_detail(self):
+        with self.ids_lock:
+            run_id = self.rng.choice(self.known_ids) if self.known_ids else 1
+        r = self.session.get(f"{self.base_url}/history/{run_id}", timeout=self.args.timeout)
+        ok = r.status_code == 200 and r.json().get("status") == "ok"
+        return ok, False, len(r.content)
+
+
+def worker(client: Client, mix: dict, deadline: float, samples: list, lock: threading.Lock):
+    ops = list(mix)
+    weights = [mix[o] for o in ops]
+    handlers = {
+        "run-simulation": client.run_simulation,
+        "history": client.history,
+        "history-detail": client.history_detail,
+    }
+    local = []
+    while time.monotonic() < deadline:
+        op = client.rng.choices(ops, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            ok, degraded, size = handlers[op]()
+        except (requests.RequestException, ValueError):
+            ok, degraded, size = False, False, 0
+        local.append((op, time.perf_counter() - t0, ok, degraded, size))
+    with lock:
+        samples.extend(local)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# REPORTING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def summarize(samples: list, duration: float) -> dict:
+    def stats(rows):
+        lat = np.array([r[1] for r in rows]) * 1000.0
+        errors = sum(1 for r in rows if not r[2])
+        degraded = sum(1 for r in rows if r[3])
+        return {
+            "requests": len(rows),
+            "throughput_rps": len(rows) / duration,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "degraded_rate": degraded / len(rows) if rows else 0.0,
+            "latency_ms": {
+                "p50": float(np.percentile(lat, 50)) if rows else None,
+                "p90": float(np.percentile(lat, 90)) if rows else None,
+                "p95": float(np.percentile(lat, 95)) if rows else None,
+                "p99": float(np.percentile(lat, 99)) if rows else None,
+                "max": float(lat.max()) if rows else None,
+            },
+            "mean_response_kb": float(np.mean([r[4] for r in rows]) / 1024) if rows else 0.0,
+        }
+
+    report = {"overall": stats(samples)}
+    for op in sorted({s[0] for s in samples}):
+        report[op] = stats([s for s in samples if s[0] == op])
+    return report
+
+
+def print_report(summary: dict):
+    print(f"\n{'operation':<16} {'reqs':>7} {'rps':>8} {'err%':>6} {'degr%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    print("─" * 87)
+    for op, s in summary.items():
+        lat = s["latency_ms"]
+        if not s["requests"]:
+            continue
+        print(f"{op:<16} {s['requests']:>7} {s['throughput_rps']:>8.1f} {s['error_rate'] * 100:>6.1f} "
+              f"{s['degraded_rate'] * 100:>6.1f} {lat['p50']:>8.1f} {lat['p95']:>8.1f} {lat['p99']:>8.1f} {lat['max']:>8.1f}")
+
+
+def print_comparison(summary: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')})")
+    for op, s in summary.items():
+        b = baseline["summary"].get(op)
+        if not b or not s["requests"] or not b["requests"]:
+            continue
+        d_rps = s["throughput_rps"] / b["throughput_rps"] - 1
+        d_p95 = s["latency_ms"]["p95"] / b["latency_ms"]["p95"] - 1
+        print(f"  {op:<16} throughput {d_rps:+.1%}   p95 {d_p95:+.1%}   "
+              f"errors {b['error_rate']:.1%} → {s['error_rate']:.1%}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the greenhouse backend against a fake weather server.")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. run-simulation=2,history=5")
+    parser.add_argument("--days", type=int, default=7, help="days simulated per /run-simulation")
+    parser.add_argument("--locations", type=int, default=4, help="distinct sites used by runs")
+    parser.add_argument("--date-windows", type=int, default=4, help="distinct start weeks used by runs")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--cache-ttl", type=float, default=900.0, help="backend weather cache TTL (0 disables)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake weather latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake weather failure probability")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request client timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="load_results.json")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    fake = start_in_thread(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed)
+    weather_base = f"http://127.0.0.1:{fake.server_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = start_backend(args.port, weather_base, os.path.join(tmp, "simulations.json"), args.workers, args.cache_ttl)
+        try:
+            wait_until_up(base_url)
+
+            known_ids, ids_lock = [], threading.Lock()
+            seed_client = Client(base_url, args, args.seed, known_ids, ids_lock)
+            seed_client.run_simulation()
+            seed_client.history()
+
+            print(f"Driving {args.concurrency} clients for {args.duration:.0f}s  mix={mix}")
+            samples, lock = [], threading.Lock()
+            deadline = time.monotonic() + args.duration
+            t0 = time.monotonic()
+            threads = [
+                threading.Thread(
+                    target=worker,
+                    args=(Client(base_url, args, args.seed + i + 1, known_ids, ids_lock), mix, deadline, samples, lock),
+                )
+                for i in range(args.concurrency)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.monotonic() - t0
+        finally:
+            backend.terminate()
+            backend.wait(timeout=30)
+            fake.shutdown()
+
+    summary = summarize(samples, elapsed)
+    print_report(summary)
+
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": str(datetime.now()),
+            "args": vars(args),
+            "weather_requests_served": fake.requests_served,
+        },
+        "summary": summary,
+    }
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults saved → {args.out}")
+
+    if args.compare:
+        print_comparison(summary, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,33 @@
+import os
+import time
+import threading
 import pandas as pd
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from weather import get_weather
+try:
+    import fcntl
+except ImportError:     # Windows: thread lock only, run a single process
+    fcntl = None
+
+from weather import get_weather, get_archive_weather
 import model
+import calibration
+import sites
+import rollups
+import run_store
+import retention
+import typical_days
+import parareal
+import mpc
+import ensemble
+import compare
+import metrics
+from sim_state import SimState, resume
+from predictive_model import climate_features
 
 # from pymongo import MongoClient
 
@@ -12,12 +35,60 @@ import model
 # db = client["greenhouse"]
 # simulated = db["simulated_runs"]
 
-from tinydb import TinyDB
+from tinydb import TinyDB, Query
 
-db = TinyDB('simulations.json')
+DB_PATH = os.environ.get('SIMULATIONS_DB', 'simulations.json')
+db = TinyDB(DB_PATH)
 simulated = db.table('simulated_runs')
+twins = db.table('twins')
+
+class StoreLock:
+    """
+    TinyDB is not thread-safe and sync endpoints run on a thread pool, so
+    concurrent requests would interleave reads and writes of the JSON file.
+    Besides a thread lock this takes an flock on DB_PATH.lock (POSIX only),
+    so the worker processes of serve.py can share the file too.
+    """
+
+    def __init__(self, path: str, tables: list):
+        self.path = path
+        self.tables = tables
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl:
+            # One lock file handle per process: a handle inherited over fork shares its lock
+            if self._pid != os.getpid():
+                self._file, self._pid = open(self.path, "a"), os.getpid()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            # TinyDB keeps the next doc id in memory; another process may have inserted since
+            for table in self.tables:
+                table._next_id = None
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
 
-app = FastAPI()
+db_lock = StoreLock(DB_PATH + ".lock", [simulated, twins])
+
+# Set HISTORY_MAINTENANCE=0 to leave retention to another process (serve.py
+# runs it in one worker only)
+HISTORY_MAINTENANCE = os.environ.get("HISTORY_MAINTENANCE", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Retention limits and compaction of old runs (see retention.py)
+    stop = retention.start_background(simulated, db_lock) if HISTORY_MAINTENANCE else None
+    yield
+    if stop:
+        stop.set()
+
+app = FastAPI(lifespan=lifespan)
 
 # This allows your React app to talk to the backend
 app.add_middleware(
@@ -28,28 +99,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Set SERVER_TIMING=1 to return per-stage timings in a Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+CLIMATE_FEATURES_DIR = os.environ.get("CLIMATE_FEATURES_DIR", "climate_features")
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    stages = metrics.start_request()
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - t0
+
+    # Label by route template (/history/{run_id}) so ids do not explode the label set
+    route = request.scope.get("route")
+    metrics.observe(
+        "greenhouse_request_seconds", elapsed,
+        endpoint=route.path if route else "unmatched",
+        method=request.method,
+        status=str(response.status_code),
+    )
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(stages, elapsed)
+    return response
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"status": "backend is running"}
 
+@app.get("/admin/storage")
+def get_storage():
+    """History store size, per-run footprint and the retention policy in force."""
+    return {"status": "ok", **retention.storage_report(simulated, db_lock, DB_PATH)}
+
+@app.post("/admin/maintenance")
+def run_maintenance():
+    """Apply retention and compaction now instead of waiting for the background pass."""
+    with metrics.stage("maintenance"):
+        report = retention.enforce(simulated, db_lock)
+    return {"status": "ok", **report}
+
 @app.post("/run-simulation")
 def run_simulation(params: dict):
-    weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
-    result_df = model.simulate_greenhouse(weather_df, params["parameters"])
-    result_df["datetime"] = result_df["datetime"].astype(str)
+    with metrics.stage("weather"):
+        weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
+
+    with metrics.stage("simulate") as timer:
+        # solver="parareal" spreads one long run across cores (see parareal.py)
+        if params.get("solver") == "parareal" and not weather_df.empty:
+            result_df, _ = parareal.simulate_parareal(weather_df, params["parameters"])
+        else:
+            result_df = model.simulate_greenhouse(weather_df, params["parameters"])
+    metrics.record_simulation(len(result_df), timer.seconds)
 
-    rows = result_df.to_dict(orient="records")
+    with metrics.stage("serialize"):
+        state = SimState.from_result(result_df)
+        rows = run_store.to_rows(result_df)
+        try:
+            stored = run_store.result_fields(weather_df, result_df, rows, params.get("storage"))
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
     # insert works almost the same as pymongo
-    simulated.insert({
-        "name": params["name"],
-        "run_at": str(datetime.now()),
-        "location": params["location"],
-        "start_date": params["start_date"],  # ← add this
-        "end_date": params["end_date"],       # ← and this
-        "parameters": params["parameters"],
-        "rows": rows
-    })
+    with metrics.stage("db_insert"), db_lock:
+        simulated.insert({
+            "name": params["name"],
+            "run_at": str(datetime.now()),
+            "location": params["location"],
+            "start_date": params["start_date"],  # ← add this
+            "end_date": params["end_date"],       # ← and this
+            "parameters": params["parameters"],
+            "state": state.to_dict() if state else None,  # final state, for warm starts and forks
+            **stored,   # rows, or only a weather fingerprint and summary (see run_store)
+        })
 
     return {
         "status": "ok",
@@ -58,7 +183,8 @@ def run_simulation(params: dict):
 
 @app.get("/history")
 def get_history():
-    runs = simulated.all()
+    with metrics.stage("db_read"), db_lock:
+        runs = simulated.all()
     sorted_runs = sorted(runs, key=lambda x: x.get("start_date", ""), reverse=True)
     return {
         "status": "ok",
@@ -70,6 +196,7 @@ def get_history():
                 "location": r["location"],
                 "start_date": r["start_date"],
                 "end_date": r["end_date"],
+                "summary": r.get("summary"),
             }
             for r in sorted_runs
         ]
@@ -77,10 +204,417 @@ def get_history():
 
 @app.get("/history/{run_id}")
 def get_run(run_id: int):
-    run = simulated.get(doc_id=run_id)
+    with metrics.stage("db_read"), db_lock:
+        run = simulated.get(doc_id=run_id)
     if not run:
         return {"status": "error", "message": "Run not found"}
-    return {"status": "ok", "run": run}
+    try:
+        rows, info = run_store.materialize(run)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "ok", "run": {**run, "rows": rows}, **info}
+
+@app.post("/history/compare")
+def compare_runs(params: dict):
+    """
+    Compare stored runs (compare.py): `run_ids`, or a `filter` on name,
+    location, start_date/end_date and run_at (since/until). Optional
+    threshold, baseline (a run id), rank_by, descending, align ("time" or
+    "index") and include_series.
+    """
+    try:
+        with metrics.stage("compare"):
+            result = compare.compare(
+                simulated, db_lock, DB_PATH, DB_PATH + ".columns",
+                run_ids=params.get("run_ids"),
+                filter=params.get("filter"),
+                threshold=float(params.get("threshold", 5.0)),
+                baseline=params.get("baseline"),
+                rank_by=params.get("rank_by", "heater_kwh"),
+                descending=bool(params.get("descending", False)),
+                align=params.get("align", "time"),
+                include_series=bool(params.get("include_series", False)),
+            )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "ok", **result}
+
+def _parse_thresholds(thresholds: str):
+    return [float(t) for t in thresholds.split(",") if t.strip()] if thresholds else None
+
+def _rollup_response(result_df: pd.DataFrame, period: str, thresholds) -> dict:
+    try:
+        with metrics.stage("rollup"):
+            summary = rollups.rollup(result_df, period, thresholds)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "ok", "period": period, "rollup": rollups.to_records(summary)}
+
+@app.get("/history/{run_id}/rollup")
+def get_run_rollup(run_id: int, period: str = "day", thresholds: str = None):
+    """Daily/weekly/monthly summary of a stored run; thresholds is a comma list of Tin limits."""
+    with metrics.stage("db_read"), db_lock:
+        run = simulated.get(doc_id=run_id)
+    if not run:
+        return {"status": "error", "message": "Run not found"}
+    try:
+        thresholds = _parse_thresholds(thresholds)
+    except ValueError:
+        return {"status": "error", "message": "thresholds must be a comma-separated list of numbers"}
+    try:
+        rows, _ = run_store.materialize(run)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return _rollup_response(pd.DataFrame(rows), period, thresholds)
+
+@app.post("/rollup")
+def run_rollup(params: dict):
+    """Simulate like /run-simulation (without storing) and return only the period summary."""
+    with metrics.stage("weather"):
+        weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    with metrics.stage("simulate") as timer:
+        result_df = model.simulate_greenhouse(weather_df, params.get("parameters", {}))
+    metrics.record_simulation(len(result_df), timer.seconds)
+    return _rollup_response(result_df, params.get("period", "day"), params.get("thresholds"))
+
+@app.post("/estimate")
+def estimate(params: dict):
+    """
+    Screening estimate of period heater/latent energy, mean Tin and cold
+    hours from representative days (typical_days.py), each with a 95% bound.
+    Takes the /run-simulation inputs plus optional n_clusters,
+    samples_per_cluster and thresholds. Nothing is stored.
+    """
+    with metrics.stage("weather"):
+        weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    try:
+        with metrics.stage("simulate"):
+            result = typical_days.estimate(
+                weather_df,
+                params.get("parameters", {}),
+                n_clusters=int(params.get("n_clusters", typical_days.N_CLUSTERS)),
+                samples_per_cluster=int(params.get("samples_per_cluster", typical_days.SAMPLES_PER_CLUSTER)),
+                thresholds=params.get("thresholds"),
+            )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "ok", **result}
+
+@app.post("/mpc")
+def run_mpc(params: dict):
+    """
+    Runs the heater under model-predictive control (mpc.py) and compares its
+    energy and comfort with the reactive rule. Takes the /run-simulation
+    inputs (parameters must include a setpoint) plus optional horizon, margin,
+    comfort_floor and include_rows. Nothing is stored.
+    """
+    with metrics.stage("weather"):
+        weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    try:
+        with metrics.stage("simulate"):
+            result_df, report = mpc.simulate_mpc(
+                weather_df,
+                params.get("parameters", {}),
+                horizon=int(params.get("horizon", mpc.HORIZON)),
+                margin=float(params.get("margin", mpc.MARGIN)),
+                comfort_floor=params.get("comfort_floor"),
+            )
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    response = {"status": "ok", **report}
+    if params.get("include_rows"):
+        response["rows"] = run_store.to_rows(result_df)
+    return response
+
+@app.post("/ensemble")
+def run_ensemble(params: dict):
+    """
+    Monte Carlo uncertainty bands (ensemble.py): the /run-simulation inputs
+    plus optional distributions, n_members, quantiles, channels, threshold,
+    seed and integrator. With `years` the start_date..end_date window is
+    repeated over those historical years, one per member in turn. Nothing
+    is stored.
+    """
+    integrator = params.get("integrator", "implicit")
+    if integrator not in model.INTEGRATORS:
+        return {"status": "error", "message": f"Unknown integrator '{integrator}'"}
+
+    with metrics.stage("weather"):
+        if params.get("years"):
+            frames = ensemble.fetch_years(params["location"], params["start_date"], params["end_date"], params["years"])
+        else:
+            frames = [get_weather(params["location"], params["start_date"], params["end_date"])]
+    if any(df.empty for df in frames):
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    try:
+        with metrics.stage("simulate") as timer:
+            result = ensemble.run_ensemble(
+                frames,
+                params.get("parameters", {}),
+                distributions=params.get("distributions"),
+                n_members=int(params.get("n_members", 1000)),
+                quantiles=tuple(params.get("quantiles", ensemble.QUANTILES)),
+                channels=tuple(params.get("channels", ensemble.CHANNELS)),
+                threshold=float(params.get("threshold", 5.0)),
+                seed=int(params.get("seed", 0)),
+                substeps=4 if integrator == "implicit" else 60,
+                integrator=integrator,
+            )
+    except (KeyError, ValueError) as e:
+        return {"status": "error", "message": str(e)}
+    metrics.record_simulation(result["hours"] * result["n_members"], timer.seconds)
+    return {"status": "ok", **result}
+
+@app.post("/calibrate")
+def calibrate(params: dict):
+    # Weather either comes with the request (rows matching the sensor log) or is fetched
+    if "weather" in params:
+        weather_df = pd.DataFrame(params["weather"])
+        weather_df["datetime"] = pd.to_datetime(weather_df["datetime"])
+    else:
+        with metrics.stage("weather"):
+            weather_df = get_weather(params["location"], params["start_date"], params["end_date"])
+
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    if not params.get("measured"):
+        return {"status": "error", "message": "measured is required: Tin readings, as a list or [{datetime, Tin}]"}
+
+    try:
+        measured = calibration.align_measurements(weather_df, params["measured"])
+        with metrics.stage("calibrate"):
+            result = calibration.calibrate(
+                weather_df,
+                measured,
+                params.get("parameters", {}),
+                fit=params.get("fit"),
+                n_starts=params.get("n_starts", 4),
+            )
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "message": str(e)}
+
+    result["datetime"] = weather_df["datetime"].astype(str).tolist()
+    return {"status": "ok", **result}
+
+@app.post("/run-sites")
+def run_sites(params: dict):
+    """
+    Simulate one design at many sites: `locations` is a list of {lat, lon}
+    or `grid` is {lat_min, lat_max, lon_min, lon_max, n_lat, n_lon | step}.
+    Returns a summary per site (and hourly rows with include_rows=true).
+    Runs the fast implicit integrator unless integrator="euler" asks for
+    the exact reference model (about five times slower).
+    """
+    try:
+        locations = params.get("locations") or sites.location_grid(params.get("grid") or {})
+    except (KeyError, ValueError) as e:
+        return {"status": "error", "message": f"Give a list of locations or a valid grid ({e})"}
+
+    integrator = params.get("integrator", "implicit")
+    if integrator not in model.INTEGRATORS:
+        return {"status": "error", "message": f"Unknown integrator '{integrator}'"}
+    if len(locations) > sites.MAX_SITES:
+        return {"status": "error", "message": f"At most {sites.MAX_SITES} locations per request"}
+
+    with metrics.stage("weather"):
+        frames = sites.fetch_weather_many(locations, params["start_date"], params["end_date"])
+
+    with metrics.stage("simulate") as timer:
+        results = sites.simulate_sites(
+            frames,
+            params.get("parameters", {}),
+            threshold=float(params.get("threshold", 5.0)),
+            include_rows=bool(params.get("include_rows", False)),
+            substeps=4 if integrator == "implicit" else 60,
+            integrator=integrator,
+        )
+    metrics.record_simulation(sum(len(f) for f in frames), timer.seconds)
+
+    return {
+        "status": "ok",
+        "integrator": integrator,
+        "sites": [{"location": loc, **res} for loc, res in zip(locations, results)],
+    }
+
+def _archive_year(location: dict, year) -> pd.DataFrame:
+    return get_archive_weather(location, f"{year}-01-01", f"{year}-12-31")
+
+@app.post("/climate/features")
+def get_climate_features(params: dict):
+    """
+    Climate descriptors (predictive_model/climate_features.py) of each of
+    `locations` (or one `location`) in `year`, cached after the first request.
+    """
+    locations = params.get("locations") or [params["location"]]
+    if len(locations) > sites.MAX_SITES:
+        return {"status": "error", "message": f"At most {sites.MAX_SITES} locations per request"}
+    try:
+        year = int(params["year"])
+    except (KeyError, TypeError, ValueError):
+        return {"status": "error", "message": "Give the year as a number"}
+
+    with metrics.stage("climate_features"):
+        features = climate_features.get_features(locations, year, _archive_year, CLIMATE_FEATURES_DIR)
+    return {
+        "status": "ok",
+        "year": year,
+        "locations": [
+            {"location": loc, "features": f} if f is not None
+            else {"location": loc, "status": "error", "message": "No weather data for this location"}
+            for loc, f in zip(locations, features)
+        ],
+    }
+
+def _run_state(run) -> SimState:
+    # Runs stored before states were saved fall back to their last row
+    if run.get("state"):
+        return SimState.from_dict(run["state"])
+    return SimState.from_result(pd.DataFrame(run.get("rows", [])))
+
+@app.post("/twins/{name}/advance")
+def advance_twin(name: str, params: dict):
+    """
+    Advance a named digital twin to `until` (default: the current hour) by
+    simulating only the weather since its last update. The first call creates
+    the twin and needs location, parameters and start_date. Pass
+    forecast_hours to also get a forecast beyond `until` (not committed).
+    """
+    Twin = Query()
+    with db_lock:
+        twin = twins.get(Twin.name == name)
+    until = pd.Timestamp(params.get("until") or datetime.now()).floor("h")
+    forecast_hours = int(params.get("forecast_hours", 0))
+
+    if twin is None:
+        if "location" not in params or "start_date" not in params:
+            return {"status": "error", "message": "New twins need a location and start_date"}
+        state = None
+        fetch_start = params["start_date"]
+        created_at = str(datetime.now())
+    else:
+        state = SimState.from_dict(twin["state"])
+        fetch_start = str((pd.Timestamp(state.last_timestamp) + pd.Timedelta(hours=1)).date())
+        created_at = twin["created_at"]
+
+    location = params.get("location", twin["location"] if twin else None)
+    parameters = params.get("parameters", twin["parameters"] if twin else {})
+
+    fetch_end = (until + pd.Timedelta(hours=forecast_hours)).date()
+    with metrics.stage("weather"):
+        weather_df = get_weather(location, fetch_start, str(fetch_end))
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    with metrics.stage("simulate") as timer:
+        result_df, new_state = resume(weather_df, parameters, state, until=until)
+    metrics.record_simulation(len(result_df), timer.seconds)
+    if new_state is None:
+        return {"status": "error", "message": "No weather rows before `until`"}
+
+    forecast = []
+    if forecast_hours > 0:
+        forecast_df, _ = resume(weather_df, parameters, new_state, until=until + pd.Timedelta(hours=forecast_hours))
+        forecast = run_store.to_rows(forecast_df)
+
+    with metrics.stage("db_insert"), db_lock:
+        twins.upsert({
+            "name": name,
+            "created_at": created_at,
+            "updated_at": str(datetime.now()),
+            "location": location,
+            "parameters": parameters,
+            "state": new_state.to_dict(),
+        }, Twin.name == name)
+
+    return {
+        "status": "ok",
+        "advanced_hours": len(result_df),
+        "state": new_state.to_dict(),
+        "rows": run_store.to_rows(result_df),
+        "forecast": forecast,
+    }
+
+@app.get("/twins/{name}")
+def get_twin(name: str):
+    with db_lock:
+        twin = twins.get(Query().name == name)
+    if not twin:
+        return {"status": "error", "message": "Twin not found"}
+    return {"status": "ok", "twin": twin}
+
+@app.post("/history/{run_id}/fork")
+def fork_run(run_id: int, params: dict):
+    """
+    Start a new scenario from a stored run's final state: same location and
+    parameters unless overridden, simulated from where the run ended up to
+    end_date, and stored as a new run.
+    """
+    with db_lock:
+        run = simulated.get(doc_id=run_id)
+    if not run:
+        return {"status": "error", "message": "Run not found"}
+
+    state = _run_state(run)
+    if state is None:
+        return {"status": "error", "message": "Run has no final state to fork from"}
+
+    location = params.get("location", run["location"])
+    parameters = {**run["parameters"], **params.get("parameters", {})}
+    start_date = str((pd.Timestamp(state.last_timestamp) + pd.Timedelta(hours=1)).date())
+    if "end_date" not in params:
+        return {"status": "error", "message": "end_date is required"}
+    try:
+        end_date = pd.Timestamp(params["end_date"])
+    except (TypeError, ValueError):
+        return {"status": "error", "message": f"Invalid end_date '{params['end_date']}'"}
+    if end_date < pd.Timestamp(start_date):
+        return {"status": "error", "message": f"end_date must be on or after {start_date}, where the run ended"}
+
+    with metrics.stage("weather"):
+        weather_df = get_weather(location, start_date, params["end_date"])
+    if weather_df.empty:
+        return {"status": "error", "message": "No weather data for the requested period"}
+
+    with metrics.stage("simulate") as timer:
+        result_df, new_state = resume(weather_df, parameters, state)
+    metrics.record_simulation(len(result_df), timer.seconds)
+    rows = run_store.to_rows(result_df)
+    try:
+        stored = run_store.result_fields(weather_df, result_df, rows, params.get("storage", run.get("storage")))
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    with metrics.stage("db_insert"), db_lock:
+        new_id = simulated.insert({
+            "name": params.get("name", f"{run['name']} (fork)"),
+            "run_at": str(datetime.now()),
+            "location": location,
+            "start_date": start_date,
+            "end_date": params["end_date"],
+            "parameters": parameters,
+            "forked_from": run_id,
+            "initial_state": state.to_dict(),
+            "state": new_state.to_dict() if new_state else None,
+            **stored,
+        })
+
+    return {
+        "status": "ok",
+        "id": new_id,
+        "rows": rows
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,162 @@
+"""
+In-process metrics in Prometheus text format
+-----------------------------------------------
+Counters, gauges and histograms small enough to sit on the request hot path
+(one perf_counter pair, a lock and a bisect per observation), plus a
+per-request stage timer that feeds both the `greenhouse_stage_seconds`
+histogram and the optional Server-Timing response header.
+
+    with metrics.stage("simulate"):
+        result_df = model.simulate_greenhouse(...)
+
+    metrics.inc("greenhouse_weather_fetch_failures_total")
+    text = metrics.render()        # served on /metrics
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "greenhouse_request_seconds": "Request duration by endpoint",
+    "greenhouse_stage_seconds": "Duration of request stages (weather fetch, simulation, serialization, storage)",
+    "greenhouse_weather_fetch_failures_total": "Weather fetches that failed and fell back to an empty frame",
+    "greenhouse_cache_requests_total": "Cache lookups by cache and result (hit/miss)",
+    "greenhouse_simulated_hours_total": "Hours of weather simulated",
+    "greenhouse_simulation_hours_per_second": "Simulated hours per wall-clock second of the most recent run",
+}
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) → float
+_gauges = {}        # (name, labels) → float
+_histograms = {}    # (name, labels) → [bucket counts..., sum, count]
+_buckets = {}       # name → bucket bounds
+
+# Stage timings of the current request, read back by the middleware for Server-Timing
+_request_stages = ContextVar("request_stages", default=None)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1.0, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+    key = _key(name, labels)
+    with _lock:
+        bounds = _buckets.setdefault(name, tuple(buckets))
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * len(bounds) + [0.0, 0]
+        i = bisect.bisect_left(bounds, value)
+        if i < len(bounds):
+            h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+def record_cache(cache: str, hit: bool):
+    inc("greenhouse_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_simulation(hours: int, seconds: float):
+    inc("greenhouse_simulated_hours_total", hours)
+    if seconds > 0 and hours > 0:
+        set_gauge("greenhouse_simulation_hours_per_second", hours / seconds)
+
+
+class StageTimer:
+    seconds = 0.0
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one stage of the current request; the yielded timer holds the duration afterwards."""
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.seconds = time.perf_counter() - t0
+        observe("greenhouse_stage_seconds", timer.seconds, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, timer.seconds))
+
+
+def start_request() -> list:
+    """Begin collecting stage timings for a request; returns the list they land in."""
+    stages = []
+    _request_stages.set(stages)
+    return stages
+
+
+def server_timing(stages: list, total: float) -> str:
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in stages]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        buckets = dict(_buckets)
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge")
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+
+    for (name, labels), h in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(buckets[name], h):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {h[-1]}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-2]}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {h[-1]}")
+
+    return "\n".join(lines) + "\n"
@@ -7,6 +7,35 @@ CP_AIR = 1005.0
 SIGMA = 5.670374419e-8
 LV = 2.45e6
 
+# Fallback values used for any parameter missing from `params`
+PARAM_DEFAULTS = {
+    "A_glass": 50.0,
+    "tau_glass": 0.85,
+    "U_day": 2.0,
+    "U_night": 0.25,
+    "ACH": 0.5,
+    "V": 100.0,
+    "A_floor": 50.0,
+    "A_mass": 20.0,
+    "fraction_solar_to_air": 0.5,
+    "cloud_factor": 0.5,
+    "thermal_mass_kg": 20000.0,
+    "cp_mass": 4186.0,
+    "soil_C": 4e6,
+    "soil_U": 0.5,
+    "heater_max_w": 5000.0,
+    "evap_coeff": 1e-8,
+    "emissivity": 0.9,
+    "lw_radiation_scale": 0.7,
+    "h_am": 3.0,
+    "h_as": 1.0,
+    "heating_rate_factor": 0.4,
+    "T_init": 15.0,
+}
+
+INTEGRATORS = ("euler", "implicit")
+HEATER_REFERENCE_SUBSTEPS = 60      # substeps per hour of the reference run whose heater "implicit" reproduces
+
 def _sky_temperature_kelvin(T_out_C, cloud_factor=0.5):
     clear_sky_offset = 12.0
     cloudy_sky_offset = 3.0
@@ -209,4 +238,258 @@ def simulate_greenhouse(weather_df: pd.DataFrame, params: dict, dt=3600.0, subst
     if not out_rows:
         return pd.DataFrame(columns=out_columns)
 
-    return pd.DataFrame(out_rows, columns=out_columns)
\ No newline at end of file
+    return pd.DataFrame(out_rows, columns=out_columns)
+
+def weather_arrays(weather_df: pd.DataFrame) -> dict:
+    """Pull Tout, G, RH and hour-of-day out of a weather frame, with the same fallbacks as simulate_greenhouse."""
+    n = len(weather_df)
+
+    def col(names, default):
+        for name in names:
+            if name in weather_df:
+                return weather_df[name].to_numpy(dtype=float, copy=True)
+        return np.full(n, default)
+
+    RH = col(["RH"], 0.5)
+    RH[RH == 0] = 0.5
+
+    if "datetime" in weather_df:
+        hour = pd.to_datetime(weather_df["datetime"]).dt.hour.to_numpy()
+    else:
+        hour = np.full(n, 12)
+
+    return {
+        "Tout": col(["Tout", "T_out"], 0.0),
+        "G": col(["G", "I"], 0.0),
+        "RH": RH,
+        "hour": hour,
+    }
+
+
+def batch_param_arrays(params_list: list) -> dict:
+    """Stack parameter dicts into (B,) float arrays, filling defaults. A None setpoint becomes NaN."""
+    keys = set(PARAM_DEFAULTS) | {"T_mass_init", "T_soil_init", "setpoint"}
+    for p in params_list:
+        keys |= set(p)
+
+    out = {}
+    for k in keys:
+        values = []
+        for p in params_list:
+            v = p.get(k, PARAM_DEFAULTS.get(k))
+            if v is None and k in ("T_mass_init", "T_soil_init"):
+                v = p.get("T_init", PARAM_DEFAULTS["T_init"])
+            try:
+                values.append(np.nan if v is None else float(v))
+            except (TypeError, ValueError):
+                values.append(np.nan)
+        out[k] = np.array(values)
+    return out
+
+
+def simulate_batch(weather, params_list: list, dt=3600.0, substeps=60, T_bounds=(0, 50), integrator="euler",
+                   outputs=None) -> dict:
+    """
+    Vectorized simulate_greenhouse over a batch of parameter sets.
+
+    `weather` is either one DataFrame shared by every member or a list of
+    equal-length DataFrames, one per member. Returns (B, T) arrays for Tout
+    and every numeric output column of simulate_greenhouse, plus "datetime"
+    from the first weather frame.
+
+    integrator="euler" performs exactly the reference update per substep.
+    integrator="implicit" solves each substep linearly-implicitly (radiation
+    and evaporation linearized about the current air temperature, and the
+    heater's proportional rule solved together with the air temperature at
+    the gain it has in a 60-substep reference run), which stays stable with
+    a handful of substeps per hour instead of 60.
+
+    `outputs` limits the recorded columns (e.g. ("Tin", "Q_heater")) for
+    large batches; Q_to_threshold is only computed when recorded.
+    """
+    if integrator not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator '{integrator}', expected one of {INTEGRATORS}")
+
+    frames = list(weather) if isinstance(weather, (list, tuple)) else [weather]
+    # Members often share a frame object; parse each one once
+    parsed = {}
+    w = [parsed[id(f)] if id(f) in parsed else parsed.setdefault(id(f), weather_arrays(f)) for f in frames]
+    n_hours = len(frames[0])
+    if any(len(f) != n_hours for f in frames):
+        raise ValueError("All weather frames in a batch must have the same length")
+
+    # (T, 1) when shared, (T, B) when per member; broadcasting handles both
+    Tout_all = np.stack([x["Tout"] for x in w], axis=1)
+    G_all = np.stack([x["G"] for x in w], axis=1)
+    RH_all = np.stack([x["RH"] for x in w], axis=1)
+    hour_all = w[0]["hour"]
+
+    p = batch_param_arrays(params_list)
+    B = len(params_list)
+
+    A_glass = p["A_glass"]
+    A_floor = p["A_floor"]
+    U_day = p["U_day"]
+    U_night = p["U_night"]
+    f_air = p["fraction_solar_to_air"]
+    C_mass = p["thermal_mass_kg"] * p["cp_mass"]
+    C_soil = p["soil_C"] * A_floor
+    C_air = RHO_AIR * p["V"] * CP_AIR
+    C_heated = C_air + C_mass
+    heater_max_w = p["heater_max_w"]
+    setpoint = p["setpoint"]
+    has_setpoint = ~np.isnan(setpoint)
+    k_heat = p["heating_rate_factor"]
+
+    m_dot_cp = RHO_AIR * p["V"] * (p["ACH"] / 3600.0) * CP_AIR
+    lw_coeff = p["lw_radiation_scale"] * p["emissivity"] * SIGMA * A_glass
+    K_am = p["h_am"] * p["A_mass"]
+    K_as = p["h_as"] * A_floor
+    K_su = p["soil_U"] * A_floor
+    evap_coeff = p["evap_coeff"]
+    sky_offset = 12.0 - (12.0 - 3.0) * p["cloud_factor"]
+
+    T_air = p["T_init"].copy()
+    T_mass = p["T_mass_init"].copy()
+    T_soil = p["T_soil_init"].copy()
+
+    n_sub = max(1, int(substeps))
+    dt_step = float(dt) / n_sub
+    lo, hi = T_bounds
+
+    # The reference heater lifts T_air by heating_rate_factor of its shortfall every
+    # substep, which leaves it (setpoint - T_air) * k / (1 - k) * C_heated / dt_ref
+    # watts at the end of each one; the implicit mode applies that gain at any substep
+    dt_ref = float(dt) / HEATER_REFERENCE_SUBSTEPS
+    heater_gain = k_heat / np.maximum(1.0 - k_heat, 1e-6) * C_heated / dt_ref
+    heater_gain_air = heater_gain * C_air / C_heated
+
+    columns = ("Tout", "Tin", "T_mass", "T_soil", "Q_heater", "Q_latent", "Q_to_threshold")
+    if outputs is not None:
+        unknown = set(outputs) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown outputs {sorted(unknown)}")
+        columns = tuple(c for c in columns if c in outputs)
+    out = {k: np.zeros((B, n_hours)) for k in columns}
+    Q_heater = np.zeros(B)
+    Q_lat = np.zeros(B)
+
+    for t in range(n_hours):
+        Tout = Tout_all[t]
+        G = G_all[t]
+        RH = RH_all[t]
+
+        solar_factor = np.clip((G - 10) / 90, 0.0, 1.0)
+        UA_env = (U_night + (U_day - U_night) * solar_factor) * A_glass
+
+        Q_total_sw = G * A_glass * p["tau_glass"]
+        Q_air_sw = Q_total_sw * f_air
+        Q_mass_sw = Q_total_sw * (1.0 - f_air) * 0.6
+        Q_soil_sw = Q_total_sw * (1.0 - f_air) * 0.4
+        T_sky_K4 = np.clip(Tout - sky_offset + 273.15, 0, 1000) ** 4
+
+        if integrator == "implicit":
+            # Substep-invariant parts of the implicit solve; mass and soil are
+            # eliminated as T_x_new = a_x + b_x * T_air_new
+            d_mass = C_mass / dt_step + K_am
+            b_mass = K_am / d_mass
+            d_soil = C_soil / dt_step + K_as + K_su
+            b_soil = K_as / d_soil
+            K_out = UA_env + m_dot_cp
+            lhs_lin = C_air / dt_step + K_am * (1 - b_mass) + K_as * (1 - b_soil) + K_out
+            rhs_lin = Q_air_sw + K_out * Tout
+            soil_src = Q_soil_sw + K_su * Tout
+
+        for _s in range(n_sub):
+            T_air_K = np.minimum(np.maximum(T_air + 273.15, 0), 1000)
+            T_air_safe = np.minimum(np.maximum(T_air, -50), 50)
+            es = 0.6108 * np.exp(17.27 * T_air_safe / (T_air_safe + 237.3))
+            VPD = np.maximum(es - RH * es, 0.0)
+            Q_lat = evap_coeff * VPD * LV * A_floor
+
+            if integrator == "euler":
+                Q_lw = lw_coeff * (T_air_K**4 - T_sky_K4)
+                Q_am = K_am * (T_mass - T_air)
+                Q_as = K_as * (T_soil - T_air)
+
+                Q_air_in = Q_air_sw + Q_am + Q_as - UA_env * (T_air - Tout) - m_dot_cp * (T_air - Tout) - Q_lw - Q_lat
+                Q_mass_in = Q_mass_sw - Q_am
+                Q_soil_in = Q_soil_sw - Q_as - K_su * (T_soil - Tout)
+
+                T_air = T_air + (Q_air_in * dt_step) / C_air
+                T_mass = T_mass + (Q_mass_in * dt_step) / C_mass
+                T_soil = T_soil + (Q_soil_in * dt_step) / C_soil
+
+                heating = has_setpoint & (T_air < setpoint)
+                power_needed = (setpoint - T_air) * C_heated * k_heat / dt_step
+                Q_heater = np.where(heating, np.minimum(np.maximum(power_needed, 0), heater_max_w), 0.0)
+                T_air = T_air + (Q_heater * dt_step) / C_heated
+            else:
+                # Longwave and latent losses linearized about the current air temperature
+                dQlw = lw_coeff * 4.0 * T_air_K**3
+                dQlat = Q_lat * 17.27 * 237.3 / (T_air_safe + 237.3) ** 2
+                Q_nl0 = lw_coeff * (T_air_K**4 - T_sky_K4) + Q_lat - (dQlw + dQlat) * T_air
+
+                a_mass = (C_mass / dt_step * T_mass + Q_mass_sw) / d_mass
+                a_soil = (C_soil / dt_step * T_soil + soil_src) / d_soil
+                lhs = lhs_lin + dQlw + dQlat
+                rhs = C_air / dt_step * T_air + rhs_lin + K_am * a_mass + K_as * a_soil - Q_nl0
+
+                # The reference heater's proportional rule, solved with T_air_new: at the
+                # end of each of its substeps Q = heater_gain * (setpoint - T_air), capped
+                # at heater_max_w; its air-side share is C_air / C_heated
+                T_free = rhs / lhs
+                heating = has_setpoint & (T_free < setpoint)
+                T_held = (rhs + heater_gain_air * setpoint) / (lhs + heater_gain_air)
+                Q_needed = heater_gain * (setpoint - T_held)
+                Q_heater = np.where(heating, np.minimum(np.maximum(Q_needed, 0), heater_max_w), 0.0)
+
+                T_air = (rhs + Q_heater * C_air / C_heated) / lhs
+                T_mass = a_mass + b_mass * T_air
+                T_soil = a_soil + b_soil * T_air
+
+            T_air = np.minimum(np.maximum(T_air, lo), hi)
+            T_mass = np.minimum(np.maximum(T_mass, lo), hi)
+            T_soil = np.minimum(np.maximum(T_soil, lo), hi)
+
+        hour_values = {"Tout": Tout, "Tin": T_air, "T_mass": T_mass, "T_soil": T_soil,
+                       "Q_heater": Q_heater, "Q_latent": Q_lat}
+        for k, v in hour_values.items():
+            if k in out:
+                out[k][:, t] = v
+        if "Q_to_threshold" in out:
+            out["Q_to_threshold"][:, t] = _heat_to_threshold_batch(
+                T_air, T_mass, T_soil, setpoint, has_setpoint, C_air, C_mass, C_soil,
+                Tout, hour_all[t], U_day, U_night, A_glass, m_dot_cp, heater_max_w,
+            )
+
+    out["datetime"] = frames[0]["datetime"].to_numpy() if "datetime" in frames[0] else None
+    return out
+
+
+def _heat_to_threshold_batch(T_air, T_mass, T_soil, setpoint, has_setpoint, C_air, C_mass, C_soil,
+                             Tout, hour, U_day, U_night, A_glass, m_dot_cp, heater_max_w):
+    # Vectorized calculate_heat_to_threshold for every member of a batch
+    needed = has_setpoint & (T_air < setpoint)
+    if not needed.any():
+        return np.zeros_like(T_air)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total_heat_needed = (
+            C_air * np.maximum(0.0, setpoint - T_air)
+            + C_mass * np.maximum(0.0, setpoint - T_mass)
+            + C_soil * np.maximum(0.0, setpoint - T_soil)
+        )
+        T_avg = (T_air + setpoint) / 2.0
+        U_env = U_day if 6 <= hour <= 18 else U_night
+        Q_loss = U_env * A_glass * (T_avg - Tout) + m_dot_cp * (T_avg - Tout)
+
+        net_heating_power = heater_max_w - np.maximum(0, Q_loss)
+        Q_losses_during_heating = np.where(
+            net_heating_power > 0,
+            Q_loss * (total_heat_needed / net_heating_power),
+            Q_loss * 3600.0,
+        )
+        Q_losses_during_heating = np.where(heater_max_w > 0, Q_losses_during_heating, 0.0)
+
+    return np.where(needed, np.maximum(0.0, total_heat_needed + Q_losses_during_heating), 0.0)
@@ -0,0 +1,339 @@
+"""
+Model-predictive heater control
+----------------------------------
+Replaces the reactive heater rule of simulate_greenhouse with a receding-
+horizon controller. Every hour it plans heater power for the next
+`horizon` hours against the forecast weather and applies the first hour:
+
+    minimize   sum of heater energy over the horizon
+    subject to Tin >= setpoint + margin at every hour
+               0 <= Q_heater <= heater_max_w
+
+Prediction model: the thermal network's linearly-implicit step (the same
+one model.simulate_batch uses for integrator="implicit") linearized about
+the setpoint, which makes one hour an affine map of (T_air, T_mass, T_soil)
+and heater power. The maps for every hour of the run are built up front in
+one vectorized pass, so each hourly plan is a few small matrix products.
+
+Because every predicted temperature is non-decreasing in every earlier
+hour's heater power, the plan is found greedily instead of with a general
+LP solver: constraints are visited in time order and any shortfall is
+covered by the latest hours that can still affect it, which are also the
+cheapest in energy (less time to lose the heat). A full year runs in a few
+seconds.
+
+The plant is the same thermal network stepped implicitly (4 substeps per
+hour, linearized about the current air temperature each substep) with the
+planned power applied through the air-side share of the batch model's
+thermostat.
+
+The baseline is simulate_greenhouse's proportional heater rule run on the
+same plant, solved per substep as model.simulate_batch's implicit mode does.
+Both sides record each hour's mean heater power, so the savings compare the
+control laws alone. Pre-heating ahead of a cold spell buys comfort, not
+energy (a warmer greenhouse only loses heat faster), and hourly planned power
+is coarser than the rule's per-substep response, so at equal comfort MPC
+uses a few percent more; it saves energy where comfort_floor lets it give up
+hours the heater cannot hold anyway.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import model
+from model import RHO_AIR, CP_AIR, SIGMA, LV
+
+HORIZON = 24
+MARGIN = 0.05           # K above setpoint the plan aims for, to absorb linearization error
+PLANT_SUBSTEPS = 4
+COMFORT_TOLERANCE = 0.5     # K below setpoint before an hour counts as uncomfortable
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# THERMAL NETWORK
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _network(params: dict) -> dict:
+    p = {k: params.get(k, v) for k, v in model.PARAM_DEFAULTS.items()}
+    C_air = RHO_AIR * p["V"] * CP_AIR
+    C_mass = p["thermal_mass_kg"] * p["cp_mass"]
+    k_heat = p["heating_rate_factor"]
+    return {
+        **p,
+        "C_air": C_air,
+        "C_mass": C_mass,
+        "C_soil": p["soil_C"] * p["A_floor"],
+        "heater_share": C_air / (C_air + C_mass),
+        # simulate_greenhouse's proportional rule as a gain in W/K (see model.simulate_batch)
+        "heater_gain": k_heat / max(1.0 - k_heat, 1e-6) * (C_air + C_mass)
+                       * model.HEATER_REFERENCE_SUBSTEPS / 3600.0,
+        "K_am": p["h_am"] * p["A_mass"],
+        "K_as": p["h_as"] * p["A_floor"],
+        "K_su": p["soil_U"] * p["A_floor"],
+        "m_dot_cp": RHO_AIR * p["V"] * (p["ACH"] / 3600.0) * CP_AIR,
+        "lw_coeff": p["lw_radiation_scale"] * p["emissivity"] * SIGMA * p["A_glass"],
+        "sky_offset": 12.0 - 9.0 * p["cloud_factor"],
+    }
+
+
+def _step_coefficients(net: dict, Tout, G, RH, T_lin, dt_step):
+    """
+    Affine substep x' = S x + s_u * u + s_c of the implicit update, linearized
+    about air temperature T_lin. Broadcasts over arrays of hours.
+    """
+    Tout, G, RH, T_lin = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (Tout, G, RH, T_lin)))
+    n = Tout.shape
+
+    solar_factor = np.clip((G - 10) / 90, 0.0, 1.0)
+    UA_env = (net["U_night"] + (net["U_day"] - net["U_night"]) * solar_factor) * net["A_glass"]
+    Q_sw = G * net["A_glass"] * net["tau_glass"]
+    f_air = net["fraction_solar_to_air"]
+    Q_air_sw, Q_mass_sw, Q_soil_sw = Q_sw * f_air, Q_sw * (1 - f_air) * 0.6, Q_sw * (1 - f_air) * 0.4
+    T_sky_K4 = np.clip(Tout - net["sky_offset"] + 273.15, 0, 1000) ** 4
+
+    T_K = np.clip(T_lin + 273.15, 0, 1000)
+    T_safe = np.clip(T_lin, -50, 50)
+    es = 0.6108 * np.exp(17.27 * T_safe / (T_safe + 237.3))
+    Q_lat = net["evap_coeff"] * np.maximum(es - RH * es, 0.0) * LV * net["A_floor"]
+    dQlw = net["lw_coeff"] * 4.0 * T_K ** 3
+    dQlat = Q_lat * 17.27 * 237.3 / (T_safe + 237.3) ** 2
+    Q_nl0 = net["lw_coeff"] * (T_K ** 4 - T_sky_K4) + Q_lat - (dQlw + dQlat) * T_lin
+
+    C_air, C_mass, C_soil = net["C_air"], net["C_mass"], net["C_soil"]
+    K_am, K_as, K_su = net["K_am"], net["K_as"], net["K_su"]
+    d_mass = C_mass / dt_step + K_am
+    d_soil = C_soil / dt_step + K_as + K_su
+    b_mass, b_soil = K_am / d_mass, K_as / d_soil
+    K_out = UA_env + net["m_dot_cp"]
+    lhs = C_air / dt_step + K_am * (1 - b_mass) + K_as * (1 - b_soil) + K_out + dQlw + dQlat
+
+    # T_air' = (C_air/dt T_air + K_am a_mass + K_as a_soil + const + share u) / lhs,
+    # with a_mass, a_soil affine in T_mass, T_soil
+    S = np.zeros(n + (3, 3))
+    S[..., 0, 0] = C_air / dt_step / lhs
+    S[..., 0, 1] = K_am * (C_mass / dt_step / d_mass) / lhs
+    S[..., 0, 2] = K_as * (C_soil / dt_step / d_soil) / lhs
+    c_air = (Q_air_sw + K_out * Tout + K_am * Q_mass_sw / d_mass + K_as * (Q_soil_sw + K_su * Tout) / d_soil - Q_nl0) / lhs
+    u_air = net["heater_share"] / lhs
+
+    # T_mass' = a_mass + b_mass T_air', T_soil' = a_soil + b_soil T_air'
+    S[..., 1, :] = b_mass * S[..., 0, :]
+    S[..., 1, 1] += C_mass / dt_step / d_mass
+    S[..., 2, :] = b_soil * S[..., 0, :]
+    S[..., 2, 2] += C_soil / dt_step / d_soil
+
+    s_u = np.stack([u_air, b_mass * u_air, b_soil * u_air], axis=-1)
+    s_c = np.stack([
+        c_air,
+        Q_mass_sw / d_mass + b_mass * c_air,
+        (Q_soil_sw + K_su * Tout) / d_soil + b_soil * c_air,
+    ], axis=-1)
+    return S, s_u, s_c, Q_lat
+
+
+def hourly_maps(net: dict, Tout, G, RH, T_lin: float, substeps: int = PLANT_SUBSTEPS, dt=3600.0):
+    """(A, b, c) with x[t+1] = A[t] x[t] + b[t] u[t] + c[t] for every hour, linearized about T_lin."""
+    S, s_u, s_c, _ = _step_coefficients(net, Tout, G, RH, T_lin, dt / substeps)
+    A = np.broadcast_to(np.eye(3), S.shape).copy()
+    b = np.zeros(s_u.shape)
+    c = np.zeros(s_c.shape)
+    for _ in range(substeps):
+        A = S @ A
+        b = (S @ b[..., None])[..., 0] + s_u
+        c = (S @ c[..., None])[..., 0] + s_c
+    return A, b, c
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PLANNING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def plan(x0: np.ndarray, A: np.ndarray, b: np.ndarray, c: np.ndarray, T_min: float, u_max: float,
+         T_floor: float = None) -> np.ndarray:
+    """
+    Least-energy heater powers keeping predicted air temperature >= T_min over
+    len(A) hours. An hour that cannot reach T_min even at full power gets
+    full power in the hour itself, as under the reactive rule. With T_floor,
+    such an hour is instead held at T_floor if it can reach that and
+    otherwise left alone, trading comfort in hours that stay cold anyway for
+    energy.
+    """
+    H = len(A)
+
+    # Free response (no heating) of the air node
+    f = np.zeros(H)
+    x = x0
+    for k in range(H):
+        x = A[k] @ x + c[k]
+        f[k] = x[0]
+
+    # M[k, j] = effect of u[j] on air temperature after hour k (j <= k), built one lag at a time
+    M = np.zeros((H, H))
+    M[np.arange(H), np.arange(H)] = b[:, 0]
+    prop = b                                    # state after hour j+lag from a unit u[j]
+    for lag in range(1, H):
+        prop = (A[lag:] @ prop[:H - lag, :, None])[..., 0]
+        M[np.arange(lag, H), np.arange(H - lag)] = prop[:, 0]
+
+    u = np.zeros(H)
+    T = f.copy()
+    for k in range(H):
+        deficit = T_min - T[k]
+        if deficit <= 1e-9:
+            continue
+        reach = M[k, :k + 1] @ (u_max - u[:k + 1])
+        if reach < deficit:
+            if T_floor is None:
+                du = u_max - u[k]
+                u[k] = u_max
+                T[k:] += M[k:, k] * du
+                continue
+            deficit = T_floor - T[k]
+            if reach < deficit:
+                continue
+        j = k
+        while deficit > 1e-9 and j >= 0:
+            if M[k, j] > 0 and u[j] < u_max:
+                du = min(u_max - u[j], deficit / M[k, j])
+                u[j] += du
+                T[j:] += M[j:, j] * du
+                deficit -= M[k, j] * du
+            j -= 1
+    return u
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLOSED LOOP
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _plant_hour(net: dict, x: np.ndarray, Tout, G, RH, u, T_bounds, dt=3600.0):
+    """One hour of the plant at heater power u; returns (state, latent heat)."""
+    lo, hi = T_bounds
+    Q_lat = 0.0
+    for _ in range(PLANT_SUBSTEPS):
+        S, s_u, s_c, Q_lat = _step_coefficients(net, Tout, G, RH, x[0], dt / PLANT_SUBSTEPS)
+        x = np.clip(S @ x + s_c + s_u * u, lo, hi)
+    return x, float(Q_lat)
+
+
+def _reactive_hour(net: dict, x: np.ndarray, Tout, G, RH, setpoint, T_bounds, dt=3600.0):
+    """
+    One hour of the plant under simulate_greenhouse's proportional heater rule,
+    solved with each substep's air temperature as model.simulate_batch's
+    implicit mode does; returns (state, latent heat, mean heater power).
+    """
+    lo, hi = T_bounds
+    Q_lat = 0.0
+    energy = 0.0
+    gain, u_max = net["heater_gain"], net["heater_max_w"]
+    for _ in range(PLANT_SUBSTEPS):
+        S, s_u, s_c, Q_lat = _step_coefficients(net, Tout, G, RH, x[0], dt / PLANT_SUBSTEPS)
+        T_free = S[0] @ x + s_c[0]
+        u = 0.0
+        if T_free < setpoint:
+            T_held = (T_free + s_u[0] * gain * setpoint) / (1.0 + s_u[0] * gain)
+            u = min(max(gain * (setpoint - T_held), 0.0), u_max)
+        x = np.clip(S @ x + s_c + s_u * u, lo, hi)
+        energy += u
+    return x, float(Q_lat), energy / PLANT_SUBSTEPS
+
+
+def _heat_to_threshold(net: dict, out: np.ndarray, w: dict, setpoint: float) -> np.ndarray:
+    # simulate_greenhouse's Q_to_threshold, from each hour's end state
+    Q = np.zeros(len(out))
+    for t in np.flatnonzero(out[:, 0] < setpoint):
+        Q[t] = model.calculate_heat_to_threshold(
+            out[t, 0], out[t, 1], out[t, 2], setpoint, net["C_air"], net["C_mass"], net["C_soil"],
+            w["Tout"][t], {**net, "current_hour": int(w["hour"][t])})
+    return Q
+
+
+def _frame(weather_df: pd.DataFrame, w: dict, out: np.ndarray, Q_to_threshold: np.ndarray) -> pd.DataFrame:
+    n = len(out)
+    return pd.DataFrame({
+        "datetime": weather_df["datetime"].to_numpy() if "datetime" in weather_df else np.arange(n),
+        "Tout": w["Tout"],
+        "Tin": out[:, 0],
+        "T_mass": out[:, 1],
+        "T_soil": out[:, 2],
+        "Q_heater": out[:, 3],
+        "Q_latent": out[:, 4],
+        "Q_to_threshold": Q_to_threshold,
+    })
+
+
+def simulate_mpc(weather_df: pd.DataFrame, params: dict, horizon: int = HORIZON, margin: float = MARGIN,
+                 comfort_floor: float = None, T_bounds=(0, 50)) -> tuple:
+    """
+    Closed-loop run under MPC. Returns (result_df, report): result_df has the
+    simulate_greenhouse columns (Q_heater is the hour's planned power), report
+    compares heater energy and comfort with simulate_greenhouse's reactive
+    rule on the same plant and weather.
+
+    comfort_floor (K below setpoint) lets the plan stop chasing hours the
+    heater cannot bring up to the setpoint; see plan().
+
+    The forecast is the weather itself (a perfect forecast); pass forecast
+    weather in weather_df to evaluate against a real one.
+    """
+    setpoint = params.get("setpoint")
+    if setpoint is None:
+        raise ValueError("MPC needs a setpoint")
+    setpoint = float(setpoint)
+
+    net = _network(params)
+    w = model.weather_arrays(weather_df)
+    Tout, G, RH = w["Tout"], w["G"], w["RH"]
+    n = len(Tout)
+    u_max = float(net["heater_max_w"])
+    T_floor = None if comfort_floor is None else setpoint - comfort_floor + margin
+
+    T0 = float(params.get("T_init", net["T_init"]))
+    x0 = np.array([T0, float(params.get("T_mass_init", T0)), float(params.get("T_soil_init", T0))])
+
+    t0 = time.perf_counter()
+    A, b, c = hourly_maps(net, Tout, G, RH, setpoint)
+    out = np.zeros((n, 5))
+    x = x0
+    for t in range(n):
+        H = min(horizon, n - t)
+        u = plan(x, A[t:t + H], b[t:t + H], c[t:t + H], setpoint + margin, u_max, T_floor)[0]
+        x, Q_lat = _plant_hour(net, x, Tout[t], G[t], RH[t], u, T_bounds)
+        out[t] = (x[0], x[1], x[2], u, Q_lat)
+    elapsed = time.perf_counter() - t0
+
+    reactive = np.zeros((n, 2))
+    x = x0
+    for t in range(n):
+        x, _, Q = _reactive_hour(net, x, Tout[t], G[t], RH[t], setpoint, T_bounds)
+        reactive[t] = (x[0], Q)
+    reactive_df = pd.DataFrame({"Tin": reactive[:, 0], "Q_heater": reactive[:, 1]})
+
+    result_df = _frame(weather_df, w, out, _heat_to_threshold(net, out, w, setpoint))
+    report = compare(result_df, reactive_df, setpoint)
+    report["seconds"] = elapsed
+    report["ms_per_hour"] = 1000.0 * elapsed / max(n, 1)
+    return result_df, report
+
+
+def compare(mpc_df: pd.DataFrame, reactive_df: pd.DataFrame, setpoint: float) -> dict:
+    """Heater energy and comfort of an MPC run against a reactive run (rows hold each hour's mean watts)."""
+    def stats(df):
+        return {
+            "heater_kwh": float(df["Q_heater"].sum() / 1000.0),
+            "peak_w": float(df["Q_heater"].max()) if len(df) else 0.0,
+            "hours_below_setpoint": int((df["Tin"] < setpoint - COMFORT_TOLERANCE).sum()),
+            "degree_hours_below_setpoint": float(np.maximum(setpoint - df["Tin"], 0).sum()),
+            "Tin_min": float(df["Tin"].min()) if len(df) else None,
+        }
+
+    m, r = stats(mpc_df), stats(reactive_df)
+    saved = r["heater_kwh"] - m["heater_kwh"]
+    return {
+        "mpc": m,
+        "reactive": r,
+        "saved_kwh": saved,
+        "saved_pct": 100.0 * saved / r["heater_kwh"] if r["heater_kwh"] > 0 else 0.0,
+    }
@@ -0,0 +1,300 @@
+"""
+N-node thermal network engine
+--------------------------------
+simulate_greenhouse hard-codes three nodes. This engine takes the network
+as data instead — nodes, conductances between them, boundaries, how solar
+gain is split, and which nodes radiate, evaporate or are heated — so more
+mass walls, a deep soil layer or several zones are a change of
+configuration, not of code:
+
+    network = {
+        "nodes": [{"name": "air", "C": 1.2e5, "T_init": 15.0}, ...],     # C in J/K
+        "edges": [{"between": ["air", "mass"], "G": 60.0}, ...],          # W/K
+        "boundaries": [
+            {"node": "air", "G": 40.0},                                   # to outdoor air
+            {"node": "air", "G_night": 12.5, "G_day": 100.0},             # glazing, follows solar like U_env
+            {"node": "deep_soil", "G": 25.0, "T": 10.0},                  # fixed-temperature boundary
+        ],
+        "solar": {"area": 42.5, "split": {"air": 0.5, "mass": 0.3, "soil": 0.2}},   # area x G = W
+        "longwave": [{"node": "air", "coeff": 1.8e-6, "cloud_factor": 0.5}],
+        "latent": [{"node": "air", "coeff": 1.2}],                        # W per kPa of VPD
+        "heaters": [{"node": "air", "setpoint": 10.0, "max_w": 5000.0,
+                     "rate_factor": 0.4, "capacity": 8.4e7}],
+    }
+
+assemble() turns that into a conductance matrix once (dense, or
+scipy.sparse beyond DENSE_MAX_NODES nodes). Each hour folds the boundary
+conductances into the explicit Euler update T <- M T + c, so a substep
+is one matrix-vector product plus the nonlinear longwave, latent and
+heater terms on their (index-array) nodes. The cost per substep barely
+depends on the node count.
+
+three_node_network(params) is simulate_greenhouse's model in this form,
+and simulate_three_node() reproduces its output frame to rounding.
+"""
+
+import numpy as np
+import pandas as pd
+
+import model
+from model import RHO_AIR, CP_AIR, SIGMA, LV
+
+DENSE_MAX_NODES = 200
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# NETWORK DESCRIPTION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def three_node_network(params: dict) -> dict:
+    """simulate_greenhouse's air / mass / soil model as a network description."""
+    p = {**model.PARAM_DEFAULTS, **{k: v for k, v in params.items() if v is not None}}
+    C_air = RHO_AIR * p["V"] * CP_AIR
+    C_mass = p["thermal_mass_kg"] * p["cp_mass"]
+    f_air = p["fraction_solar_to_air"]
+    T_init = float(p["T_init"])
+
+    network = {
+        "nodes": [
+            {"name": "air", "C": C_air, "T_init": T_init},
+            {"name": "mass", "C": C_mass, "T_init": float(p.get("T_mass_init", T_init))},
+            {"name": "soil", "C": p["soil_C"] * p["A_floor"], "T_init": float(p.get("T_soil_init", T_init))},
+        ],
+        "edges": [
+            {"between": ["air", "mass"], "G": p["h_am"] * p["A_mass"]},
+            {"between": ["air", "soil"], "G": p["h_as"] * p["A_floor"]},
+        ],
+        "boundaries": [
+            {"node": "air", "G_night": p["U_night"] * p["A_glass"], "G_day": p["U_day"] * p["A_glass"]},
+            {"node": "air", "G": RHO_AIR * p["V"] * (p["ACH"] / 3600.0) * CP_AIR},
+            {"node": "soil", "G": p["soil_U"] * p["A_floor"]},
+        ],
+        "solar": {
+            "area": p["A_glass"] * p["tau_glass"],
+            "split": {"air": f_air, "mass": (1.0 - f_air) * 0.6, "soil": (1.0 - f_air) * 0.4},
+        },
+        "longwave": [{
+            "node": "air",
+            "coeff": p["lw_radiation_scale"] * p["emissivity"] * SIGMA * p["A_glass"],
+            "cloud_factor": p["cloud_factor"],
+        }],
+        "latent": [{"node": "air", "coeff": p["evap_coeff"] * LV * p["A_floor"]}],
+        "heaters": [],
+    }
+    if params.get("setpoint") is not None:
+        network["heaters"].append({
+            "node": "air",
+            "setpoint": float(params["setpoint"]),
+            "max_w": p["heater_max_w"],
+            "rate_factor": p["heating_rate_factor"],
+            # The reference heater warms the air as if it also had to warm the mass
+            "capacity": C_air + C_mass,
+        })
+    return network
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ASSEMBLY
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _index(names: list, name: str) -> int:
+    try:
+        return names.index(name)
+    except ValueError:
+        raise ValueError(f"Unknown node '{name}'")
+
+
+def assemble(network: dict) -> dict:
+    """Matrices and index arrays for simulate_network, built once per network."""
+    nodes = network["nodes"]
+    names = [n["name"] for n in nodes]
+    if len(set(names)) != len(names):
+        raise ValueError("Node names must be unique")
+    n = len(names)
+    C = np.array([float(node["C"]) for node in nodes])
+    if np.any(C <= 0):
+        raise ValueError("Every node needs a positive capacity C")
+
+    # Internal conductances as a graph Laplacian: (K T)_i = sum_j G_ij (T_j - T_i)
+    rows, cols, vals = [], [], []
+    for edge in network.get("edges", []):
+        i, j = (_index(names, name) for name in edge["between"])
+        G = float(edge["G"])
+        rows += [i, j, i, j]
+        cols += [j, i, i, j]
+        vals += [G, G, -G, -G]
+    if n > DENSE_MAX_NODES:
+        from scipy import sparse
+        K = sparse.csr_matrix((vals, (rows, cols)), shape=(n, n))
+    else:
+        K = np.zeros((n, n))
+        np.add.at(K, (rows, cols), vals)
+
+    g_out = np.zeros(n)         # constant conductance to outdoor air
+    g_night = np.zeros(n)       # solar-dependent conductance to outdoor air
+    g_day = np.zeros(n)
+    g_fix = np.zeros(n)         # conductance to fixed-temperature boundaries
+    q_fix = np.zeros(n)         # ... and the heat it brings at 0 °C node temperature
+    for b in network.get("boundaries", []):
+        i = _index(names, b["node"])
+        if "T" in b:
+            g_fix[i] += float(b["G"])
+            q_fix[i] += float(b["G"]) * float(b["T"])
+        elif "G" in b:
+            g_out[i] += float(b["G"])
+        else:
+            g_night[i] += float(b["G_night"])
+            g_day[i] += float(b["G_day"])
+
+    solar = np.zeros(n)
+    if "solar" in network:
+        for name, fraction in network["solar"]["split"].items():
+            solar[_index(names, name)] += float(fraction) * float(network["solar"]["area"])
+
+    def terms(key, fields):
+        entries = network.get(key, [])
+        out = {"idx": np.array([_index(names, e["node"]) for e in entries], dtype=int)}
+        for field, default in fields.items():
+            out[field] = np.array([float(e.get(field, default)) for e in entries])
+        return out
+
+    heaters = terms("heaters", {"max_w": 0.0, "rate_factor": 0.4, "capacity": np.nan})
+    heaters["setpoint"] = np.array([np.nan if h.get("setpoint") is None else float(h["setpoint"])
+                                    for h in network.get("heaters", [])])
+    # By default a heater warms only its own node
+    heaters["capacity"] = np.where(np.isnan(heaters["capacity"]), C[heaters["idx"]], heaters["capacity"])
+
+    return {
+        "names": names,
+        "C": C,
+        "T_init": np.array([float(node.get("T_init", model.PARAM_DEFAULTS["T_init"])) for node in nodes]),
+        "K": K,
+        "g_out": g_out,
+        "g_night": g_night,
+        "g_day": g_day,
+        "g_fix": g_fix,
+        "q_fix": q_fix,
+        "solar": solar,
+        "longwave": terms("longwave", {"coeff": 0.0, "cloud_factor": 0.5}),
+        "latent": terms("latent", {"coeff": 0.0}),
+        "heaters": heaters,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# INTEGRATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def simulate_network(weather_df: pd.DataFrame, network: dict, dt=3600.0, substeps=60, T_bounds=(0, 50)) -> dict:
+    """
+    Explicit Euler over every node (the same scheme as simulate_greenhouse).
+    Returns {"datetime", "nodes", "T": hours x nodes, "Q_heater": hours x
+    heaters, "Q_latent": hours} with end-of-hour temperatures and the last
+    substep's heat flows, as simulate_greenhouse reports them.
+    """
+    net = assemble(network) if "K" not in network else network
+    w = model.weather_arrays(weather_df)
+    n_hours = len(w["Tout"])
+    n = len(net["C"])
+    C, K = net["C"], net["K"]
+    sparse = not isinstance(K, np.ndarray)
+
+    n_sub = max(1, int(substeps))
+    dt_step = float(dt) / n_sub
+    lo, hi = T_bounds
+    step = dt_step / C
+
+    lw, lat, heat = net["longwave"], net["latent"], net["heaters"]
+    sky_offset = 12.0 - (12.0 - 3.0) * lw["cloud_factor"]
+    lw_step = dt_step / C[lw["idx"]]
+    lat_step = dt_step / C[lat["idx"]]
+    has_setpoint = ~np.isnan(heat["setpoint"])
+    heat_gain = heat["capacity"] * heat["rate_factor"] / dt_step
+
+    T = net["T_init"].copy()
+    out_T = np.zeros((n_hours, n))
+    out_heater = np.zeros((n_hours, len(heat["idx"])))
+    out_latent = np.zeros(n_hours)
+    Q_heater = np.zeros(len(heat["idx"]))
+    Q_lat = np.zeros(len(lat["idx"]))
+
+    if sparse:
+        from scipy import sparse as sp
+        identity = sp.identity(n, format="csr")
+
+    for t in range(n_hours):
+        Tout, G, RH = w["Tout"][t], w["G"][t], w["RH"][t]
+
+        # Hour-constant part of the update: T <- M T + c
+        solar_factor = min(1.0, max(0.0, (G - 10) / 90))
+        g = net["g_out"] + net["g_night"] + (net["g_day"] - net["g_night"]) * solar_factor
+        source = net["solar"] * G + g * Tout + net["q_fix"]
+        c = source * step
+        if sparse:
+            M = identity + sp.diags(step) @ (K - sp.diags(g + net["g_fix"]))
+        else:
+            M = K * step[:, None]
+            M[np.diag_indices(n)] += 1.0 - (g + net["g_fix"]) * step
+        T_sky_K4 = np.clip(Tout - sky_offset + 273.15, 0, 1000) ** 4
+
+        for _s in range(n_sub):
+            # Nonlinear losses from the temperatures at the start of the substep
+            T_lw_K = np.minimum(np.maximum(T[lw["idx"]] + 273.15, 0), 1000)
+            Q_lw = lw["coeff"] * (T_lw_K ** 4 - T_sky_K4)
+            T_lat = np.minimum(np.maximum(T[lat["idx"]], -50), 50)
+            es = 0.6108 * np.exp(17.27 * T_lat / (T_lat + 237.3))
+            Q_lat = lat["coeff"] * np.maximum(es - RH * es, 0.0)
+
+            T = M @ T + c
+            T[lw["idx"]] -= Q_lw * lw_step
+            T[lat["idx"]] -= Q_lat * lat_step
+
+            if len(heat["idx"]):
+                T_h = T[heat["idx"]]
+                heating = has_setpoint & (T_h < heat["setpoint"])
+                power_needed = (heat["setpoint"] - T_h) * heat_gain
+                Q_heater = np.where(heating, np.minimum(np.maximum(power_needed, 0), heat["max_w"]), 0.0)
+                T[heat["idx"]] = T_h + Q_heater * dt_step / heat["capacity"]
+
+            T = np.minimum(np.maximum(T, lo), hi)
+
+        out_T[t] = T
+        out_heater[t] = Q_heater
+        out_latent[t] = Q_lat.sum()
+
+    return {
+        "datetime": weather_df["datetime"].to_numpy() if "datetime" in weather_df else None,
+        "nodes": net["names"],
+        "T": out_T,
+        "Q_heater": out_heater,
+        "Q_latent": out_latent,
+    }
+
+
+def simulate_three_node(weather_df: pd.DataFrame, params: dict, dt=3600.0, substeps=60, T_bounds=(0, 50)) -> pd.DataFrame:
+    """simulate_greenhouse through the network engine: the same columns and, to rounding, the same values."""
+    out = simulate_network(weather_df, three_node_network(params), dt=dt, substeps=substeps, T_bounds=T_bounds)
+    w = model.weather_arrays(weather_df)
+    T_air, T_mass, T_soil = out["T"][:, 0], out["T"][:, 1], out["T"][:, 2]
+
+    setpoint = params.get("setpoint")
+    Q_to_threshold = np.zeros(len(T_air))
+    if setpoint is not None:
+        net = three_node_network(params)
+        C_air, C_mass, C_soil = (node["C"] for node in net["nodes"])
+        for t in np.flatnonzero(T_air < setpoint):
+            Q_to_threshold[t] = model.calculate_heat_to_threshold(
+                T_air[t], T_mass[t], T_soil[t], setpoint, C_air, C_mass, C_soil, w["Tout"][t],
+                {**params, "current_hour": int(w["hour"][t])},
+            )
+
+    return pd.DataFrame({
+        "datetime": out["datetime"] if out["datetime"] is not None else np.arange(len(T_air)),
+        "Tout": w["Tout"],
+        "Tin": T_air,
+        "T_mass": T_mass,
+        "T_soil": T_soil,
+        "Q_heater": out["Q_heater"][:, 0] if out["Q_heater"].shape[1] else 0.0,
+        "Q_latent": out["Q_latent"],
+        "Q_to_threshold": Q_to_threshold,
+    })
@@ -0,0 +1,124 @@
+"""
+Parallel-in-time (Parareal) simulation
+-----------------------------------------
+simulate_greenhouse is sequential in time, so one multi-decade run uses one
+core. Parareal splits the run into windows and:
+
+1. predicts the state at every window boundary with a cheap coarse
+   propagator G (model.simulate_batch, implicit, one step per hour);
+2. runs the fine propagator F (simulate_greenhouse, the serial reference)
+   on every window at once across a process pool, each from its predicted
+   start state;
+3. corrects the boundary states serially with
+       U[w+1] = G(U_new[w]) + F(U_old[w]) - G(U_old[w])
+   and repeats 2-3 until every window starts within `tol` of where the
+   previous window's fine run ended.
+
+The simulator's whole state is (T_air, T_mass, T_soil), so a window seeded
+with the exact state reproduces the serial rows exactly. After k iterations
+the first k windows are exact, and windows whose start state did not move
+are not re-run. The coarse model tracks the fine one closely (see the
+implicit accuracy in benchmarks/bench_engine.py), so a handful of
+iterations is typical; with W workers the wall time is roughly
+iterations x (serial time / W) plus the serial coarse sweeps.
+"""
+
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+import model
+from sim_state import SimState
+
+COARSE_SUBSTEPS = 1
+TOLERANCE = 1e-3            # K, largest allowed jump at a window boundary
+
+
+def _window_bounds(n_hours: int, n_windows: int) -> list:
+    edges = np.linspace(0, n_hours, n_windows + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def _state_params(params: dict, state: np.ndarray) -> dict:
+    return SimState(*map(float, state)).apply(params)
+
+
+def _coarse(window: pd.DataFrame, params: dict, state: np.ndarray, dt, T_bounds) -> np.ndarray:
+    out = model.simulate_batch(window, [_state_params(params, state)], dt=dt, substeps=COARSE_SUBSTEPS,
+                               T_bounds=T_bounds, integrator="implicit")
+    return np.array([out["Tin"][0, -1], out["T_mass"][0, -1], out["T_soil"][0, -1]])
+
+
+def _fine(args: tuple) -> pd.DataFrame:
+    window, params, state, dt, substeps, T_bounds = args
+    return model.simulate_greenhouse(window, _state_params(params, state), dt=dt, substeps=substeps, T_bounds=T_bounds)
+
+
+def _end_state(result_df: pd.DataFrame) -> np.ndarray:
+    last = result_df.iloc[-1]
+    return np.array([last["Tin"], last["T_mass"], last["T_soil"]], dtype=float)
+
+
+def simulate_parareal(weather_df: pd.DataFrame, params: dict, n_windows: int = None, n_workers: int = None,
+                      tol: float = TOLERANCE, max_iter: int = None, dt=3600.0, substeps=60,
+                      T_bounds=(0, 50)) -> tuple:
+    """
+    Parareal simulate_greenhouse. Returns (result_df, info) where result_df
+    has the same columns as simulate_greenhouse and info records iterations,
+    the largest boundary jump per iteration, and fine windows run.
+    """
+    weather_df = weather_df.reset_index(drop=True)
+    n_workers = n_workers or os.cpu_count() or 1
+    bounds = _window_bounds(len(weather_df), n_windows or n_workers)
+    windows = [weather_df.iloc[a:b] for a, b in bounds]
+    n = len(windows)
+    max_iter = max_iter or n
+
+    T0 = params.get("T_init", model.PARAM_DEFAULTS["T_init"])
+    U = np.zeros((n + 1, 3))
+    U[0] = [T0, params.get("T_mass_init", T0), params.get("T_soil_init", T0)]
+
+    # Initial coarse sweep
+    G_old = np.zeros((n, 3))
+    for w in range(n):
+        G_old[w] = _coarse(windows[w], params, U[w], dt, T_bounds)
+        U[w + 1] = G_old[w]
+
+    fine = [None] * n
+    fine_starts = [None] * n
+    info = {"windows": n, "iterations": 0, "max_jump": [], "fine_windows_run": 0}
+
+    pool = Pool(processes=min(n_workers, n)) if n_workers > 1 and n > 1 else None
+    try:
+        for k in range(max_iter):
+            # Re-run only windows whose start state moved since their last fine run
+            todo = [w for w in range(n) if fine_starts[w] is None or not np.array_equal(fine_starts[w], U[w])]
+            jobs = [(windows[w], params, U[w].copy(), dt, substeps, T_bounds) for w in todo]
+            results = pool.map(_fine, jobs) if pool else [_fine(job) for job in jobs]
+            for w, res in zip(todo, results):
+                fine[w], fine_starts[w] = res, U[w].copy()
+            info["fine_windows_run"] += len(todo)
+            info["iterations"] = k + 1
+
+            F_end = np.array([_end_state(fine[w]) for w in range(n)])
+            jump = float(np.abs(F_end[:-1] - U[1:n]).max()) if n > 1 else 0.0
+            info["max_jump"].append(jump)
+            if jump <= tol:
+                break
+
+            # Serial correction sweep; U[0] and window 0 are exact from the start
+            for w in range(n):
+                G_new = _coarse(windows[w], params, U[w], dt, T_bounds)
+                U_next = G_new + F_end[w] - G_old[w]
+                G_old[w] = G_new
+                if w + 1 < n:
+                    U[w + 1] = U_next
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    info["converged"] = info["max_jump"][-1] <= tol if info["max_jump"] else True
+    return pd.concat(fine, ignore_index=True), info
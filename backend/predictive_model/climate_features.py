@@ -0,0 +1,180 @@
+"""
+Climate feature store
+-----------------------
+Descriptors of a location's climate in one year, computed from its hourly
+weather once and cached on disk, for the inverse-model trainer, predict()
+and the API:
+
+    avg_Tout, min_Tout, max_Tout, avg_solar, avg_RH
+    Tout_p01 … Tout_p99          hourly outdoor temperature percentiles (°C)
+    hdd_10, hdd_18               heating degree-days from daily means (K·day)
+    hours_below_0, hours_below_5 outdoor hours below 0 / 5 °C
+    cold_spell_max_h             longest stretch below 0 °C (hours)
+    cold_spells_24h              stretches below 0 °C lasting 24 h or more
+    solar_day_mean … _p90        daily insolation distribution (kWh/m²/day)
+    solar_winter_day_mean        the same over December–February
+    dark_days                    days under DARK_DAY_KWH
+
+The cache is one JSON file per year in the store directory, keyed by
+"lat,lon" rounded to 4 decimals. Features are computed for all sites of a
+year together on (sites × hours) arrays, so hundreds of sites take well
+under a second once their weather is local; fetching the weather is the
+slow part and runs concurrently.
+
+The module does not fetch weather itself: callers pass fetch(location,
+year) returning an hourly frame with datetime, Tout, G and RH (empty or an
+exception on failure).
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (1, 5, 10, 50, 90, 99)
+HDD_BASES = (10, 18)
+DARK_DAY_KWH = 0.5
+FETCH_WORKERS = 8
+
+FEATURE_NAMES = (
+    ["avg_Tout", "min_Tout", "max_Tout", "avg_solar", "avg_RH"]
+    + [f"Tout_p{p:02d}" for p in PERCENTILES]
+    + [f"hdd_{b}" for b in HDD_BASES]
+    + ["hours_below_0", "hours_below_5", "cold_spell_max_h", "cold_spells_24h",
+       "solar_day_mean", "solar_day_min", "solar_day_p10", "solar_day_p50", "solar_day_p90",
+       "solar_winter_day_mean", "dark_days"]
+)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# FEATURES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    """Length of the run of True ending at each position, row by row."""
+    count = np.cumsum(mask, axis=1)
+    reset = np.maximum.accumulate(np.where(mask, 0, count), axis=1)
+    return count - reset
+
+
+def _feature_matrix(Tout: np.ndarray, G: np.ndarray, RH: np.ndarray, month: np.ndarray) -> dict:
+    # All arrays sites × hours, whole days only; month is per hour (shared)
+    n_sites, n_hours = Tout.shape
+    daily_T = Tout.reshape(n_sites, -1, 24).mean(axis=2)
+    daily_kwh = G.reshape(n_sites, -1, 24).sum(axis=2) / 1000.0     # hourly W/m² → kWh/m²
+    winter = np.isin(month[::24], (12, 1, 2))
+    cold_runs = _run_lengths(Tout < 0)
+
+    features = {
+        "avg_Tout": Tout.mean(axis=1),
+        "min_Tout": Tout.min(axis=1),
+        "max_Tout": Tout.max(axis=1),
+        "avg_solar": G.mean(axis=1),
+        "avg_RH": RH.mean(axis=1),
+    }
+    for p, values in zip(PERCENTILES, np.percentile(Tout, PERCENTILES, axis=1)):
+        features[f"Tout_p{p:02d}"] = values
+    for b in HDD_BASES:
+        features[f"hdd_{b}"] = np.maximum(b - daily_T, 0).sum(axis=1)
+    day_p10, day_p50, day_p90 = np.percentile(daily_kwh, (10, 50, 90), axis=1)
+    features.update({
+        "hours_below_0": (Tout < 0).sum(axis=1),
+        "hours_below_5": (Tout < 5).sum(axis=1),
+        "cold_spell_max_h": cold_runs.max(axis=1),
+        "cold_spells_24h": (cold_runs == 24).sum(axis=1),    # each long spell passes 24 h exactly once
+        "solar_day_mean": daily_kwh.mean(axis=1),
+        "solar_day_min": daily_kwh.min(axis=1),
+        "solar_day_p10": day_p10,
+        "solar_day_p50": day_p50,
+        "solar_day_p90": day_p90,
+        "solar_winter_day_mean": daily_kwh[:, winter].mean(axis=1) if winter.any() else np.full(n_sites, np.nan),
+        "dark_days": (daily_kwh < DARK_DAY_KWH).sum(axis=1),
+    })
+    return features
+
+
+def compute_features_batch(frames: list) -> list:
+    """Feature dicts for hourly weather frames, vectorized over frames of equal length."""
+    results = [None] * len(frames)
+    groups = {}
+    for i, df in enumerate(frames):
+        n = len(df) // 24 * 24
+        if n == 0:
+            raise ValueError("Climate features need at least one full day of hourly weather")
+        groups.setdefault(n, []).append(i)
+
+    for n, idx in groups.items():
+        Tout = np.stack([frames[i]["Tout"].to_numpy(dtype=float)[:n] for i in idx])
+        G = np.stack([frames[i]["G"].to_numpy(dtype=float)[:n] for i in idx])
+        RH = np.stack([frames[i]["RH"].to_numpy(dtype=float)[:n] if "RH" in frames[i] else np.full(n, 0.5)
+                       for i in idx])
+        month = pd.to_datetime(frames[idx[0]]["datetime"]).dt.month.to_numpy()[:n]
+        features = _feature_matrix(Tout, G, RH, month)
+        for j, i in enumerate(idx):
+            results[i] = {name: round(float(features[name][j]), 4) for name in FEATURE_NAMES}
+    return results
+
+
+def compute_features(weather_df: pd.DataFrame) -> dict:
+    return compute_features_batch([weather_df])[0]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# STORE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def location_key(location: dict) -> str:
+    return f"{float(location['lat']):.4f},{float(location['lon']):.4f}"
+
+
+def _year_path(store_dir: str, year) -> str:
+    return os.path.join(store_dir, f"features_{int(year)}.json")
+
+
+def load_year(store_dir: str, year) -> dict:
+    try:
+        with open(_year_path(store_dir, year)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_year(store_dir: str, year, entries: dict):
+    """Merge entries into the year's file (re-read first, so concurrent builders add rather than overwrite)."""
+    os.makedirs(store_dir, exist_ok=True)
+    merged = {**load_year(store_dir, year), **entries}
+    tmp = f"{_year_path(store_dir, year)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(merged, f, indent=1, sort_keys=True)
+    os.replace(tmp, _year_path(store_dir, year))
+
+
+def get_features(locations: list, year, fetch, store_dir: str, workers: int = FETCH_WORKERS) -> list:
+    """
+    Features for every location in `year`, in order: cached ones from disk,
+    the rest fetched concurrently, computed together and added to the cache.
+    A location whose weather cannot be fetched gets None (and is retried
+    next time).
+    """
+    cached = load_year(store_dir, year)
+    keys = [location_key(loc) for loc in locations]
+    missing = sorted({k: loc for k, loc in zip(keys, locations) if k not in cached}.items())
+
+    if missing:
+        def safe_fetch(loc):
+            try:
+                return fetch(loc, year)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as pool:
+            frames = list(pool.map(safe_fetch, [loc for _, loc in missing]))
+        fetched = [(k, df) for (k, _), df in zip(missing, frames) if df is not None and len(df) >= 24]
+        if fetched:
+            new = dict(zip([k for k, _ in fetched], compute_features_batch([df for _, df in fetched])))
+            save_year(store_dir, year, new)
+            cached.update(new)
+
+    return [cached.get(k) for k in keys]
@@ -2,20 +2,31 @@
 Greenhouse Training Data Generator
 ------------------------------------
 Fetches real historical weather from Open-Meteo (no API key needed),
-runs the greenhouse sim across thousands of random param combinations,
-and saves results to TinyDB with checkpointing.
+runs the greenhouse sim across thousands of param combinations (random,
+space-filling or chosen by active learning, see SAMPLING),
+and saves results to TinyDB with per-run checkpointing: a restart skips
+exactly the runs already saved and retries failed ones.
 
 Requirements:
     pip install tinydb pandas numpy requests
+    pip install scipy scikit-learn      # only for SAMPLING other than "uniform"
 
 Usage:
-    python generate_training_data.py
+    python generate_training_data.py                # this machine only
+    python generate_training_data.py coordinator    # multi-host: create the queue, merge at the end
+    python generate_training_data.py worker         # multi-host: run on any number of hosts
+
+In multi-host mode every host needs QUEUE_PATH and SHARD_DIR on shared
+storage; see work_queue.py.
 
 Place model.py in the same directory before running.
 """
 
 import os
+import sys
 import json
+import time
+import threading
 import requests
 import numpy as np
 import pandas as pd
@@ -25,6 +36,7 @@ from datetime import datetime
 
 # ── Import your sim ───────────────────────────────────────────────────────────
 from backend.predictive_model.model import simulate_greenhouse
+from backend.predictive_model import work_queue, trajectory_store
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -34,9 +46,32 @@ from backend.predictive_model.model import simulate_greenhouse
 N_RUNS          = 5000      # total param combinations to generate
 YEAR            = "2024"    # full year of weather data (2024 is fully archived)
 DB_PATH         = "training_data.json"
-CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_FILE = "checkpoint.json"   # next local shard number; see CHECKPOINTING below
+STATUS_FILE     = "run_status.npy"    # one byte per run: pending / done / failed
+FAILURES_FILE   = "failures.jsonl"    # one line per failed attempt, with the exception
+FLUSH_EVERY     = 1000      # runs per local shard ...
+FLUSH_SECONDS   = 60        # ... or fewer, so a crash loses at most this much work
+MAX_ATTEMPTS    = 3         # a failed run is retried on resume until it has failed this often
+TRAJECTORY_DIR  = None        # set to a directory to also keep every run's hourly trajectories
+TRAJECTORY_HOURS = pd.Timestamp(f"{YEAR}-12-31").dayofyear * 24
+
+# Multi-host mode (coordinator / worker) — paths must be on shared storage
+QUEUE_PATH      = "work_queue.db"
+SHARD_DIR       = "shards"      # one TinyDB-format file per finished lease
+LEASE_SIZE      = 50            # runs per lease: the most a crashed worker loses
+LEASE_TTL       = 1800          # seconds a lease lives without a renewal
+POLL_INTERVAL   = 30            # seconds between queue checks when nothing is free
 SEED            = 42
 
+# How param sets are drawn: "uniform" (every param independently), "lhs",
+# "sobol", or "active" (space-filling start, then active learning). The
+# space-filling methods did not reach uniform's validation loss with fewer
+# runs, so uniform stays the default; all but uniform need scipy, and
+# "active" also scikit-learn. Neither is imported on the uniform path.
+SAMPLING        = "uniform"
+ACTIVE_INITIAL  = 0.2       # share of N_RUNS drawn space-filling before the model steers
+ACTIVE_POOL_FACTOR = 20     # candidates scored per run the active loop picks
+
 # Locations covering a range of climates
 # All cold-climate since this is a Chinese passive solar greenhouse
 LOCATIONS = [
@@ -109,60 +144,194 @@ def fetch_all_weather() -> dict:
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# PARAMETER RANDOMISATION
+# PARAMETER SPACE
+# Ranges are kept realistic for a Chinese passive solar greenhouse.
+# A (low, high) tuple is a continuous range, a list is a set of choices.
+# Order is the draw order of random_params — keep it, so seeded runs repeat.
 # ─────────────────────────────────────────────────────────────────────────────
 
+PARAM_SPACE = [
+    # ── Geometry ─────────────────────────────────────────────
+    ("A_floor",               (20, 200)),
+    ("height",                (2.0, 4.0)),      # V = A_floor * height
+    ("setpoint",              [None, 5.0, 8.0, 10.0, 12.0, 15.0, 18.0]),
+    ("A_glass",               (15, 180)),
+    ("A_mass",                (10, 80)),
+
+    # ── Glass & envelope ─────────────────────────────────────
+    ("tau_glass",             (0.60, 0.95)),
+    ("U_day",                 (1.0,  5.0)),
+    ("U_night",               (0.10, 0.80)),
+    ("emissivity",            (0.7,  0.95)),
+
+    # ── Construction ─────────────────────────────────────────
+    ("ACH",                   (0.1, 2.0)),
+    ("fraction_solar_to_air", (0.3, 0.7)),
+
+    # ── Thermal mass ─────────────────────────────────────────
+    ("thermal_mass_kg",       (500, 50000)),
+    ("h_am",                  (1.0, 6.0)),
+    ("cp_mass",               (2000, 4200)),    # varies: rock, water, concrete
+
+    # ── Soil ─────────────────────────────────────────────────
+    ("soil_C",                (1e6, 6e6)),
+    ("soil_U",                (0.2, 1.0)),
+
+    # ── Heating ──────────────────────────────────────────────
+    ("heater_max_w",          [0, 1000, 2000, 3000, 5000, 8000, 10000]),
+
+    # ── Cloud / radiation ────────────────────────────────────
+    ("cloud_factor",          (0.2, 0.8)),
+    ("lw_radiation_scale",    (0.5, 0.9)),
+
+    # ── Initial state ────────────────────────────────────────
+    # Vary so the model sees diverse starting conditions
+    ("T_init",                (2, 20)),
+    ("T_mass_init",           (2, 20)),
+    ("T_soil_init",           (2, 18)),
+]
+N_DIMS = len(PARAM_SPACE)
+PARAM_NAMES = [name for name, _ in PARAM_SPACE if name != "height"] + ["V"]
+
+
+def _build_params(values: dict) -> dict:
+    params = dict(values)
+    params["V"] = params.pop("height") * params["A_floor"]
+    params["heater_max_w"] = float(params["heater_max_w"])
+    return params
+
+
 def random_params(rng: np.random.Generator) -> dict:
     """
-    Sample a random but physically plausible set of greenhouse design params.
-    Ranges are kept realistic for a Chinese passive solar greenhouse.
+    Sample a random but physically plausible set of greenhouse design params,
+    every parameter drawn independently.
     """
-    A_floor = rng.uniform(20, 200)
-    # Volume is loosely derived from floor area (height 2-4m)
-    V = A_floor * rng.uniform(2.0, 4.0)
-
-    setpoint = rng.choice([None, 5.0, 8.0, 10.0, 12.0, 15.0, 18.0])
-
-    return {
-        # ── Geometry ─────────────────────────────────────────────
-        "A_glass":               rng.uniform(15, 180),
-        "A_floor":               A_floor,
-        "V":                     V,
-        "A_mass":                rng.uniform(10, 80),
-
-        # ── Glass & envelope ─────────────────────────────────────
-        "tau_glass":             rng.uniform(0.60, 0.95),
-        "U_day":                 rng.uniform(1.0,  5.0),
-        "U_night":               rng.uniform(0.10, 0.80),
-        "emissivity":            rng.uniform(0.7,  0.95),
-
-        # ── Construction ─────────────────────────────────────────
-        "ACH":                   rng.uniform(0.1, 2.0),
-        "fraction_solar_to_air": rng.uniform(0.3, 0.7),
-
-        # ── Thermal mass ─────────────────────────────────────────
-        "thermal_mass_kg":       rng.uniform(500, 50000),
-        "h_am":                  rng.uniform(1.0, 6.0),
-        "cp_mass":               rng.uniform(2000, 4200),  # varies: rock, water, concrete
-
-        # ── Soil ─────────────────────────────────────────────────
-        "soil_C":                rng.uniform(1e6, 6e6),
-        "soil_U":                rng.uniform(0.2, 1.0),
-
-        # ── Heating ──────────────────────────────────────────────
-        "heater_max_w":          float(rng.choice([0, 1000, 2000, 3000, 5000, 8000, 10000])),
-        "setpoint":              setpoint,
-
-        # ── Cloud / radiation ────────────────────────────────────
-        "cloud_factor":          rng.uniform(0.2, 0.8),
-        "lw_radiation_scale":    rng.uniform(0.5, 0.9),
-
-        # ── Initial state ────────────────────────────────────────
-        # Vary so the model sees diverse starting conditions
-        "T_init":                rng.uniform(2, 20),
-        "T_mass_init":           rng.uniform(2, 20),
-        "T_soil_init":           rng.uniform(2, 18),
-    }
+    values = {}
+    for name, spec in PARAM_SPACE:
+        values[name] = rng.choice(spec) if isinstance(spec, list) else rng.uniform(*spec)
+    return _build_params(values)
+
+
+def params_from_unit(u: np.ndarray) -> dict:
+    """Map a point of the unit hypercube [0, 1)^N_DIMS to a param set."""
+    values = {}
+    for x, (name, spec) in zip(u, PARAM_SPACE):
+        if isinstance(spec, list):
+            values[name] = spec[min(int(x * len(spec)), len(spec) - 1)]
+        else:
+            values[name] = spec[0] + x * (spec[1] - spec[0])
+    return _build_params(values)
+
+
+def params_to_unit(params: dict) -> np.ndarray:
+    """Inverse of params_from_unit (choices map to the middle of their cell); accepts stored params."""
+    u = np.zeros(N_DIMS)
+    for i, (name, spec) in enumerate(PARAM_SPACE):
+        value = params["V"] / params["A_floor"] if name == "height" else params[name]
+        if isinstance(spec, list):
+            value = None if value == -1 and None in spec else value
+            u[i] = (spec.index(value) + 0.5) / len(spec)
+        else:
+            u[i] = (value - spec[0]) / (spec[1] - spec[0])
+    return u
+
+
+def sample_params(n: int, method: str, rng: np.random.Generator) -> list:
+    """
+    n param sets. "uniform" draws every parameter independently; "lhs" (Latin
+    hypercube) and "sobol" (scrambled Sobol sequence) spread the n points
+    evenly over the whole space, so fewer runs cover it equally well.
+    """
+    if method == "uniform":
+        return [random_params(rng) for _ in range(n)]
+    from scipy.stats import qmc
+    if method == "lhs":
+        points = qmc.LatinHypercube(d=N_DIMS, seed=rng).random(n)
+    elif method == "sobol":
+        # Sobol points are balanced in blocks of 2^m, so draw the enclosing block
+        points = qmc.Sobol(d=N_DIMS, scramble=True, seed=rng).random_base2(int(np.ceil(np.log2(max(n, 1)))))
+        # Shuffled: runs get locations round-robin, and Sobol points a power-of-two stride
+        # apart share a corner of the first dimensions, which would tie design to location
+        points = rng.permutation(points)[:n]
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+    return [params_from_unit(u) for u in points]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ACTIVE LEARNING
+# A quick tree-ensemble version of the inverse model (performance + climate →
+# design params) is trained on the runs so far. Where its trees disagree the
+# inverse model is uncertain, so the next runs go there. Candidates only have
+# design params until they are simulated, so a forward surrogate (params +
+# climate → performance) predicts where each would land first.
+# ─────────────────────────────────────────────────────────────────────────────
+
+# As in train_inverse_model.py
+PERFORMANCE_COLS = ["avg_Tin", "min_Tin", "hours_below_5c", "hours_below_0c", "total_Q_heater"]
+CLIMATE_COLS     = ["avg_Tout", "min_Tout", "avg_solar"]
+DESIGN_COLS      = ["A_floor", "V", "A_glass", "A_mass", "tau_glass", "U_day", "U_night", "thermal_mass_kg", "ACH"]
+
+
+def climate_stats(weather_df: pd.DataFrame) -> list:
+    """avg_Tout, min_Tout, avg_solar — the climate inputs of the inverse model."""
+    return [float(weather_df["Tout"].mean()), float(weather_df["Tout"].min()), float(weather_df["G"].mean())]
+
+
+def _tree_spread(model, X: np.ndarray) -> np.ndarray:
+    """Per-row disagreement between the ensemble's trees, averaged over outputs."""
+    per_tree = np.stack([tree.predict(X) for tree in model.estimators_])
+    return per_tree.std(axis=0).reshape(len(X), -1).mean(axis=1)
+
+
+def fit_surrogates(records: list, climates: list, seed: int = SEED) -> tuple:
+    """(forward, inverse) tree ensembles trained on simulated records; run_id picks each record's climate."""
+    from sklearn.ensemble import ExtraTreesRegressor
+    from sklearn.preprocessing import StandardScaler
+    X_design = np.array([params_to_unit(r["params"]) for r in records])
+    climate = np.array([climates[r["run_id"] % len(climates)] for r in records])
+    performance = np.array([[r["outputs"][c] for c in PERFORMANCE_COLS] for r in records], dtype=float)
+    design = np.array([[r["params"][c] for c in DESIGN_COLS] for r in records], dtype=float)
+
+    # Standardise targets so every output counts equally in the splits and the spread
+    perf_scaler = StandardScaler().fit(performance)
+    design_scaler = StandardScaler().fit(design)
+
+    forward = ExtraTreesRegressor(n_estimators=100, min_samples_leaf=2, random_state=seed, n_jobs=-1)
+    forward.fit(np.hstack([X_design, climate]), perf_scaler.transform(performance))
+    inverse = ExtraTreesRegressor(n_estimators=100, min_samples_leaf=2, random_state=seed, n_jobs=-1)
+    inverse.fit(np.hstack([perf_scaler.transform(performance), climate]), design_scaler.transform(design))
+    return forward, inverse
+
+
+def select_active(records: list, climates: list, run_ids: list, rng: np.random.Generator,
+                  pool_factor: int = None) -> list:
+    """
+    Param sets for `run_ids`, chosen from a Latin hypercube candidate pool
+    where the inverse model is most uncertain. Picks within a batch are
+    spread out by discounting candidates close to ones already taken.
+    """
+    from scipy.stats import qmc
+    pool_factor = pool_factor or ACTIVE_POOL_FACTOR
+    forward, inverse = fit_surrogates(records, climates)
+
+    chosen = {}
+    for loc in sorted({i % len(climates) for i in run_ids}):
+        slots = [i for i in run_ids if i % len(climates) == loc]
+        pool = qmc.LatinHypercube(d=N_DIMS, seed=rng).random(pool_factor * len(slots))
+        climate = np.tile(climates[loc], (len(pool), 1))
+        predicted = forward.predict(np.hstack([pool, climate]))
+        score = _tree_spread(inverse, np.hstack([predicted, climate]))
+
+        # Length scale: typical spacing of the pool
+        scale = np.sqrt(N_DIMS / 6.0) / len(pool) ** (1.0 / N_DIMS)
+        for run_id in slots:
+            best = int(np.argmax(score))
+            chosen[run_id] = params_from_unit(pool[best])
+            dist = np.linalg.norm(pool - pool[best], axis=1)
+            score = score * (1 - np.exp(-(dist / scale) ** 2))
+
+    return [chosen[i] for i in run_ids]
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -172,7 +341,7 @@ def random_params(rng: np.random.Generator) -> dict:
 def run_single(args: tuple) -> dict | None:
     """
     Run the sim for one param set + weather combo.
-    Returns a record dict or None if the run failed.
+    Returns a record dict, or {"run_id", "error"} if the run failed.
     """
     run_id, params, weather_df = args
 
@@ -180,7 +349,7 @@ def run_single(args: tuple) -> dict | None:
         result_df = simulate_greenhouse(weather_df, params)
 
         if result_df.empty:
-            return None
+            return {"run_id": run_id, "error": "simulation returned no rows"}
 
         # Serialise params — replace None setpoint with -1 for storage
         stored_params = {
@@ -205,27 +374,332 @@ def run_single(args: tuple) -> dict | None:
                 "hours_below_0c":   int((result_df["Tin"] < 0).sum()),
             },
         }
+        if TRAJECTORY_DIR:
+            # Taken out again by save_trajectories before the record is stored
+            record["trajectory"] = result_df[trajectory_store.CHANNELS].to_numpy(dtype=np.float32)
         return record
 
     except Exception as e:
+        return {"run_id": run_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def failed(result: dict) -> bool:
+    return "error" in result
+
+
+def save_trajectories(store, results: list):
+    """Move each result's trajectory into the store (if there is one), leaving the summary record."""
+    for result in results:
+        if failed(result):
+            continue
+        trajectory = result.pop("trajectory", None)
+        if store is not None and trajectory is not None:
+            trajectory_store.write_run(store, result["run_id"], trajectory, result["params"])
+    if store is not None:
+        trajectory_store.flush(store)
+
+
+def open_trajectory_store(create: bool):
+    if not TRAJECTORY_DIR:
         return None
+    if create:
+        return trajectory_store.create_store(TRAJECTORY_DIR, N_RUNS, TRAJECTORY_HOURS, PARAM_NAMES)
+    return trajectory_store.open_store(TRAJECTORY_DIR, mode="r+")
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# CHECKPOINT HELPERS
+# CHECKPOINTING
+# Local runs stream their records into numbered shard files in SHARD_DIR
+# (local_00000000.json, ...), each written atomically once FLUSH_EVERY runs
+# or FLUSH_SECONDS have accumulated, and merged into DB_PATH at the end,
+# which deletes the shards the checkpoint has counted. After a shard is on
+# disk, its runs are marked done in STATUS_FILE and the checkpoint
+# advances to the next shard number. A crash between those steps
+# leaves a shard the checkpoint has not counted; resuming re-reads just
+# those shards. A run is therefore submitted again only if no shard holds
+# it, and merge_shards skips run ids the DB already has: no duplicates, and
+# a crash costs at most the unflushed runs.
 # ─────────────────────────────────────────────────────────────────────────────
 
+PENDING, DONE, FAILED = 0, 1, 2
+
+
+def local_shard_path(seq: int) -> str:
+    return os.path.join(SHARD_DIR, f"local_{seq:08d}.json")
+
+
 def load_checkpoint() -> int:
-    """Returns the last completed run_id, or -1 if no checkpoint exists."""
+    """The next local shard number (0 if no checkpoint, or one from before shards)."""
     if os.path.exists(CHECKPOINT_FILE):
         with open(CHECKPOINT_FILE) as f:
-            return json.load(f).get("last_run_id", -1)
-    return -1
+            return json.load(f).get("next_shard", 0)
+    return 0
+
+
+def save_checkpoint(next_shard: int):
+    tmp = CHECKPOINT_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"next_shard": next_shard, "timestamp": str(datetime.now())}, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def open_status(n_runs: int = N_RUNS) -> np.ndarray:
+    """The run status bitmap, memory-mapped; created (or grown for a larger N_RUNS) as needed."""
+    if os.path.exists(STATUS_FILE):
+        status = np.load(STATUS_FILE, mmap_mode="r+")
+        if len(status) >= n_runs:
+            return status
+        old = np.array(status)
+        del status
+    else:
+        old = np.zeros(0, dtype=np.uint8)
+        # First run with a status file: runs saved by an earlier version are done
+        if os.path.exists(DB_PATH):
+            old = np.zeros(n_runs, dtype=np.uint8)
+            ids = [r["run_id"] for r in TinyDB(DB_PATH).all() if r.get("run_id", n_runs) < n_runs]
+            old[ids] = DONE
+    status = np.lib.format.open_memmap(STATUS_FILE + ".tmp", mode="w+", dtype=np.uint8, shape=(n_runs,))
+    status[:len(old)] = old
+    status.flush()
+    del status
+    os.replace(STATUS_FILE + ".tmp", STATUS_FILE)
+    return np.load(STATUS_FILE, mmap_mode="r+")
+
+
+def reconcile(status: np.ndarray, next_shard: int) -> int:
+    """Mark the runs of shards written after the checkpoint done; returns the next free shard number."""
+    seq = next_shard
+    while os.path.exists(local_shard_path(seq)):
+        with open(local_shard_path(seq)) as f:
+            status[[r["run_id"] for r in json.load(f)["_default"].values()]] = DONE
+        seq += 1
+    if seq != next_shard:
+        status.flush()
+        save_checkpoint(seq)
+    return seq
+
+
+def load_failures() -> dict:
+    """run_id → {"attempts", "error"} from the failure log."""
+    failures = {}
+    if os.path.exists(FAILURES_FILE):
+        with open(FAILURES_FILE) as f:
+            for line in f:
+                entry = json.loads(line)
+                prev = failures.get(entry["run_id"], {"attempts": 0})
+                failures[entry["run_id"]] = {"attempts": prev["attempts"] + 1, "error": entry["error"]}
+    return failures
+
+
+def flush_results(results: list, status: np.ndarray, seq: int, store) -> int:
+    """Persist one shard's worth of results (see CHECKPOINTING). Returns the next shard number."""
+    save_trajectories(store, results)
+    records = [r for r in results if not failed(r)]
+    errors = [r for r in results if failed(r)]
+    if records:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        tmp = local_shard_path(seq) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"_default": {str(i + 1): r for i, r in enumerate(records)}}, f)
+        os.replace(tmp, local_shard_path(seq))
+        seq += 1
+    if errors:
+        with open(FAILURES_FILE, "a") as f:
+            for r in errors:
+                f.write(json.dumps({"run_id": r["run_id"], "error": r["error"], "at": str(datetime.now())}) + "\n")
+    status[[r["run_id"] for r in records]] = DONE
+    status[[r["run_id"] for r in errors]] = FAILED
+    status.flush()
+    save_checkpoint(seq)
+    return seq
+
+
+def load_records(db_path: str = DB_PATH) -> list:
+    """Every saved record: the DB's and those still in local shards."""
+    records = TinyDB(db_path).all() if os.path.exists(db_path) else []
+    seen = {r["run_id"] for r in records}
+    for name in sorted(os.listdir(SHARD_DIR)) if os.path.isdir(SHARD_DIR) else []:
+        if name.startswith("local_") and name.endswith(".json"):
+            with open(os.path.join(SHARD_DIR, name)) as f:
+                records += [r for r in json.load(f)["_default"].values() if r["run_id"] not in seen]
+    return records
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MULTI-HOST MODE
+# The coordinator splits run ids into leases in a shared SQLite queue. Each
+# worker leases a range, runs it on all local cores, writes the range's
+# records to its own shard file and marks the lease done; a heartbeat keeps
+# the lease alive meanwhile. Param sets depend only on run_id (every worker
+# draws the same seeded design), so a reclaimed lease reproduces the same
+# runs and a shard written twice is identical. Failed runs are appended to
+# the worker's own failures_<worker>.jsonl in SHARD_DIR, which the
+# coordinator reports after merging.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def planned_params(n_runs: int = N_RUNS) -> list:
+    """The full seeded design, identical on every host."""
+    if SAMPLING == "active":
+        raise ValueError("Active sampling needs every finished run before choosing the next; "
+                         "use \"lhs\" or \"sobol\" in multi-host mode")
+    return sample_params(n_runs, SAMPLING, np.random.default_rng(SEED))
+
+
+def shard_path(start: int) -> str:
+    return os.path.join(SHARD_DIR, f"runs_{start:08d}.json")
+
+
+def write_shard(start: int, records: list):
+    """Write a lease's records atomically, so a shard on disk is always complete."""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    tmp = f"{shard_path(start)}.{work_queue.worker_name().replace(':', '_')}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"_default": {str(i + 1): r for i, r in enumerate(records)}}, f)
+    os.replace(tmp, shard_path(start))
+
+
+def worker_failures_path(worker: str) -> str:
+    return os.path.join(SHARD_DIR, f"failures_{worker.replace(':', '_')}.jsonl")
 
 
-def save_checkpoint(run_id: int):
-    with open(CHECKPOINT_FILE, "w") as f:
-        json.dump({"last_run_id": run_id, "timestamp": str(datetime.now())}, f)
+def log_worker_failures(worker: str, start: int, errors: list):
+    """Append a lease's failed runs to this worker's failure log, next to its shards."""
+    if not errors:
+        return
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    with open(worker_failures_path(worker), "a") as f:
+        for r in errors:
+            f.write(json.dumps({"run_id": r["run_id"], "error": r["error"], "worker": worker,
+                                "lease": start, "at": str(datetime.now())}) + "\n")
+
+
+def load_worker_failures() -> dict:
+    """run_id → {"error", "worker"} from every worker's failure log (latest entry wins)."""
+    failures = {}
+    for name in sorted(os.listdir(SHARD_DIR)) if os.path.isdir(SHARD_DIR) else []:
+        if name.startswith("failures_") and name.endswith(".jsonl"):
+            with open(os.path.join(SHARD_DIR, name)) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    failures[entry["run_id"]] = {"error": entry["error"], "worker": entry["worker"]}
+    return failures
+
+
+def _heartbeat(start: int, worker: str, stop: threading.Event):
+    while not stop.wait(LEASE_TTL / 3):
+        if not work_queue.renew(QUEUE_PATH, start, worker, LEASE_TTL):
+            print(f"  Lease {start} was reclaimed by another worker; finishing it anyway")
+            return
+
+
+def run_worker():
+    worker = work_queue.worker_name()
+    print(f"Worker {worker} | queue {QUEUE_PATH}")
+    print("Fetching weather data...")
+    location_list = list(fetch_all_weather().values())
+    planned = planned_params()
+
+    if not work_queue.is_ready(QUEUE_PATH):
+        print(f"Waiting for the coordinator to create the queue at {QUEUE_PATH}...")
+        while not work_queue.is_ready(QUEUE_PATH):
+            time.sleep(POLL_INTERVAL)
+    store = open_trajectory_store(create=False)
+
+    with Pool(processes=os.cpu_count()) as pool:
+        while True:
+            lease = work_queue.acquire(QUEUE_PATH, worker, LEASE_TTL)
+            if lease is None:
+                st = work_queue.status(QUEUE_PATH)
+                if st["done"] == st["total"]:
+                    break
+                # Others hold the rest; wait in case one of them dies and its lease expires
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            start, stop = lease["start"], lease["stop"]
+            beat = threading.Event()
+            threading.Thread(target=_heartbeat, args=(start, worker, beat), daemon=True).start()
+            try:
+                batch = [(i, planned[i], location_list[i % len(location_list)]) for i in range(start, stop)]
+                results = pool.map(run_single, batch)
+                save_trajectories(store, results)
+                records = [r for r in results if not failed(r)]
+                log_worker_failures(worker, start, [r for r in results if failed(r)])
+                write_shard(start, records)
+                work_queue.complete(QUEUE_PATH, start)
+            finally:
+                beat.set()
+            print(f"  Lease {start}-{stop - 1} done | saved {len(records)}/{stop - start} (attempt {lease['attempts']})"
+                  + (f" | failed {stop - start - len(records)}" if len(records) < stop - start else ""))
+
+    print(f"Worker {worker}: queue finished")
+
+
+def merge_shards(db_path: str = DB_PATH) -> int:
+    """
+    Append every shard's records not already in the main DB, in one write,
+    then delete the local shards below the checkpoint: their runs are in
+    the DB and marked done in the flushed status file, so nothing reads
+    them again. Returns the number merged.
+    """
+    db = TinyDB(db_path)
+    seen = {r["run_id"] for r in db.all()}
+    records = []
+    local = []
+    for name in sorted(os.listdir(SHARD_DIR)) if os.path.isdir(SHARD_DIR) else []:
+        if not (name.startswith(("runs_", "local_")) and name.endswith(".json")):
+            continue
+        with open(os.path.join(SHARD_DIR, name)) as f:
+            for r in json.load(f)["_default"].values():
+                if r["run_id"] not in seen:
+                    seen.add(r["run_id"])
+                    records.append(r)
+        if name.startswith("local_"):
+            local.append(name)
+    if records:
+        db.insert_multiple(records)
+
+    next_shard = load_checkpoint()
+    for name in local:
+        if int(name[len("local_"):-len(".json")]) < next_shard:
+            os.remove(os.path.join(SHARD_DIR, name))
+    return len(records)
+
+
+def run_coordinator():
+    planned_params()  # fail fast on a design workers could not reproduce
+    # The trajectory store first: workers open it as soon as the queue exists
+    open_trajectory_store(create=True)
+    n_leases = work_queue.init_queue(QUEUE_PATH, N_RUNS, LEASE_SIZE)
+    print(f"Queue {QUEUE_PATH}: {N_RUNS} runs in {n_leases} leases of {LEASE_SIZE}")
+    print("Start workers on any host with:  python generate_training_data.py worker\n")
+
+    while True:
+        st = work_queue.status(QUEUE_PATH)
+        print(
+            f"  Leases done: {st['done']}/{st['total']} | "
+            f"running: {st['leased']} | expired: {st['expired']} | "
+            f"workers: {len(st['workers'])}"
+        )
+        if st["done"] == st["total"]:
+            break
+        time.sleep(POLL_INTERVAL)
+
+    merged = merge_shards()
+    print(f"\n✓ Merged {merged} records from {SHARD_DIR}/ → {DB_PATH}\n")
+
+    # A run that failed once but was saved by a later attempt (a reclaimed lease) is not a failure
+    saved = {r["run_id"] for r in TinyDB(DB_PATH).all()}
+    failures = {i: f for i, f in load_worker_failures().items() if i not in saved}
+    if failures:
+        by_worker = {}
+        for f in failures.values():
+            by_worker[f["worker"]] = by_worker.get(f["worker"], 0) + 1
+        print(f"✗ {len(failures)} runs failed (see {SHARD_DIR}/failures_*.jsonl)")
+        for worker, count in sorted(by_worker.items()):
+            print(f"    {worker}: {count}")
+        run_id, first = min(failures.items())
+        print(f"    e.g. run {run_id}: {first['error']}\n")
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -248,64 +722,87 @@ def main():
     location_names = list(weather_cache.keys())
     print(f"\n✓ Weather ready for {len(location_names)} locations\n")
 
-    # ── Step 2: Check for existing checkpoint ────────────────────
-    last_completed = load_checkpoint()
-    start_from = last_completed + 1
-    if start_from > 0:
-        print(f"Resuming from run {start_from} (checkpoint found)\n")
-
-    # ── Step 3: Build all jobs ────────────────────────────────────
+    # ── Step 2: Work out what is left from the checkpoint ───────
+    status = open_status(N_RUNS)
+    seq = reconcile(status, load_checkpoint())
+    failures = load_failures()
+    attempts = np.zeros(N_RUNS, dtype=int)
+    for run_id, f in failures.items():
+        if run_id < N_RUNS:
+            attempts[run_id] = f["attempts"]
+    retry = attempts < MAX_ATTEMPTS
+    todo = (status[:N_RUNS] == PENDING) | ((status[:N_RUNS] == FAILED) & retry)
+    n_done = int((status[:N_RUNS] == DONE).sum())
+    if n_done or failures:
+        print(f"Resuming: {n_done} runs saved, {int(((status[:N_RUNS] == FAILED) & retry).sum())} "
+              f"failed runs to retry, {int(((status[:N_RUNS] == FAILED) & ~retry).sum())} given up on\n")
+
+    # ── Step 3: Draw the space-filling part of the design ───────
     rng = np.random.default_rng(SEED)
     location_list = list(weather_cache.values())
+    climates = [climate_stats(df) for df in location_list]
 
-    jobs = []
-    for i in range(N_RUNS):
-        params = random_params(rng)
-        # Assign each run a location round-robin so all locations get coverage
-        weather_df = location_list[i % len(location_list)]
-        jobs.append((i, params, weather_df))
+    n_planned = int(ACTIVE_INITIAL * N_RUNS) if SAMPLING == "active" else N_RUNS
+    planned = sample_params(n_planned, "sobol" if SAMPLING == "active" else SAMPLING, rng)
+    print(f"Sampling: {SAMPLING} | Jobs to process: {int(todo.sum())}\n")
 
-    # Skip already completed runs
-    jobs = [j for j in jobs if j[0] >= start_from]
-    print(f"Jobs to process: {len(jobs)}\n")
-
-    # ── Step 4: Run in parallel with checkpointing ───────────────
-    db = TinyDB(DB_PATH)
+    # ── Step 4: Run in parallel, checkpointing every run ────────
+    store = open_trajectory_store(create=True)
     completed = 0
-    failed    = 0
+    failed_now = 0
 
-    BATCH_SIZE = 200  # save checkpoint every N runs
+    # Active sampling refits its surrogates every ACTIVE_BATCH runs; planned runs need no blocks
+    ACTIVE_BATCH = 200
+    block_size = ACTIVE_BATCH if SAMPLING == "active" else N_RUNS
 
     with Pool(processes=n_cores) as pool:
-        for batch_start in range(0, len(jobs), BATCH_SIZE):
-            batch = jobs[batch_start : batch_start + BATCH_SIZE]
-            results = pool.map(run_single, batch)
-
-            for result in results:
-                if result is not None:
-                    db.insert(result)
-                    completed += 1
+        for block_start in range(0, N_RUNS, block_size):
+            block = range(block_start, min(block_start + block_size, N_RUNS))
+            run_ids = [i for i in block if todo[i]]
+            if not run_ids:
+                continue
+            params = {i: planned[i] for i in run_ids if i < n_planned}
+            active_ids = [i for i in block if i >= n_planned]
+            if active_ids:
+                # Past the planned design: let the runs so far decide where to sample
+                # (rng seeded per block so a resumed run draws from the same stream)
+                picks = select_active(load_records(), climates, active_ids,
+                                      np.random.default_rng([SEED, active_ids[0]]))
+                params.update(zip(active_ids, picks))
+
+            # Assign each run a location round-robin so all locations get coverage
+            batch = [(i, params[i], location_list[i % len(location_list)]) for i in run_ids]
+            pending, last_flush = [], time.monotonic()
+            for result in pool.imap_unordered(run_single, batch, chunksize=max(1, min(16, len(batch) // (4 * n_cores)))):
+                pending.append(result)
+                if failed(result):
+                    failed_now += 1
+                    print(f"  Run {result['run_id']} failed: {result['error']}")
                 else:
-                    failed += 1
-
-            last_id = batch[-1][0]
-            save_checkpoint(last_id)
+                    completed += 1
+                if len(pending) >= FLUSH_EVERY or time.monotonic() - last_flush >= FLUSH_SECONDS:
+                    seq = flush_results(pending, status, seq, store)
+                    pending, last_flush = [], time.monotonic()
+                    print(f"  Progress: {int((status[:N_RUNS] == DONE).sum())}/{N_RUNS} saved | "
+                          f"Saved now: {completed} | Failed: {failed_now}")
+            if pending:
+                seq = flush_results(pending, status, seq, store)
 
-            total_done = batch_start + len(batch)
-            print(
-                f"  Progress: {total_done}/{len(jobs)} | "
-                f"Saved: {completed} | "
-                f"Failed: {failed}"
-            )
+    merged = merge_shards(DB_PATH)
 
     # ── Done ─────────────────────────────────────────────────────
     print(f"\n{'='*55}")
     print(f"  Complete!")
-    print(f"  Saved  : {completed} records")
-    print(f"  Failed : {failed} runs")
+    print(f"  Saved  : {completed} records this session ({merged} merged into the DB)")
+    print(f"  Failed : {failed_now} runs (see {FAILURES_FILE})")
     print(f"  Output : {DB_PATH}")
     print(f"{'='*55}\n")
 
-
 if __name__ == "__main__":
-    main()
+    mode = sys.argv[1] if len(sys.argv) > 1 else "local"
+    if mode == "coordinator":
+        run_coordinator()
+    elif mode == "worker":
+        run_worker()
+    else:
+        main()
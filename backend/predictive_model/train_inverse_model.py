@@ -25,7 +25,9 @@ Usage:
     python train_inverse_model.py
 
 The best model checkpoint is saved automatically during training.
-A predict() helper at the bottom can be imported directly by your backend.
+A predict() helper at the bottom can be imported directly by your backend
+(predict_for_location() looks the climate inputs up in the feature store);
+nearest_designs() answers from the simulated runs themselves.
 """
 
 import json
@@ -38,8 +40,11 @@ from pathlib import Path
 import torch
 import torch.nn as nn
 from torch.utils.data import Dataset, DataLoader, random_split
+from sklearn.neighbors import KDTree
 from sklearn.preprocessing import StandardScaler
 
+from backend.predictive_model import climate_features
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 # CONFIG — adjust paths and hyperparameters here
@@ -49,7 +54,8 @@ DB_PATH           = "training_data.json"   # output from generate_training_data.
 MODEL_OUT         = "inverse_model.pt"     # saved model weights
 SCALER_X_OUT      = "scaler_X.pkl"        # saved input scaler
 SCALER_Y_OUT      = "scaler_Y.pkl"        # saved output scaler
-WEATHER_CACHE     = "weather_stats_cache.json"
+INDEX_OUT         = "design_index.pkl"    # nearest-neighbour index over the runs
+FEATURE_DIR       = "climate_features"     # climate feature store (climate_features.py)
 
 SEED              = 42
 BATCH_SIZE        = 64
@@ -93,65 +99,56 @@ OUTPUT_COLS = [
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# STEP 1 — WEATHER STATS
-# Compute avg/min outdoor temp and avg solar for each location.
-# Results are cached so this only runs once (takes ~30s on first run).
+# STEP 1 — CLIMATE FEATURES
+# avg/min outdoor temp and avg solar (plus the richer descriptors of
+# climate_features.py) for each location, from the feature store. A year
+# is downloaded only the first time a location is seen (~30s for all).
 # ──────────────────────────────────────────────────────────────────────────────
 
-def fetch_weather_stats(lat: float, lon: float, year: str) -> dict:
-    """Pull a full year of hourly data and return summary stats."""
+def fetch_weather(location: dict, year: str) -> pd.DataFrame:
+    """A full year of hourly weather from the Open-Meteo archive (datetime, Tout, G, RH)."""
     url = "https://archive-api.open-meteo.com/v1/archive"
     params = {
-        "latitude": lat, "longitude": lon,
+        "latitude": location["lat"], "longitude": location["lon"],
         "start_date": f"{year}-01-01",
         "end_date":   f"{year}-12-31",
-        "hourly": ["temperature_2m", "shortwave_radiation"],
+        "hourly": ["temperature_2m", "shortwave_radiation", "relative_humidity_2m"],
         "timezone": "auto",
     }
     resp = requests.get(url, params=params, timeout=30)
     resp.raise_for_status()
     hourly = resp.json()["hourly"]
 
-    temps = np.array(hourly["temperature_2m"], dtype=float)
-    solar = np.array(hourly["shortwave_radiation"], dtype=float)
-
-    # Drop NaN rows
-    valid_t = temps[~np.isnan(temps)]
-    valid_s = solar[~np.isnan(solar)]
-
-    return {
-        "avg_Tout":  float(np.mean(valid_t)),
-        "min_Tout":  float(np.min(valid_t)),
-        "avg_solar": float(np.mean(valid_s)),
-    }
+    df = pd.DataFrame({
+        "datetime": pd.to_datetime(hourly["time"]),
+        "Tout": np.array(hourly["temperature_2m"], dtype=float),
+        "G":    np.array(hourly["shortwave_radiation"], dtype=float),
+        "RH":   np.array(hourly["relative_humidity_2m"], dtype=float) / 100.0,
+    })
+    # Fill the odd missing hour so every day stays 24 rows long
+    return df.interpolate(limit_direction="both")
 
 
-def get_location_stats() -> dict:
+def get_location_stats(year: str = YEAR) -> dict:
     """
-    Load weather stats from cache if available, otherwise fetch and cache them.
+    Climate features of every location from the feature store, fetching
+    and caching the ones it does not have yet.
     Returns a dict keyed by location index (as string): {"0": {...}, "1": {...}, ...}
     """
-    if Path(WEATHER_CACHE).exists():
-        print(f"Loading weather stats from cache ({WEATHER_CACHE})")
-        with open(WEATHER_CACHE) as f:
-            return json.load(f)
+    print(f"Loading climate features ({FEATURE_DIR}/, locations not cached yet are fetched)...")
+    features = climate_features.get_features(LOCATIONS, year, fetch_weather, FEATURE_DIR)
 
-    print("Fetching weather stats for all locations (this runs once and is cached)...")
     stats = {}
-    for i, loc in enumerate(LOCATIONS):
-        print(f"  {loc['name']}...", end=" ", flush=True)
-        try:
-            s = fetch_weather_stats(loc["lat"], loc["lon"], YEAR)
-            stats[str(i)] = s
-            print(f"avg_Tout={s['avg_Tout']:.1f}°C  min_Tout={s['min_Tout']:.1f}°C  avg_solar={s['avg_solar']:.1f} W/m²")
-        except Exception as e:
-            print(f"FAILED ({e}) — using fallback values")
+    for i, (loc, f) in enumerate(zip(LOCATIONS, features)):
+        if f is None:
+            print(f"  {loc['name']}: FAILED — using fallback values")
             # Reasonable cold-climate fallbacks so training still works
-            stats[str(i)] = {"avg_Tout": 8.0, "min_Tout": -18.0, "avg_solar": 140.0}
-
-    with open(WEATHER_CACHE, "w") as f:
-        json.dump(stats, f, indent=2)
-    print(f"Weather stats cached → {WEATHER_CACHE}\n")
+            f = {"avg_Tout": 8.0, "min_Tout": -18.0, "avg_solar": 140.0}
+        else:
+            print(f"  {loc['name']}: avg_Tout={f['avg_Tout']:.1f}°C  min_Tout={f['min_Tout']:.1f}°C  "
+                  f"avg_solar={f['avg_solar']:.1f} W/m²  hdd_18={f['hdd_18']:.0f}")
+        stats[str(i)] = f
+    print()
     return stats
 
 
@@ -179,6 +176,8 @@ def load_data(db_path: str, location_stats: dict) -> pd.DataFrame:
             weather = location_stats[loc_idx]
 
             row = {
+                "run_id":          run_id,
+
                 # ── Model inputs (performance targets + climate) ──────────
                 "avg_Tin":         outputs["avg_Tin"],
                 "min_Tin":         outputs["min_Tin"],
@@ -332,6 +331,27 @@ def run_training(model, train_loader, val_loader, optimizer, epochs, patience):
     return best_val_loss
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# STEP 7 — NEAREST-NEIGHBOUR INDEX
+# KD-tree over the scaled INPUT_COLS of every run. A lookup returns the
+# simulated designs whose performance and climate come closest to a query —
+# real simulation results rather than a model's guess.
+# ──────────────────────────────────────────────────────────────────────────────
+
+def build_design_index(df: pd.DataFrame, scaler_X: StandardScaler, index_path: str = INDEX_OUT) -> dict:
+    """Build the KD-tree over df (as returned by load_data) and save it with the runs it indexes."""
+    index = {
+        "tree":    KDTree(scaler_X.transform(df[INPUT_COLS].values.astype(np.float32)), leaf_size=16),
+        "scaler":  scaler_X,
+        "run_ids": df["run_id"].values,
+        "inputs":  df[INPUT_COLS].values,
+        "designs": df[OUTPUT_COLS].values,
+    }
+    joblib.dump(index, index_path)
+    print(f"Design index ({len(df)} runs) saved → {index_path}")
+    return index
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # MAIN
 # ──────────────────────────────────────────────────────────────────────────────
@@ -362,7 +382,9 @@ def main():
 
     joblib.dump(scaler_X, SCALER_X_OUT)
     joblib.dump(scaler_Y, SCALER_Y_OUT)
-    print(f"Scalers saved → {SCALER_X_OUT}, {SCALER_Y_OUT}\n")
+    print(f"Scalers saved → {SCALER_X_OUT}, {SCALER_Y_OUT}")
+    build_design_index(df, scaler_X)
+    print()
 
     # ── Train / val / test split ──────────────────────────────────────────────
     dataset = GreenhouseDataset(X, Y)
@@ -433,6 +455,23 @@ def main():
 #   # → {"A_floor": (42.3, 89.1), "V": (98.0, 210.4), ...}
 # ──────────────────────────────────────────────────────────────────────────────
 
+def load_inverse_model(model_path: str = MODEL_OUT, scaler_x_path: str = SCALER_X_OUT,
+                       scaler_y_path: str = SCALER_Y_OUT) -> tuple:
+    """(model in eval mode, scaler_X, scaler_Y) as saved by main()."""
+    scaler_X = joblib.load(scaler_x_path)
+    scaler_Y = joblib.load(scaler_y_path)
+
+    model = InverseDesignModel(
+        in_dim      = len(INPUT_COLS),
+        out_dim     = len(OUTPUT_COLS),
+        hidden_dims = HIDDEN_DIMS,
+        dropout     = DROPOUT,
+    )
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+    return model, scaler_X, scaler_Y
+
+
 def predict(
     avg_Tin:         float,
     min_Tin:         float,
@@ -445,6 +484,7 @@ def predict(
     model_path:      str = MODEL_OUT,
     scaler_x_path:   str = SCALER_X_OUT,
     scaler_y_path:   str = SCALER_Y_OUT,
+    index_path:      str = INDEX_OUT,
 ) -> dict:
     """
     Run inference and return recommended design parameter ranges.
@@ -461,18 +501,23 @@ def predict(
             "thermal_mass_kg": (low, high),
             "ACH":             (low, high),
         }
-    """
-    scaler_X = joblib.load(scaler_x_path)
-    scaler_Y = joblib.load(scaler_y_path)
 
-    model = InverseDesignModel(
-        in_dim      = len(INPUT_COLS),
-        out_dim     = len(OUTPUT_COLS),
-        hidden_dims = HIDDEN_DIMS,
-        dropout     = DROPOUT,
-    )
-    model.load_state_dict(torch.load(model_path, map_location="cpu"))
-    model.eval()
+    If the model or either scaler is missing or cannot be loaded (e.g. no
+    model trained yet, or a training run interrupted mid-save), the ranges
+    come from the nearest simulated runs instead (neighbour_ranges), if the
+    design index at index_path exists.
+    """
+    try:
+        model, scaler_X, scaler_Y = load_inverse_model(model_path, scaler_x_path, scaler_y_path)
+    except Exception:
+        if not Path(index_path).exists():
+            raise
+        return neighbour_ranges(
+            index_path=index_path,
+            avg_Tin=avg_Tin, min_Tin=min_Tin, hours_below_5c=hours_below_5c,
+            hours_below_0c=hours_below_0c, total_Q_heater=total_Q_heater,
+            avg_Tout=avg_Tout, min_Tout=min_Tout, avg_solar=avg_solar,
+        )
 
     x_raw = np.array([[
         avg_Tin, min_Tin, hours_below_5c, hours_below_0c,
@@ -493,5 +538,88 @@ def predict(
     }
 
 
+
+def predict_for_location(lat: float, lon: float, year: str = YEAR, **targets) -> dict:
+    """
+    predict() with the climate inputs looked up in the feature store for
+    the location, e.g. predict_for_location(41.9, -87.6, avg_Tin=15,
+    min_Tin=5, hours_below_5c=200, hours_below_0c=0, total_Q_heater=0).
+    """
+    features = climate_features.get_features([{"lat": lat, "lon": lon}], year, fetch_weather, FEATURE_DIR)[0]
+    if features is None:
+        raise ValueError(f"No weather for ({lat}, {lon}) in {year}")
+    return predict(**targets, avg_Tout=features["avg_Tout"], min_Tout=features["min_Tout"],
+                   avg_solar=features["avg_solar"])
+
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# NEAREST-DESIGN LOOKUP
+# Exact-simulation answer alongside (or instead of) predict(). The index is
+# loaded once per process, after which a lookup takes well under a millisecond.
+#
+# Example:
+#   from train_inverse_model import nearest_designs
+#   nearest_designs(avg_Tin=15, min_Tin=5, ..., avg_solar=180, k=5)
+#   # → [{"run_id": 1234, "distance": 0.21, "inputs": {...}, "design": {...}}, ...]
+# ──────────────────────────────────────────────────────────────────────────────
+
+_INDEXES = {}
+
+
+def load_design_index(index_path: str = INDEX_OUT) -> dict:
+    if index_path not in _INDEXES:
+        _INDEXES[index_path] = joblib.load(index_path)
+    return _INDEXES[index_path]
+
+
+def nearest_designs(
+    avg_Tin:         float,
+    min_Tin:         float,
+    hours_below_5c:  float,
+    hours_below_0c:  float,
+    total_Q_heater:  float,
+    avg_Tout:        float,
+    min_Tout:        float,
+    avg_solar:       float,
+    k:               int = 5,
+    index_path:      str = INDEX_OUT,
+) -> list:
+    """
+    The k simulated runs closest to the targets and climate, nearest first.
+    Distance is Euclidean in the scaled INPUT_COLS space.
+    """
+    index = load_design_index(index_path)
+    x = index["scaler"].transform(np.array([[
+        avg_Tin, min_Tin, hours_below_5c, hours_below_0c,
+        total_Q_heater, avg_Tout, min_Tout, avg_solar,
+    ]], dtype=np.float32))
+
+    dist, idx = index["tree"].query(x, k=min(k, len(index["run_ids"])))
+    return [
+        {
+            "run_id":   int(index["run_ids"][i]),
+            "distance": round(float(d), 4),
+            "inputs":   {col: float(v) for col, v in zip(INPUT_COLS, index["inputs"][i])},
+            "design":   {col: float(v) for col, v in zip(OUTPUT_COLS, index["designs"][i])},
+        }
+        for d, i in zip(dist[0], idx[0])
+    ]
+
+
+def neighbour_ranges(k: int = 50, index_path: str = INDEX_OUT, **targets) -> dict:
+    """
+    predict()-style (low, high) ranges from the Q_LOW/Q_HIGH quantiles of
+    the k nearest runs' designs — a fallback when no trained model exists.
+    Takes the same keyword targets as nearest_designs.
+    """
+    neighbours = nearest_designs(k=k, index_path=index_path, **targets)
+    designs = np.array([[n["design"][col] for col in OUTPUT_COLS] for n in neighbours])
+    low, high = np.quantile(designs, [Q_LOW, Q_HIGH], axis=0)
+    return {
+        col: (round(float(lo), 2), round(float(hi), 2))
+        for col, lo, hi in zip(OUTPUT_COLS, low, high)
+    }
+
 if __name__ == "__main__":
     main()
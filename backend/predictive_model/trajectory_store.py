@@ -0,0 +1,116 @@
+"""
+Full-trajectory dataset store
+-------------------------------
+Keeps every run's hourly trajectories for sequence models, next to the
+scalar summaries in training_data.json. A store is a directory of .npy
+files, all preallocated at creation and memory-mapped:
+
+    trajectories.npy   runs × hours × channels (float16 by default)
+    params.npy         runs × params (float32; a None setpoint is -1 as in the DB)
+    lengths.npy        hours actually written per run (0 = run not written yet)
+    meta.json          channel and param names, dtype, shape
+
+Runs are written in place by run_id, so any number of processes or hosts
+can fill disjoint rows of the same store. float16 holds temperatures to
+about 0.01 K and heater power to a few watts; an annual run of 4 channels
+takes 70 kB, so 30 000 runs fit in about 2 GB.
+
+random_windows() serves training batches straight from the memory map:
+only the pages holding the sampled windows are read.
+"""
+
+import json
+import os
+
+import numpy as np
+
+CHANNELS = ["Tin", "T_mass", "T_soil", "Q_heater"]
+DTYPE = "float16"
+
+
+def _path(store_dir: str, name: str) -> str:
+    return os.path.join(store_dir, name)
+
+
+def create_store(store_dir: str, n_runs: int, n_hours: int, param_names: list,
+                 channels: list = None, dtype: str = DTYPE) -> dict:
+    """Preallocate an empty store; an existing store of the same shape is opened as is."""
+    channels = channels or CHANNELS
+    meta = {
+        "n_runs": n_runs,
+        "n_hours": n_hours,
+        "channels": channels,
+        "params": list(param_names),
+        "dtype": dtype,
+    }
+    if os.path.exists(_path(store_dir, "meta.json")):
+        store = open_store(store_dir, mode="r+")
+        existing = {k: store["meta"][k] for k in meta}
+        if existing != meta:
+            raise ValueError(f"Store at {store_dir} already exists with a different layout: {existing}")
+        return store
+
+    os.makedirs(store_dir, exist_ok=True)
+    np.lib.format.open_memmap(_path(store_dir, "trajectories.npy"), mode="w+", dtype=dtype,
+                              shape=(n_runs, n_hours, len(channels)))
+    np.lib.format.open_memmap(_path(store_dir, "params.npy"), mode="w+", dtype="float32",
+                              shape=(n_runs, len(param_names)))
+    np.lib.format.open_memmap(_path(store_dir, "lengths.npy"), mode="w+", dtype="int32", shape=(n_runs,))
+    # meta.json last: its presence marks a fully allocated store
+    with open(_path(store_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return open_store(store_dir, mode="r+")
+
+
+def open_store(store_dir: str, mode: str = "r") -> dict:
+    with open(_path(store_dir, "meta.json")) as f:
+        meta = json.load(f)
+    return {
+        "meta": meta,
+        "trajectories": np.load(_path(store_dir, "trajectories.npy"), mmap_mode=mode),
+        "params": np.load(_path(store_dir, "params.npy"), mmap_mode=mode),
+        "lengths": np.load(_path(store_dir, "lengths.npy"), mmap_mode=mode),
+    }
+
+
+def write_run(store: dict, run_id: int, trajectory: np.ndarray, params: dict):
+    """Write one run's (hours × channels) trajectory and params into its row."""
+    meta = store["meta"]
+    n = min(len(trajectory), meta["n_hours"])
+    store["trajectories"][run_id, :n] = trajectory[:n]
+    store["params"][run_id] = [
+        -1.0 if params.get(name) is None else float(params[name]) for name in meta["params"]
+    ]
+    # Length last, so a reader never sees a run marked written before its data is
+    store["lengths"][run_id] = n
+
+
+def flush(store: dict):
+    for key in ("trajectories", "params", "lengths"):
+        store[key].flush()
+
+
+def random_windows(store: dict, window: int, batch_size: int, rng: np.random.Generator = None,
+                   runs: np.ndarray = None, channels: list = None):
+    """
+    Endless generator of (windows, params, run_ids) batches:
+    windows is batch × window × channels float32, params is batch × params.
+    Windows start at random hours of random written runs (or of `runs`,
+    e.g. a train/validation split of run ids).
+    """
+    rng = rng or np.random.default_rng()
+    meta = store["meta"]
+    channel_idx = [meta["channels"].index(c) for c in (channels or meta["channels"])]
+    lengths = np.asarray(store["lengths"])
+    eligible = np.flatnonzero(lengths >= window) if runs is None else np.asarray(runs)[lengths[runs] >= window]
+    if len(eligible) == 0:
+        raise ValueError(f"No written run has {window} hours")
+
+    trajectories, params = store["trajectories"], store["params"]
+    while True:
+        run_ids = np.sort(rng.choice(eligible, size=batch_size))     # sorted: reads move forward through the file
+        starts = rng.integers(0, lengths[run_ids] - window + 1)
+        batch = np.empty((batch_size, window, len(channel_idx)), dtype=np.float32)
+        for b, (r, s) in enumerate(zip(run_ids, starts)):
+            batch[b] = trajectories[r, s:s + window][:, channel_idx]
+        yield batch, np.asarray(params[run_ids], dtype=np.float32), run_ids
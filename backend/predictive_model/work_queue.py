@@ -0,0 +1,142 @@
+"""
+Lease-based work queue
+------------------------
+Splits run ids 0..N-1 into fixed ranges ("leases") kept in one SQLite file
+on storage every host can reach. Workers lease a range, process it, and
+mark it done. A lease that is not renewed or finished before its expiry
+goes back to the pool for the next worker that asks, so a crashed worker
+loses at most the lease it held.
+
+No server is involved: SQLite's own file locking serialises the small
+lease transactions, which are rare next to the simulations they hand out.
+Network filesystems need working POSIX locks for this (NFSv4, SMB with
+locking enabled).
+"""
+
+import os
+import sqlite3
+import socket
+import time
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Long timeout: with many workers a transaction may wait for others to finish theirs
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    return conn
+
+
+def init_queue(path: str, n_runs: int, lease_size: int) -> int:
+    """Create the queue for run ids 0..n_runs-1 unless it already exists. Returns the number of leases."""
+    conn = _connect(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                start    INTEGER PRIMARY KEY,
+                stop     INTEGER NOT NULL,
+                state    TEXT NOT NULL DEFAULT 'pending',   -- pending | leased | done
+                worker   TEXT,
+                expires  REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        if conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0] == 0:
+            conn.executemany(
+                "INSERT INTO leases (start, stop) VALUES (?, ?)",
+                [(s, min(s + lease_size, n_runs)) for s in range(0, n_runs, lease_size)],
+            )
+        conn.execute("COMMIT")
+        return conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def is_ready(path: str) -> bool:
+    """True once init_queue has created the queue; a worker started before the coordinator waits for this."""
+    if not os.path.exists(path):
+        return False
+    conn = _connect(path)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'leases'").fetchone() is None:
+            return False
+        return conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0] > 0
+    finally:
+        conn.close()
+
+
+def acquire(path: str, worker: str, ttl: float) -> dict | None:
+    """
+    Lease the lowest pending range, or one whose lease expired. Returns
+    {"start", "stop", "attempts"} or None when nothing is available now.
+    """
+    conn = _connect(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = conn.execute(
+            "SELECT start, stop, attempts FROM leases "
+            "WHERE state = 'pending' OR (state = 'leased' AND expires < ?) "
+            "ORDER BY start LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE leases SET state = 'leased', worker = ?, expires = ?, attempts = attempts + 1 WHERE start = ?",
+            (worker, now + ttl, row[0]),
+        )
+        conn.execute("COMMIT")
+        return {"start": row[0], "stop": row[1], "attempts": row[2] + 1}
+    finally:
+        conn.close()
+
+
+def renew(path: str, start: int, worker: str, ttl: float) -> bool:
+    """Push a held lease's expiry back. False if the lease was lost to another worker or is finished."""
+    conn = _connect(path)
+    try:
+        cur = conn.execute(
+            "UPDATE leases SET expires = ? WHERE start = ? AND worker = ? AND state = 'leased'",
+            (time.time() + ttl, start, worker),
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete(path: str, start: int):
+    """
+    Mark a range done. Done by whoever finishes it, even if the lease had
+    expired and been handed on: the output is the same either way.
+    """
+    conn = _connect(path)
+    try:
+        conn.execute("UPDATE leases SET state = 'done', expires = NULL WHERE start = ?", (start,))
+    finally:
+        conn.close()
+
+
+def status(path: str) -> dict:
+    """Lease counts by state (expired leases counted separately) and the workers holding leases."""
+    conn = _connect(path)
+    try:
+        now = time.time()
+        counts = {"pending": 0, "leased": 0, "expired": 0, "done": 0}
+        workers = set()
+        for state, worker, expires in conn.execute("SELECT state, worker, expires FROM leases"):
+            if state == "leased" and expires < now:
+                state = "expired"
+            elif state == "leased":
+                workers.add(worker)
+            counts[state] += 1
+        counts["total"] = sum(counts.values())
+        counts["workers"] = sorted(workers)
+        return counts
+    finally:
+        conn.close()
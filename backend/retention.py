@@ -0,0 +1,166 @@
+"""
+History retention and compaction
+-----------------------------------
+Keeps the simulation history store bounded. Policies come from env vars
+(0 disables a limit; all are off by default):
+
+    HISTORY_MAX_RUNS        keep at most this many runs (oldest go first)
+    HISTORY_MAX_AGE_DAYS    delete runs older than this
+    HISTORY_MAX_BYTES       delete oldest runs until the stored runs fit
+    HISTORY_COMPACT_AFTER_DAYS
+                            downsample hourly rows of runs older than this
+                            to daily rows (rollups.daily_rows); the run's
+                            summary is computed from the hourly rows first,
+                            so it stays exact
+    HISTORY_MAINTENANCE_INTERVAL
+                            seconds between background passes
+
+Compaction runs before the byte budget is checked, so old runs shrink
+before anything is deleted to make room for them.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import rollups
+import run_store
+
+HISTORY_MAX_RUNS = int(os.environ.get("HISTORY_MAX_RUNS", 0))
+HISTORY_MAX_AGE_DAYS = float(os.environ.get("HISTORY_MAX_AGE_DAYS", 0))
+HISTORY_MAX_BYTES = int(os.environ.get("HISTORY_MAX_BYTES", 0))
+HISTORY_COMPACT_AFTER_DAYS = float(os.environ.get("HISTORY_COMPACT_AFTER_DAYS", 0))
+HISTORY_MAINTENANCE_INTERVAL = float(os.environ.get("HISTORY_MAINTENANCE_INTERVAL", 3600))
+
+
+def policy() -> dict:
+    return {
+        "max_runs": HISTORY_MAX_RUNS,
+        "max_age_days": HISTORY_MAX_AGE_DAYS,
+        "max_bytes": HISTORY_MAX_BYTES,
+        "compact_after_days": HISTORY_COMPACT_AFTER_DAYS,
+        "maintenance_interval_s": HISTORY_MAINTENANCE_INTERVAL,
+    }
+
+
+def footprint(doc) -> int:
+    """Bytes a run takes in the JSON store."""
+    return len(json.dumps(doc))
+
+
+def _run_at(doc) -> datetime:
+    try:
+        return datetime.fromisoformat(doc.get("run_at", ""))
+    except ValueError:
+        return datetime.min
+
+
+def compact_run(doc) -> dict:
+    """Fields to update to turn a run's hourly rows into daily rows (empty if nothing to do)."""
+    if doc.get("resolution") == "daily" or not doc.get("rows"):
+        return {}
+    result_df = pd.DataFrame(doc["rows"])
+    daily = rollups.daily_rows(result_df)
+    daily["datetime"] = daily["datetime"].astype(str)
+    return {
+        "rows": daily.to_dict(orient="records"),
+        "resolution": "daily",
+        "summary": doc.get("summary") or run_store.summarize(result_df),
+    }
+
+
+def enforce(table, lock, now: datetime = None) -> dict:
+    """
+    One maintenance pass over `table` (a TinyDB table guarded by `lock`):
+    age limit, run-count limit, compaction, byte budget. Returns what it did.
+    """
+    now = now or datetime.now()
+    report = {"deleted": [], "compacted": [], "bytes_before": 0, "bytes_after": 0}
+
+    with lock:
+        docs = sorted(table.all(), key=_run_at)
+    report["bytes_before"] = sum(footprint(d) for d in docs)
+
+    if HISTORY_MAX_AGE_DAYS > 0:
+        cutoff = now - timedelta(days=HISTORY_MAX_AGE_DAYS)
+        report["deleted"] += [d.doc_id for d in docs if _run_at(d) < cutoff]
+
+    alive = [d for d in docs if d.doc_id not in report["deleted"]]
+    if HISTORY_MAX_RUNS > 0 and len(alive) > HISTORY_MAX_RUNS:
+        report["deleted"] += [d.doc_id for d in alive[:len(alive) - HISTORY_MAX_RUNS]]
+        alive = alive[len(alive) - HISTORY_MAX_RUNS:]
+
+    if HISTORY_COMPACT_AFTER_DAYS > 0:
+        cutoff = now - timedelta(days=HISTORY_COMPACT_AFTER_DAYS)
+        for d in alive:
+            if _run_at(d) >= cutoff:
+                continue
+            update = compact_run(d)
+            if update:
+                with lock:
+                    table.update(update, doc_ids=[d.doc_id])
+                d.update(update)
+                report["compacted"].append(d.doc_id)
+
+    if HISTORY_MAX_BYTES > 0:
+        total = sum(footprint(d) for d in alive)
+        while alive and total > HISTORY_MAX_BYTES:
+            oldest = alive.pop(0)
+            total -= footprint(oldest)
+            report["deleted"].append(oldest.doc_id)
+
+    if report["deleted"]:
+        with lock:
+            table.remove(doc_ids=report["deleted"])
+    report["bytes_after"] = sum(footprint(d) for d in docs if d.doc_id not in report["deleted"])
+
+    if report["deleted"] or report["compacted"]:
+        logging.info(f"History maintenance: deleted {len(report['deleted'])}, compacted {len(report['compacted'])} runs")
+    return report
+
+
+def storage_report(table, lock, path: str = None) -> dict:
+    with lock:
+        docs = table.all()
+    runs = [
+        {
+            "id": d.doc_id,
+            "name": d.get("name"),
+            "run_at": d.get("run_at"),
+            "bytes": footprint(d),
+            "storage": d.get("storage", "full"),
+            "resolution": d.get("resolution", "hourly"),
+            "rows": len(d.get("rows", [])),
+        }
+        for d in docs
+    ]
+    return {
+        "file_bytes": os.path.getsize(path) if path and os.path.exists(path) else None,
+        "runs_bytes": sum(r["bytes"] for r in runs),
+        "n_runs": len(runs),
+        "policy": policy(),
+        "runs": sorted(runs, key=lambda r: r["bytes"], reverse=True),
+    }
+
+
+def start_background(table, lock, interval: float = None) -> threading.Event:
+    """Run enforce() every `interval` seconds on a daemon thread; set the returned event to stop it."""
+    interval = interval or HISTORY_MAINTENANCE_INTERVAL
+    stop = threading.Event()
+
+    def loop():
+        # First pass straight away so a store that outgrew its limits shrinks at startup
+        while True:
+            try:
+                enforce(table, lock)
+            except Exception as e:
+                logging.error(f"History maintenance failed: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, daemon=True, name="history-maintenance").start()
+    return stop
@@ -0,0 +1,112 @@
+"""
+Calendar rollups of simulation results
+-----------------------------------------
+Daily, weekly or monthly summaries of an hourly result frame, so long runs
+can be charted from a few KB instead of every hourly row:
+
+    min/mean/max of Tin, T_mass and T_soil
+    heater and latent energy (kWh, rows are hourly mean watts)
+    hours of Tin below each threshold
+
+Everything is one pandas groupby over the whole frame.
+
+Rows compacted to daily resolution (see daily_rows) carry an "hours" column
+plus per-day extremes and below-threshold counts, and roll up to the same
+weekly and monthly numbers the hourly rows gave.
+"""
+
+import pandas as pd
+
+PERIODS = {
+    "day":   "D",
+    "week":  "W-SUN",   # Monday to Sunday, labelled by the Monday
+    "month": "M",
+}
+TEMPERATURE_COLUMNS = ["Tin", "T_mass", "T_soil"]
+ENERGY_COLUMNS = {"Q_heater": "heater_kwh", "Q_latent": "latent_kwh"}
+MEAN_COLUMNS = ["Tout", "Tin", "T_mass", "T_soil", "Q_heater", "Q_latent", "Q_to_threshold"]
+DEFAULT_THRESHOLDS = [0.0, 5.0]
+
+
+def threshold_column(t: float) -> str:
+    """Name of the hours-below-t column, shared with compare.py's metrics."""
+    return f"hours_below_{t:g}"
+
+
+def rollup(result_df: pd.DataFrame, period: str = "day", thresholds: list = None) -> pd.DataFrame:
+    """One row per calendar period, labelled by the period's first day (no rows for an empty result)."""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {list(PERIODS)}")
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else [float(t) for t in thresholds]
+    # A stored run with no rows gives a frame without even a datetime column
+    if result_df.empty or "datetime" not in result_df:
+        return pd.DataFrame(columns=["period_start", "hours"])
+
+    df = result_df.copy()
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df = df.set_index("datetime")
+
+    # Hourly rows weigh one hour each; compacted rows say how many hours they cover
+    compacted = "hours" in df
+    if not compacted:
+        df["hours"] = 1
+
+    agg = {"hours": ("hours", "sum")}
+    for col in TEMPERATURE_COLUMNS:
+        if col in df:
+            df[f"{col}_weighted"] = df[col] * df["hours"]
+            agg[f"{col}_min"] = (f"{col}_min" if compacted else col, "min")
+            agg[f"{col}_mean"] = (f"{col}_weighted", "sum")
+            agg[f"{col}_max"] = (f"{col}_max" if compacted else col, "max")
+    for col, name in ENERGY_COLUMNS.items():
+        if col in df:
+            df[name] = df[col] * df["hours"] / 1000.0
+            agg[name] = (name, "sum")
+    for t in thresholds:
+        name = threshold_column(t)
+        if not compacted:
+            df[name] = df["Tin"] < t
+        if name in df:
+            agg[name] = (name, "sum")
+
+    period_start = df.index.to_period(PERIODS[period]).start_time
+    out = df.groupby(period_start.rename("period_start")).agg(**agg)
+    for col in TEMPERATURE_COLUMNS:
+        if f"{col}_mean" in out:
+            out[f"{col}_mean"] = out[f"{col}_mean"] / out["hours"]
+    return out.reset_index()
+
+
+def daily_rows(result_df: pd.DataFrame, thresholds: list = None) -> pd.DataFrame:
+    """
+    Downsample hourly rows to one row per day: hour-weighted means under the
+    original column names (so charts and energy sums keep working), plus
+    "hours", per-day min/max temperatures and hours below each threshold.
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    df = result_df.copy()
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    day = df["datetime"].dt.floor("D").rename("datetime")
+
+    agg = {"hours": ("Tin", "size")}
+    for col in MEAN_COLUMNS:
+        if col in df:
+            agg[col] = (col, "mean")
+    for col in TEMPERATURE_COLUMNS:
+        if col in df:
+            agg[f"{col}_min"] = (col, "min")
+            agg[f"{col}_max"] = (col, "max")
+    for t in thresholds:
+        name = threshold_column(t)
+        df[name] = df["Tin"] < t
+        agg[name] = (name, "sum")
+
+    return df.groupby(day).agg(**agg).reset_index()
+
+
+def to_records(rollup_df: pd.DataFrame) -> list:
+    if rollup_df.empty:
+        return []
+    df = rollup_df.copy()
+    df["period_start"] = df["period_start"].dt.strftime("%Y-%m-%d")
+    return df.round(4).to_dict(orient="records")
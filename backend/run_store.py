@@ -0,0 +1,142 @@
+"""
+Run storage modes and lazy re-materialization
+------------------------------------------------
+A run's hourly rows are fully determined by its location, dates, weather,
+parameters and starting state, so they do not have to be stored. With
+RUN_STORAGE=inputs (or "storage": "inputs" on a request) a run keeps only
+
+    its inputs (as before) and, for forks, the state it started from
+    a fingerprint of the weather it was simulated with
+    summary statistics (enough for /history listings and comparisons)
+
+and /history/{run_id} re-simulates the rows on demand. Recently viewed
+results are held in a bounded LRU cache, so paging back and forth between a
+few runs does not re-run them. If the weather source has since changed (e.g.
+a forecast was revised), the rows are still returned but flagged with
+weather_changed.
+
+Re-simulation fetches from the source the run was fingerprinted on: runs
+record weather_source and the day the archive/forecast split was made
+(weather_routed_on), and runs stored before either existed came from the
+forecast API alone, so they are re-fetched from it.
+
+RUN_STORAGE=full (the default) keeps storing rows exactly as before.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from sim_state import SimState, resume
+from weather import get_weather
+
+STORAGE_MODES = ("full", "inputs")
+RUN_STORAGE = os.environ.get("RUN_STORAGE", "full")
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 32))
+
+_cache = OrderedDict()      # (doc_id, run_at) → (rows, weather_changed)
+_cache_lock = threading.Lock()
+
+
+def weather_fingerprint(weather_df: pd.DataFrame) -> str:
+    """Hash of the timestamps and values simulate_greenhouse reads, rounded to what Open-Meteo reports."""
+    h = hashlib.sha256()
+    h.update(pd.to_datetime(weather_df["datetime"]).astype("int64").to_numpy().tobytes())
+    for col in ("Tout", "G", "RH"):
+        if col in weather_df:
+            h.update(np.round(weather_df[col].to_numpy(dtype=float), 3).tobytes())
+    return h.hexdigest()[:16]
+
+
+def summarize(result_df: pd.DataFrame) -> dict:
+    if result_df.empty:
+        return {"hours": 0}
+    Tin = result_df["Tin"].to_numpy(dtype=float)
+    Q = result_df["Q_heater"].to_numpy(dtype=float)
+    return {
+        "hours": int(len(result_df)),
+        "Tin_min": float(Tin.min()),
+        "Tin_mean": float(Tin.mean()),
+        "Tin_max": float(Tin.max()),
+        "heater_kwh": float(Q.sum() / 1000.0),
+        "heater_peak_w": float(Q.max()),
+    }
+
+
+def to_rows(result_df: pd.DataFrame) -> list:
+    result_df = result_df.copy()
+    result_df["datetime"] = result_df["datetime"].astype(str)
+    return result_df.to_dict(orient="records")
+
+
+def result_fields(weather_df: pd.DataFrame, result_df: pd.DataFrame, rows: list, mode: str = None) -> dict:
+    """The output part of a stored run document for the given storage mode."""
+    mode = mode or RUN_STORAGE
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode '{mode}', expected one of {STORAGE_MODES}")
+    fields = {
+        "storage": mode,
+        "weather_fingerprint": weather_fingerprint(weather_df),
+        "weather_source": "routed",
+        "weather_routed_on": str(date.today()),
+        "summary": summarize(result_df),
+    }
+    if mode == "full":
+        fields["rows"] = rows
+    return fields
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+    metrics.record_cache("results", entry is not None)
+    return entry
+
+
+def _cache_put(key, entry: tuple):
+    with _cache_lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > RESULT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def materialize(run) -> tuple:
+    """
+    (rows, info) for a stored run. Runs stored with rows return them as-is;
+    input-only runs are re-simulated (or served from the cache). Raises
+    ValueError if the weather can no longer be fetched.
+    """
+    if "rows" in run:
+        return run["rows"], {"rematerialized": False, "resolution": run.get("resolution", "hourly")}
+
+    key = (getattr(run, "doc_id", None), run["run_at"])
+    entry = _cache_get(key)
+    if entry is not None:
+        rows, changed = entry
+        return rows, {"rematerialized": True, "cached": True, "weather_changed": changed}
+
+    with metrics.stage("weather"):
+        weather_df = get_weather(run["location"], run["start_date"], run["end_date"],
+                                 source=run.get("weather_source", "forecast"),
+                                 routed_on=run.get("weather_routed_on"))
+    if weather_df.empty:
+        raise ValueError("Weather for this run could not be fetched to re-simulate it")
+
+    initial = SimState.from_dict(run["initial_state"]) if run.get("initial_state") else None
+    with metrics.stage("simulate") as timer:
+        result_df, _ = resume(weather_df, run["parameters"], initial)
+    metrics.record_simulation(len(result_df), timer.seconds)
+
+    rows = to_rows(result_df)
+    changed = weather_fingerprint(weather_df) != run.get("weather_fingerprint")
+    _cache_put(key, (rows, changed))
+    return rows, {"rematerialized": True, "cached": False, "weather_changed": changed}
@@ -0,0 +1,113 @@
+"""
+Production launcher (prefork)
+-------------------------------
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Imports the app and everything its endpoints load lazily ONCE, then forks
+the workers. Each worker starts with the modules already in memory (shared
+copy-on-write with the parent) and serves from a listening socket opened
+before the fork, so a new worker answers its first request in
+milliseconds instead of re-importing the backend. The parent only
+supervises: a worker that dies is re-forked, and SIGTERM/SIGINT stop them
+all.
+
+Workers share simulations.json through main.StoreLock; retention runs in
+worker 0 only. POSIX only — use `uvicorn main:app` elsewhere, and
+`python main.py` (auto-reload) in development.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+# Modules main.py's endpoints import on first use; loading them here puts
+# them in the memory every worker shares
+PRELOAD = ["scipy.stats", "sklearn.cluster"]
+
+
+def preload():
+    t0 = time.perf_counter()
+    import main
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.warning(f"Preload of {name} skipped: {e}")
+    logging.info(f"Preloaded app in {time.perf_counter() - t0:.2f}s")
+    return main
+
+
+def listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(main, sock: socket.socket, index: int):
+    # Default signal handling back for uvicorn, which installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    main.HISTORY_MAINTENANCE = index == 0
+    config = uvicorn.Config(main.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(main, sock: socket.socket, index: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(main, sock, index)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def serve(host: str = "0.0.0.0", port: int = 8000, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    main = preload()
+    sock = listen(host, port)
+    children = {spawn(main, sock, i): i for i in range(workers)}
+    logging.info(f"Serving on {host}:{port} with {workers} workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            logging.warning(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+            children[spawn(main, sock, index)] = index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Prefork production server for the greenhouse backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,87 @@
+"""
+Persistent simulator state and warm-start
+--------------------------------------------
+A SimState captures everything simulate_greenhouse needs to continue a run:
+the air, thermal-mass and soil temperatures, the controller state, and the
+timestamp of the last simulated hour. It is saved with every stored run and
+with every digital twin, so keeping a live forecast up to date only costs
+the hours of new weather since the last update instead of the whole season.
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+import pandas as pd
+
+import model
+
+
+@dataclass
+class SimState:
+    T_air: float
+    T_mass: float
+    T_soil: float
+    last_timestamp: Optional[str] = None
+    # The reactive heater keeps no memory between hours; its last output is
+    # kept so controllers with state can store theirs alongside it.
+    controller: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SimState":
+        return cls(
+            T_air=float(d["T_air"]),
+            T_mass=float(d["T_mass"]),
+            T_soil=float(d["T_soil"]),
+            last_timestamp=d.get("last_timestamp"),
+            controller=dict(d.get("controller") or {}),
+        )
+
+    @classmethod
+    def from_result(cls, result_df: pd.DataFrame) -> Optional["SimState"]:
+        """State after the last row of a simulate_greenhouse result (None if empty)."""
+        if result_df.empty:
+            return None
+        last = result_df.iloc[-1]
+        return cls(
+            T_air=float(last["Tin"]),
+            T_mass=float(last["T_mass"]),
+            T_soil=float(last["T_soil"]),
+            last_timestamp=str(pd.Timestamp(last["datetime"])),
+            controller={"Q_heater": float(last["Q_heater"])},
+        )
+
+    def apply(self, params: dict) -> dict:
+        """Copy of params whose initial temperatures start from this state."""
+        resumed = dict(params)
+        resumed["T_init"] = self.T_air
+        resumed["T_mass_init"] = self.T_mass
+        resumed["T_soil_init"] = self.T_soil
+        return resumed
+
+
+def new_rows(weather_df: pd.DataFrame, state: Optional[SimState], until=None) -> pd.DataFrame:
+    """Weather rows strictly after the state's last timestamp (and up to `until`, if given)."""
+    times = pd.to_datetime(weather_df["datetime"])
+    keep = pd.Series(True, index=weather_df.index)
+    if state is not None and state.last_timestamp:
+        keep &= times > pd.Timestamp(state.last_timestamp)
+    if until is not None:
+        keep &= times <= pd.Timestamp(until)
+    return weather_df[keep].reset_index(drop=True)
+
+
+def resume(weather_df: pd.DataFrame, params: dict, state: Optional[SimState] = None, until=None, **sim_kwargs):
+    """
+    Continue a simulation from `state` over the weather rows it has not seen.
+
+    Returns (result_df, new_state). With no state this is a cold start from
+    the T_init/T_mass_init/T_soil_init in params. If there is no new weather
+    the result is empty and the state is returned unchanged.
+    """
+    rows = new_rows(weather_df, state, until)
+    start_params = state.apply(params) if state is not None else params
+    result_df = model.simulate_greenhouse(rows, start_params, **sim_kwargs)
+    return result_df, SimState.from_result(result_df) or state
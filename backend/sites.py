@@ -0,0 +1,141 @@
+"""
+Multi-location batch simulation
+----------------------------------
+Evaluates one greenhouse design at many candidate sites: weather for every
+site is fetched concurrently (through the weather cache), then all sites are
+simulated together as one model.simulate_batch call with per-site weather,
+split into chunks across worker processes when there are enough sites to
+make that worthwhile.
+
+Each site gets a compact summary (Tin range, heater energy and peak, hours
+below a threshold), which is what a regional suitability map needs; full
+hourly trajectories are optional.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+import model
+from weather import get_weather
+
+MAX_SITES = 400
+FETCH_WORKERS = 16          # concurrent weather requests
+MIN_SITES_PER_WORKER = 16   # below this a process pool costs more than it saves
+
+ROW_COLUMNS = ("Tout", "Tin", "T_mass", "T_soil", "Q_heater", "Q_latent", "Q_to_threshold")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LOCATIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def location_grid(grid: dict) -> list:
+    """
+    Regular lat/lon grid from {"lat_min", "lat_max", "lon_min", "lon_max"}
+    plus either "n_lat"/"n_lon" (points per axis) or "step" (degrees).
+    """
+    lat_min, lat_max = float(grid["lat_min"]), float(grid["lat_max"])
+    lon_min, lon_max = float(grid["lon_min"]), float(grid["lon_max"])
+    if lat_min > lat_max or lon_min > lon_max:
+        raise ValueError("Grid minimum must not exceed maximum")
+
+    if "step" in grid:
+        step = float(grid["step"])
+        if step <= 0:
+            raise ValueError("Grid step must be positive")
+        lats = np.arange(lat_min, lat_max + step / 2, step)
+        lons = np.arange(lon_min, lon_max + step / 2, step)
+    else:
+        lats = np.linspace(lat_min, lat_max, int(grid.get("n_lat", 10)))
+        lons = np.linspace(lon_min, lon_max, int(grid.get("n_lon", 10)))
+
+    return [{"lat": round(float(lat), 4), "lon": round(float(lon), 4)} for lat in lats for lon in lons]
+
+
+def fetch_weather_many(locations: list, start_date: str, end_date: str, max_workers: int = FETCH_WORKERS) -> list:
+    """get_weather for every location concurrently; failed fetches come back as empty frames."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(locations)))) as pool:
+        return list(pool.map(lambda loc: get_weather(loc, start_date, end_date), locations))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SIMULATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _simulate_chunk(args: tuple) -> dict:
+    frames, params, substeps, integrator = args
+    out = model.simulate_batch(frames, [params] * len(frames), substeps=substeps, integrator=integrator)
+    out.pop("datetime", None)
+    return out
+
+
+def _summarize(out: dict, i: int, params: dict, threshold: float) -> dict:
+    Tin = out["Tin"][i]
+    Q = out["Q_heater"][i]
+    setpoint = params.get("setpoint")
+    summary = {
+        "hours": int(len(Tin)),
+        "Tin_min": float(Tin.min()),
+        "Tin_mean": float(Tin.mean()),
+        "Tin_max": float(Tin.max()),
+        "Tout_min": float(out["Tout"][i].min()),
+        "Tout_mean": float(out["Tout"][i].mean()),
+        "heater_kwh": float(Q.sum() / 1000.0),    # hourly W → kWh
+        "heater_peak_w": float(Q.max()),
+        "hours_below_threshold": int((Tin < threshold).sum()),
+    }
+    if setpoint is not None:
+        # Half a degree of slack so hours the heater holds just under setpoint do not count
+        summary["hours_below_setpoint"] = int((Tin < float(setpoint) - 0.5).sum())
+    return summary
+
+
+def simulate_sites(weather_frames: list, params: dict, threshold: float = 5.0, include_rows: bool = False,
+                   substeps: int = 4, integrator: str = "implicit", n_workers: int = None) -> list:
+    """
+    Simulate `params` against each weather frame and return one result dict
+    per frame, in order. Sites whose weather is empty get {"status": "error"}.
+
+    Sites are batched by timestamp index (sites in the same time zone share
+    one). The default implicit/4 setting runs a 100-site annual grid in
+    seconds on one core, within a few tenths of a kelvin and about half a
+    percent of heater energy of simulate_greenhouse; integrator="euler",
+    substeps=60 reproduces it exactly at about five times the cost.
+    """
+    results = [None] * len(weather_frames)
+    groups = {}
+    for i, df in enumerate(weather_frames):
+        if df.empty:
+            results[i] = {"status": "error", "message": "No weather data for this location"}
+            continue
+        key = tuple(pd.to_datetime(df["datetime"]).astype("int64"))
+        groups.setdefault(key, []).append(i)
+
+    jobs, owners = [], []
+    n_workers = n_workers or os.cpu_count() or 1
+    for idx in groups.values():
+        n_chunks = max(1, min(n_workers, len(idx) // MIN_SITES_PER_WORKER))
+        for chunk in np.array_split(np.array(idx), n_chunks):
+            jobs.append(([weather_frames[i] for i in chunk], params, substeps, integrator))
+            owners.append(chunk)
+
+    if len(jobs) > 1 and n_workers > 1:
+        with Pool(processes=min(n_workers, len(jobs))) as pool:
+            outputs = pool.map(_simulate_chunk, jobs)
+    else:
+        outputs = [_simulate_chunk(job) for job in jobs]
+
+    for chunk, out in zip(owners, outputs):
+        for j, i in enumerate(chunk):
+            site = {"status": "ok", "summary": _summarize(out, j, params, threshold)}
+            if include_rows:
+                rows = pd.DataFrame({col: out[col][j] for col in ROW_COLUMNS})
+                rows.insert(0, "datetime", weather_frames[i]["datetime"].astype(str).to_numpy())
+                site["rows"] = rows.to_dict(orient="records")
+            results[i] = site
+    return results
+
@@ -0,0 +1,140 @@
+"""
+Constant-memory streaming simulation
+---------------------------------------
+Runs simulate_greenhouse over weather that arrives in chunks (a CSV read in
+pieces, the Open-Meteo archive one year at a time, or any generator of
+DataFrames) and yields result chunks as they are produced. Only the node
+temperatures are carried from one chunk to the next, so memory is bounded
+by the chunk size, not the length of the run, and a 30-year hourly run
+needs no more RAM than a single year.
+
+Chunking is exact: the simulator's whole state is (T_air, T_mass, T_soil),
+so seeding each chunk with the previous chunk's final temperatures gives
+the same rows as one long call.
+
+Usage:
+    python streaming.py weather.csv results.parquet --params params.json --chunksize 8760
+"""
+
+import argparse
+import json
+import pandas as pd
+
+import model
+from weather import iter_archive_weather
+
+RESULT_COLUMNS = ["datetime", "Tout", "Tin", "T_mass", "T_soil", "Q_heater", "Q_latent", "Q_to_threshold"]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# WEATHER SOURCES — each yields DataFrames with datetime, Tout, G, RH
+# ─────────────────────────────────────────────────────────────────────────────
+
+def iter_csv(path: str, chunksize: int = 8760):
+    """Read a weather CSV in chunks of `chunksize` rows."""
+    for chunk in pd.read_csv(path, chunksize=chunksize, parse_dates=["datetime"]):
+        yield chunk
+
+
+def iter_frame(weather_df: pd.DataFrame, chunksize: int = 8760):
+    """Split an in-memory weather frame into chunks."""
+    for start in range(0, len(weather_df), chunksize):
+        yield weather_df.iloc[start:start + chunksize]
+
+
+def iter_archive(location: dict, start_date: str, end_date: str):
+    """Historical weather from the Open-Meteo archive, one year per chunk."""
+    return iter_archive_weather(location, start_date, end_date)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SIMULATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _simulate_chunk(chunk: pd.DataFrame, params: dict, dt, substeps, T_bounds, integrator) -> pd.DataFrame:
+    if integrator is None:
+        return model.simulate_greenhouse(chunk, params, dt=dt, substeps=substeps, T_bounds=T_bounds)
+
+    out = model.simulate_batch(chunk, [params], dt=dt, substeps=substeps, T_bounds=T_bounds, integrator=integrator)
+    return pd.DataFrame({col: out[col] if col == "datetime" else out[col][0] for col in RESULT_COLUMNS})
+
+
+def simulate_stream(weather_chunks, params: dict, dt=3600.0, substeps=60, T_bounds=(0, 50), integrator=None):
+    """
+    Yield one result DataFrame per weather chunk, carrying state across chunks.
+
+    integrator=None runs the reference simulate_greenhouse; "euler" or
+    "implicit" run model.simulate_batch for a single design (implicit with a
+    few substeps is the fast choice for multi-decade runs).
+    """
+    state = dict(params)
+
+    for chunk in weather_chunks:
+        if len(chunk) == 0:
+            continue
+
+        result = _simulate_chunk(chunk, state, dt, substeps, T_bounds, integrator)
+
+        last = result.iloc[-1]
+        state["T_init"] = float(last["Tin"])
+        state["T_mass_init"] = float(last["T_mass"])
+        state["T_soil_init"] = float(last["T_soil"])
+
+        yield result
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COLUMNAR OUTPUT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def write_parquet(result_chunks, path: str) -> int:
+    """
+    Append result chunks to a Parquet file as they arrive (one row group per
+    chunk) and return the number of rows written. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    n_rows = 0
+    try:
+        for chunk in result_chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                # Later chunks are cast to the first chunk's schema
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a greenhouse simulation over a weather CSV into Parquet.")
+    parser.add_argument("weather_csv")
+    parser.add_argument("output")
+    parser.add_argument("--params", help="JSON file with greenhouse parameters")
+    parser.add_argument("--chunksize", type=int, default=8760)
+    parser.add_argument("--substeps", type=int, default=60)
+    parser.add_argument("--integrator", choices=model.INTEGRATORS, default=None)
+    args = parser.parse_args()
+
+    params = {}
+    if args.params:
+        with open(args.params) as f:
+            params = json.load(f)
+
+    chunks = simulate_stream(
+        iter_csv(args.weather_csv, args.chunksize), params,
+        substeps=args.substeps, integrator=args.integrator,
+    )
+    n_rows = write_parquet(chunks, args.output)
+    print(f"Wrote {n_rows} rows → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
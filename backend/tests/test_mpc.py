@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+import mpc
+from weather import synthetic_weather
+
+# Light thermal mass and a stiff heater, so the reactive rule holds the setpoint
+# closely wherever the heater is big enough
+DESIGN = {"setpoint": 10.0, "thermal_mass_kg": 500.0, "heating_rate_factor": 0.95}
+
+
+def _week(start: str):
+    return synthetic_weather(start, 24 * 7, seed=2)
+
+
+def test_reactive_baseline_is_the_batch_models_rule():
+    # The baseline runs on the MPC plant; it must be the rule /run-simulation applies
+    weather_df = _week("2023-04-01")
+    params = {**DESIGN, "heater_max_w": 40000.0}
+    result_df, report = mpc.simulate_mpc(weather_df, params)
+    reference = model.simulate_batch(weather_df, [params], substeps=mpc.PLANT_SUBSTEPS, integrator="implicit")
+
+    net = mpc._network(params)
+    w = model.weather_arrays(weather_df)
+    x = np.array([params.get("T_init", 15.0)] * 3)
+    tin = []
+    for t in range(len(weather_df)):
+        x, _, _ = mpc._reactive_hour(net, x, w["Tout"][t], w["G"][t], w["RH"][t], params["setpoint"], (0, 50))
+        tin.append(x[0])
+    assert np.max(np.abs(np.array(tin) - reference["Tin"][0])) < 0.05
+    assert report["reactive"]["Tin_min"] == min(tin)
+
+
+def test_preheating_ahead_of_cold_nights_buys_comfort():
+    # 40 kW cannot hold 10 C through the coldest nights from a standing start
+    weather_df = _week("2023-04-01")
+    result_df, report = mpc.simulate_mpc(weather_df, {**DESIGN, "heater_max_w": 40000.0})
+    assert report["mpc"]["degree_hours_below_setpoint"] < report["reactive"]["degree_hours_below_setpoint"]
+    assert report["mpc"]["Tin_min"] > report["reactive"]["Tin_min"] - 0.5
+    # a warmer greenhouse loses heat faster, so the comfort is paid for, but not dearly
+    assert -10.0 < report["saved_pct"] < 0.0
+
+
+def test_comfort_floor_saves_energy_ahead_of_cold_nights():
+    # 30 kW cannot hold the setpoint on the coldest nights, but pre-heating holds the floor
+    weather_df = _week("2023-04-20")
+    comfort_floor = 3.0
+    result_df, report = mpc.simulate_mpc(weather_df, {**DESIGN, "heater_max_w": 30000.0},
+                                         comfort_floor=comfort_floor)
+    assert report["saved_kwh"] > 0
+    assert report["mpc"]["Tin_min"] > DESIGN["setpoint"] - comfort_floor - 0.1
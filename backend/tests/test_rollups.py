@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rollups
+
+
+def _hourly(days: int = 3) -> pd.DataFrame:
+    t = pd.date_range("2025-01-01", periods=24 * days, freq="h")
+    return pd.DataFrame({
+        "datetime": t.astype(str),
+        "Tin": np.linspace(-2.0, 10.0, len(t)),
+        "Q_heater": np.full(len(t), 500.0),
+    })
+
+
+@pytest.mark.parametrize("frame", [pd.DataFrame([]), _hourly().iloc[:0]])
+def test_empty_result_rolls_up_to_no_records(frame):
+    # pd.DataFrame([]) is what a stored run with rows: [] turns into
+    assert rollups.to_records(rollups.rollup(frame, "week")) == []
+
+
+def test_unknown_period_still_rejected_when_empty():
+    with pytest.raises(ValueError):
+        rollups.rollup(pd.DataFrame([]), "year")
+
+
+def test_daily_records():
+    records = rollups.to_records(rollups.rollup(_hourly(), "day"))
+    assert [r["period_start"] for r in records] == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert all(r["hours"] == 24 and r["heater_kwh"] == 12.0 for r in records)
+
+
+def test_compacted_rows_roll_up_like_hourly_rows():
+    hourly = _hourly(14)
+    daily = rollups.daily_rows(hourly)
+    a = rollups.to_records(rollups.rollup(hourly, "week"))
+    b = rollups.to_records(rollups.rollup(daily, "week"))
+    assert a == b
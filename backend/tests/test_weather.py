@@ -0,0 +1,33 @@
+import os
+import sys
+from unittest import mock
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import weather
+
+LOCATION = {"lat": 42.0, "lon": -87.0}
+
+
+def _archive_years(fetched):
+    with mock.patch.object(weather, "_fetch_hourly", return_value=fetched):
+        return list(weather.iter_archive_weather(LOCATION, "2023-01-01", "2023-12-31"))
+
+
+def test_archive_years_fill_short_gaps_instead_of_dropping_hours():
+    year = weather.synthetic_weather("2023-01-01", 24 * 365)
+    fetched = year.drop(index=[10, 11, 12]).copy()
+    fetched.loc[100, "Tout"] = np.nan
+
+    (df,) = _archive_years(fetched)
+    assert len(df) == 24 * 365
+    assert not df[["Tout", "G", "RH"]].isna().any().any()
+
+
+def test_archive_years_reject_long_gaps():
+    year = weather.synthetic_weather("2023-01-01", 24 * 365)
+    with pytest.raises(ValueError):
+        _archive_years(year.drop(index=range(10, 10 + weather.MAX_GAP_HOURS + 1)))
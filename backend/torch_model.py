@@ -0,0 +1,238 @@
+"""
+Differentiable greenhouse simulator (PyTorch)
+------------------------------------------------
+Same three-node thermal network as model.simulate_greenhouse (air, thermal
+mass, soil; explicit Euler substeps), written in torch so that every output
+is differentiable with respect to every parameter, and batched so that many
+designs run in one pass.
+
+The only intentional difference is the heater: the reference clips the
+proportional heater power to [0, heater_max_w], which has zero gradient when
+saturated, so here the clip is replaced by a softplus ramp whose width is
+`heater_smoothing * heater_max_w`. With a small smoothing the trajectories
+match the reference to within a few hundredths of a degree.
+
+Usage:
+    params = batch_params([design_a, design_b], requires_grad=True)
+    out = simulate_greenhouse_torch(weather_df, params)
+    out["Q_heater"].sum().backward()
+    params["U_night"].grad   # dE/dU_night for each design
+"""
+
+import numpy as np
+import pandas as pd
+import torch
+
+from model import RHO_AIR, CP_AIR, SIGMA, LV, PARAM_DEFAULTS, weather_arrays
+
+OUTPUT_COLS = ["Tin", "T_mass", "T_soil", "Q_heater", "Q_latent", "Q_to_threshold"]
+
+
+def weather_tensors(weather_df: pd.DataFrame, dtype=torch.float64) -> dict:
+    """Convert a weather DataFrame into (T,) tensors, using the same column fallbacks as the reference."""
+    w = weather_arrays(weather_df)
+    return {
+        "Tout": torch.as_tensor(w["Tout"], dtype=dtype),
+        "G":    torch.as_tensor(w["G"], dtype=dtype),
+        "RH":   torch.as_tensor(w["RH"], dtype=dtype),
+        "hour": torch.as_tensor(w["hour"].copy()),
+    }
+
+
+def batch_params(params_list: list, requires_grad: bool = False, dtype=torch.float64) -> dict:
+    """
+    Stack a list of parameter dicts into a dict of (B,) tensors.
+    Missing keys take the reference defaults; a None setpoint becomes NaN
+    (heater off for that design). With requires_grad=True every float
+    parameter becomes a leaf tensor so gradients can be read back per key.
+    """
+    keys = set(PARAM_DEFAULTS) | {"T_mass_init", "T_soil_init", "setpoint"}
+    for p in params_list:
+        keys |= set(p)
+
+    out = {}
+    for k in sorted(keys):
+        values = []
+        for p in params_list:
+            v = _lookup(p, k)
+            values.append(np.nan if v is None else float(v))
+        t = torch.tensor(values, dtype=dtype)
+        if requires_grad and k != "setpoint":
+            t.requires_grad_(True)
+        out[k] = t
+    return out
+
+
+def _smooth_clamp(x, lo, hi, width):
+    # lo + softplus ramp up at lo, minus the same ramp at hi; exact 0 when lo == hi == 0
+    return (
+        lo
+        + width * torch.nn.functional.softplus((x - lo) / width)
+        - width * torch.nn.functional.softplus((x - hi) / width)
+    )
+
+
+def _lookup(params: dict, key: str):
+    v = params.get(key, PARAM_DEFAULTS.get(key))
+    if v is None and key in ("T_mass_init", "T_soil_init"):
+        # Reference: mass and soil start at the air temperature unless given
+        v = params.get("T_init", PARAM_DEFAULTS["T_init"])
+    return v
+
+
+def _param(params: dict, key: str, like: torch.Tensor) -> torch.Tensor:
+    v = _lookup(params, key)
+    if torch.is_tensor(v):
+        return v.to(like.dtype)
+    return torch.full_like(like, np.nan if v is None else float(v))
+
+
+def simulate_greenhouse_torch(weather_df: pd.DataFrame, params: dict, dt=3600.0, substeps=60,
+                              T_bounds=(0, 50), heater_smoothing=0.01, dtype=torch.float64) -> dict:
+    """
+    Batched, differentiable version of model.simulate_greenhouse.
+
+    params maps parameter names to floats or (B,) tensors (see batch_params).
+    Returns a dict of (B, T) tensors keyed by OUTPUT_COLS, plus "datetime"
+    passed through from the weather frame.
+    """
+    w = weather_tensors(weather_df, dtype=dtype)
+
+    # Batch size is the length of any tensor parameter (1 if all are scalars)
+    B = max([v.numel() for v in params.values() if torch.is_tensor(v)] or [1])
+    ones = torch.ones(B, dtype=dtype)
+
+    def p(key):
+        return _param(params, key, ones)
+
+    A_glass = p("A_glass")
+    tau_glass = p("tau_glass")
+    U_day = p("U_day")
+    U_night = p("U_night")
+    ACH = p("ACH")
+    V = p("V")
+    A_floor = p("A_floor")
+    A_mass = p("A_mass")
+    fraction_solar_to_air = p("fraction_solar_to_air")
+    cloud_factor = p("cloud_factor")
+    emissivity = p("emissivity")
+    lw_scale = p("lw_radiation_scale")
+    h_am = p("h_am")
+    h_as = p("h_as")
+    soil_U = p("soil_U")
+    heater_max_w = p("heater_max_w")
+    evap_coeff = p("evap_coeff")
+    heating_rate_factor = p("heating_rate_factor")
+
+    C_mass = p("thermal_mass_kg") * p("cp_mass")
+    C_soil = p("soil_C") * A_floor
+    C_air = RHO_AIR * V * CP_AIR
+    C_heated = C_air + C_mass
+
+    setpoint = p("setpoint")
+    has_setpoint = ~torch.isnan(setpoint)
+    setpoint = torch.where(has_setpoint, setpoint, torch.zeros_like(setpoint))
+    heater_on = has_setpoint.to(dtype)
+    smooth_w = (heater_smoothing * heater_max_w).clamp_min(1e-6)
+
+    T_air = p("T_init")
+    T_mass = p("T_mass_init")
+    T_soil = p("T_soil_init")
+
+    n_sub = max(1, int(substeps))
+    dt_step = float(dt) / n_sub
+    sky_offset = 12.0 - (12.0 - 3.0) * cloud_factor
+    m_dot_cp = RHO_AIR * V * (ACH / 3600.0) * CP_AIR
+    lw_coeff = lw_scale * emissivity * SIGMA * A_glass
+
+    rows = {k: [] for k in OUTPUT_COLS}
+
+    for t in range(len(weather_df)):
+        Tout = w["Tout"][t]
+        G = w["G"][t]
+        RH = w["RH"][t]
+        hour = int(w["hour"][t])
+
+        solar_factor = torch.clamp((G - 10.0) / 90.0, 0.0, 1.0)
+        U_env = U_night + (U_day - U_night) * solar_factor
+
+        Q_total_sw = G * A_glass * tau_glass
+        Q_air_sw = Q_total_sw * fraction_solar_to_air
+        Q_mass_sw = Q_total_sw * (1.0 - fraction_solar_to_air) * 0.6
+        Q_soil_sw = Q_total_sw * (1.0 - fraction_solar_to_air) * 0.4
+        T_sky_K = torch.clamp(Tout - sky_offset + 273.15, 0, 1000)
+
+        for _s in range(n_sub):
+            Q_loss_env = U_env * A_glass * (T_air - Tout)
+            Q_vent = m_dot_cp * (T_air - Tout)
+
+            T_air_K = torch.clamp(T_air + 273.15, 0, 1000)
+            Q_lw = lw_coeff * (T_air_K**4 - T_sky_K**4)
+
+            Q_am = h_am * A_mass * (T_mass - T_air)
+            Q_as = h_as * A_floor * (T_soil - T_air)
+
+            T_air_safe = torch.clamp(T_air, -50, 50)
+            es = 0.6108 * torch.exp(17.27 * T_air_safe / (T_air_safe + 237.3))
+            VPD = torch.clamp(es - RH * es, min=0.0)
+            Q_lat = evap_coeff * VPD * LV * A_floor
+
+            Q_air_in = Q_air_sw + Q_am + Q_as - Q_loss_env - Q_vent - Q_lw - Q_lat
+            Q_mass_in = Q_mass_sw - Q_am
+            Q_soil_in = Q_soil_sw - Q_as - soil_U * A_floor * (T_soil - Tout)
+
+            T_air = T_air + Q_air_in * dt_step / C_air
+            T_mass = T_mass + Q_mass_in * dt_step / C_mass
+            T_soil = T_soil + Q_soil_in * dt_step / C_soil
+
+            # Smoothed heater: same proportional law, soft-clipped to [0, heater_max_w]
+            power_needed = (setpoint - T_air) * C_heated * heating_rate_factor / dt_step
+            Q_heater = heater_on * _smooth_clamp(power_needed, 0.0, heater_max_w, smooth_w)
+            T_air = T_air + Q_heater * dt_step / C_heated
+
+            T_air = torch.clamp(T_air, *T_bounds)
+            T_mass = torch.clamp(T_mass, *T_bounds)
+            T_soil = torch.clamp(T_soil, *T_bounds)
+
+        rows["Tin"].append(T_air)
+        rows["T_mass"].append(T_mass)
+        rows["T_soil"].append(T_soil)
+        rows["Q_heater"].append(Q_heater)
+        rows["Q_latent"].append(Q_lat)
+        rows["Q_to_threshold"].append(
+            _heat_to_threshold(T_air, T_mass, T_soil, setpoint, has_setpoint, C_air, C_mass, C_soil,
+                               Tout, hour, U_day, U_night, A_glass, m_dot_cp, heater_max_w)
+        )
+
+    if len(weather_df) == 0:
+        out = {k: torch.zeros((B, 0), dtype=dtype) for k in OUTPUT_COLS}
+    else:
+        out = {k: torch.stack(v, dim=1) for k, v in rows.items()}
+    out["datetime"] = weather_df["datetime"].to_numpy() if "datetime" in weather_df else None
+    return out
+
+
+def _heat_to_threshold(T_air, T_mass, T_soil, setpoint, has_setpoint, C_air, C_mass, C_soil,
+                       Tout, hour, U_day, U_night, A_glass, m_dot_cp, heater_max_w):
+    # Torch port of model.calculate_heat_to_threshold, evaluated for the whole batch
+    Q_air = C_air * torch.clamp(setpoint - T_air, min=0.0)
+    Q_mass = C_mass * torch.clamp(setpoint - T_mass, min=0.0)
+    Q_soil = C_soil * torch.clamp(setpoint - T_soil, min=0.0)
+    T_avg = (T_air + setpoint) / 2.0
+
+    U_env = U_day if 6 <= hour <= 18 else U_night
+    Q_loss = U_env * A_glass * (T_avg - Tout) + m_dot_cp * (T_avg - Tout)
+
+    total_heat_needed = Q_air + Q_mass + Q_soil
+    net_heating_power = heater_max_w - torch.clamp(Q_loss, min=0.0)
+    safe_net = torch.where(net_heating_power > 0, net_heating_power, torch.ones_like(net_heating_power))
+    Q_losses_during_heating = torch.where(
+        net_heating_power > 0,
+        Q_loss * total_heat_needed / safe_net,
+        Q_loss * 3600.0,
+    )
+    Q_losses_during_heating = torch.where(heater_max_w > 0, Q_losses_during_heating, torch.zeros_like(Q_loss))
+
+    total_heat = torch.clamp(total_heat_needed + Q_losses_during_heating, min=0.0)
+    needed = has_setpoint & (T_air < setpoint)
+    return torch.where(needed, total_heat, torch.zeros_like(total_heat))
@@ -0,0 +1,211 @@
+"""
+Representative-day weather compression
+-----------------------------------------
+Estimates annual (or any long-period) heater energy and cold-hour counts
+from a handful of simulated days instead of every hour.
+
+1. Every day of the weather record becomes a feature vector: its 24-hour
+   Tout and solar profiles plus the mean Tout of the preceding days, so a
+   cold day inside a cold spell clusters apart from an isolated one.
+2. K-means groups the days; each cluster's weight is its number of days.
+3. From each cluster the day nearest the centroid plus a few random members
+   are simulated, each preceded by its real preceding day as warm-up. The
+   soil and thermal mass have time constants of weeks to months, so their
+   state entering each window comes from a coarse pass over the whole
+   record (implicit integrator, one step per hour), which keeps the
+   carry-over of cold spells and seasons. All sampled days then run as ONE
+   model.simulate_batch call with per-member weather and initial state.
+4. Period totals are the coarse pass's totals corrected by a stratified
+   estimate of the fine-minus-coarse difference (cluster mean difference x
+   cluster size), with a 95% error bound from the within-cluster spread of
+   that difference. Using the coarse pass as a control variate makes the
+   bound far tighter than sampling the fine values alone. The bound covers
+   sampling error only; windows starting from the coarse state add a small
+   systematic error (about 0.02 K on mean Tin in tests).
+
+For a year with 12 clusters and 3 samples each this is about 15x cheaper
+than simulate_greenhouse over every hour.
+"""
+
+import numpy as np
+import pandas as pd
+
+import model
+
+# scipy.stats and sklearn are imported where used: together they take longer
+# to import than the rest of the backend (see benchmarks/bench_startup.py)
+
+N_CLUSTERS = 12
+SAMPLES_PER_CLUSTER = 3
+WARMUP_DAYS = 1
+COARSE_SUBSTEPS = 1
+CONTEXT_DAYS = 3            # preceding days averaged into the clustering features
+DEFAULT_THRESHOLDS = [0.0, 5.0]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# DAY CLUSTERING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _whole_days(weather_df: pd.DataFrame) -> pd.DataFrame:
+    df = weather_df.copy()
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    day = df["datetime"].dt.floor("D")
+    full = day.map(day.value_counts()) == 24
+    return df[full].reset_index(drop=True)
+
+
+def day_features(weather_df: pd.DataFrame) -> tuple:
+    """(days, features): one row per whole day of 24 hourly Tout, 24 solar values and the preceding-days mean Tout."""
+    df = _whole_days(weather_df)
+    n_days = len(df) // 24
+    if n_days == 0:
+        raise ValueError("Weather needs at least one whole day")
+
+    Tout = df["Tout"].to_numpy(dtype=float).reshape(n_days, 24)
+    G = df["G"].to_numpy(dtype=float).reshape(n_days, 24)
+    daily_mean = Tout.mean(axis=1)
+    context = pd.Series(daily_mean).shift(1).rolling(CONTEXT_DAYS, min_periods=1).mean().bfill().to_numpy()
+
+    # Solar scaled so a clear day weighs about as much as a cold one
+    features = np.hstack([Tout, G / 50.0, np.repeat(context[:, None], 6, axis=1)])
+    days = df["datetime"].iloc[::24].reset_index(drop=True)
+    return days, features
+
+
+def cluster_days(features: np.ndarray, n_clusters: int = N_CLUSTERS, seed: int = 0) -> tuple:
+    """(labels, representative day index per cluster) — the representative is the member nearest its centroid."""
+    from sklearn.cluster import KMeans
+
+    n_clusters = min(n_clusters, len(features))
+    km = KMeans(n_clusters=n_clusters, n_init=4, random_state=seed).fit(features)
+    dist = np.linalg.norm(features - km.cluster_centers_[km.labels_], axis=1)
+    reps = [int(np.flatnonzero(km.labels_ == c)[np.argmin(dist[km.labels_ == c])]) for c in range(n_clusters)]
+    return km.labels_, reps
+
+
+def _sample_days(labels: np.ndarray, reps: list, samples_per_cluster: int, rng) -> list:
+    """(cluster, day index) pairs: the representative first, then random other members."""
+    picks = []
+    for c, rep in enumerate(reps):
+        others = np.flatnonzero(labels == c)
+        others = others[others != rep]
+        extra = rng.choice(others, size=min(len(others), samples_per_cluster - 1), replace=False)
+        picks += [(c, rep)] + [(c, int(d)) for d in extra]
+    return picks
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ESTIMATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _day_window(df: pd.DataFrame, day: int, warmup_days: int) -> pd.DataFrame:
+    # Real preceding days as warm-up; days near the start repeat day 0 so every window has the same length
+    idx = [max(0, d) for d in range(day - warmup_days, day + 1)]
+    return pd.concat([df.iloc[d * 24:(d + 1) * 24] for d in idx], ignore_index=True)
+
+
+def _window_params(params: dict, coarse: dict, day: int, warmup_days: int) -> dict:
+    """params starting from the coarse-pass state at the beginning of the window."""
+    first = day - warmup_days
+    if first <= 0:
+        return params
+    h = first * 24 - 1
+    return {
+        **params,
+        "T_init": float(coarse["Tin"][0, h]),
+        "T_mass_init": float(coarse["T_mass"][0, h]),
+        "T_soil_init": float(coarse["T_soil"][0, h]),
+    }
+
+
+def _day_stats(out: dict, thresholds: list) -> dict:
+    """Per-day statistics from (n, 24) arrays of hourly output."""
+    Tin = out["Tin"]
+    stats = {
+        "heater_kwh": out["Q_heater"].sum(axis=1) / 1000.0,
+        "latent_kwh": out["Q_latent"].sum(axis=1) / 1000.0,
+        "Tin_mean": Tin.mean(axis=1),
+    }
+    for t in thresholds:
+        stats[f"hours_below_{t:g}"] = (Tin < t).sum(axis=1).astype(float)
+    return stats
+
+
+def _stratified(values: np.ndarray, clusters: np.ndarray, sizes: np.ndarray) -> tuple:
+    """Total over all days and its 95% half-width, from per-cluster samples."""
+    from scipy.stats import t as student_t
+
+    total, var, dof = 0.0, 0.0, 0
+    for c, n_c in enumerate(sizes):
+        x = values[clusters == c]
+        total += n_c * x.mean()
+        if len(x) > 1:
+            # Finite-population correction: a cluster sampled in full has no error
+            var += n_c ** 2 * x.var(ddof=1) / len(x) * (1 - len(x) / n_c)
+            dof += len(x) - 1
+    # Student t, since each cluster contributes only a few samples to the spread
+    return total, float(student_t.ppf(0.975, max(dof, 1)) * np.sqrt(var))
+
+
+def estimate(weather_df: pd.DataFrame, params: dict, n_clusters: int = N_CLUSTERS,
+             samples_per_cluster: int = SAMPLES_PER_CLUSTER, warmup_days: int = WARMUP_DAYS,
+             thresholds: list = None, substeps: int = 60, integrator: str = "euler", seed: int = 0) -> dict:
+    """
+    Period totals (heater and latent kWh, hours below each Tin threshold) and
+    mean Tin for `params` over `weather_df`, estimated from representative
+    days. Every figure comes with a 95% half-width ("ci95").
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else [float(t) for t in thresholds]
+    df = _whole_days(weather_df)
+    days, features = day_features(df)
+    labels, reps = cluster_days(features, n_clusters, seed)
+    sizes = np.bincount(labels)
+
+    coarse = model.simulate_batch(df, [params], substeps=COARSE_SUBSTEPS, integrator="implicit")
+    picks = _sample_days(labels, reps, samples_per_cluster, np.random.default_rng(seed))
+    frames = [_day_window(df, d, warmup_days) for _, d in picks]
+    window_params = [_window_params(params, coarse, d, warmup_days) for _, d in picks]
+    out = model.simulate_batch(frames, window_params, substeps=substeps, integrator=integrator)
+
+    n_days = len(days)
+    fine = _day_stats({k: out[k][:, -24:] for k in ("Tin", "Q_heater", "Q_latent")}, thresholds)
+    rough = _day_stats({k: coarse[k][0].reshape(n_days, 24) for k in ("Tin", "Q_heater", "Q_latent")}, thresholds)
+    sampled = np.array([d for _, d in picks])
+    clusters = np.array([c for c, _ in picks])
+
+    estimates = {}
+    for name in fine:
+        correction, half = _stratified(fine[name] - rough[name][sampled], clusters, sizes)
+        total = rough[name].sum() + correction
+        if name == "Tin_mean":
+            total, half = total / n_days, half / n_days
+        estimates[name] = {"value": float(total), "ci95": float(half)}
+
+    return {
+        "estimates": estimates,
+        "days": n_days,
+        "days_simulated": len(picks) * (warmup_days + 1),
+        "clusters": [
+            {
+                "representative_day": str(days[rep].date()),
+                "weight_days": int(sizes[c]),
+                "mean_Tout": float(features[labels == c, :24].mean()),
+            }
+            for c, rep in enumerate(reps)
+        ],
+    }
+
+
+def exact(weather_df: pd.DataFrame, params: dict, thresholds: list = None) -> dict:
+    """The same figures from a full simulate_greenhouse run, for checking estimate()."""
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else [float(t) for t in thresholds]
+    result_df = model.simulate_greenhouse(_whole_days(weather_df), params)
+    out = {
+        "heater_kwh": float(result_df["Q_heater"].sum() / 1000.0),
+        "latent_kwh": float(result_df["Q_latent"].sum() / 1000.0),
+        "Tin_mean": float(result_df["Tin"].mean()),
+    }
+    for t in thresholds:
+        out[f"hours_below_{t:g}"] = float((result_df["Tin"] < t).sum())
+    return out
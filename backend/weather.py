@@ -1,16 +1,62 @@
-import requests
+import os
+import time
+import threading
 import pandas as pd
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 
+import metrics
+
 logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s")
 
-def get_weather(location: dict, start_date: str, end_date: str, timezone: str = "auto") -> pd.DataFrame:
+# Overridable so load tests can point the backend at a local stand-in
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+
+WEATHER_COLUMNS = ["datetime", "Tout", "G", "RH"]
+WEATHER_SOURCES = ("routed", "archive", "forecast")
+
+# Successful fetches are reused for a while so repeated runs over the same
+# location and dates do not hit Open-Meteo again
+WEATHER_CACHE_TTL = float(os.environ.get("WEATHER_CACHE_TTL", 900))
+WEATHER_CACHE_SIZE = int(os.environ.get("WEATHER_CACHE_SIZE", 128))
+
+# Long ranges are fetched as calendar-year chunks in parallel. Days older
+# than ARCHIVE_LAG_DAYS come from the archive (reanalysis, published a few
+# days late), later ones from the forecast API.
+ARCHIVE_LAG_DAYS = int(os.environ.get("WEATHER_ARCHIVE_LAG_DAYS", 5))
+FETCH_WORKERS = int(os.environ.get("WEATHER_FETCH_WORKERS", 8))
+MAX_GAP_HOURS = 6           # missing stretches up to this long are interpolated, longer ones fail the fetch
+
+_cache = OrderedDict()      # key → (fetched_at, DataFrame)
+_cache_lock = threading.Lock()
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < WEATHER_CACHE_TTL:
+            _cache.move_to_end(key)
+            metrics.record_cache("weather", True)
+            return entry[1].copy()
+        _cache.pop(key, None)
+    metrics.record_cache("weather", False)
+    return None
+
+def _cache_put(key, df: pd.DataFrame):
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), df)
+        _cache.move_to_end(key)
+        while len(_cache) > WEATHER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _fetch_hourly(base_url: str, location: dict, start_date: str, end_date: str, timezone: str = "auto") -> pd.DataFrame:
     lat, lon = location["lat"], location["lon"]
 
     url = (
-        f"https://api.open-meteo.com/v1/forecast?"
+        f"{base_url}?"
         f"latitude={lat}&longitude={lon}"
         f"&hourly=temperature_2m,shortwave_radiation,relativehumidity_2m"
         f"&start_date={start_date}&end_date={end_date}"
@@ -19,24 +65,176 @@ def get_weather(location: dict, start_date: str, end_date: str, timezone: str =
 
     logging.info(f"Fetching weather data: {url}")
 
-    try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+    # Imported on first fetch: requests and its certificate bundle add ~50 ms to backend startup
+    import requests
+    r = requests.get(url, timeout=10)
+    r.raise_for_status()
+    data = r.json()
+
+    if "hourly" not in data or "time" not in data["hourly"]:
+        raise ValueError("Invalid data format from API")
+
+    df = pd.DataFrame({
+        "datetime": pd.to_datetime(data["hourly"]["time"]),
+        "Tout": data["hourly"]["temperature_2m"],
+        "G": data["hourly"]["shortwave_radiation"],
+        "RH": np.array(data["hourly"].get("relativehumidity_2m", [50]*len(data["hourly"]["time"])), dtype=float) / 100.0
+    })
+
+    logging.info(f"Retrieved {len(df)} hourly entries.")
+    return df
+
+def plan_chunks(start_date: str, end_date: str, today=None, source: str = "routed") -> list:
+    """
+    [(base_url, start, end)] covering start_date..end_date: split at the
+    archive/forecast cutoff as of `today`, then at calendar years.
+    source="archive" or "forecast" skips the split and uses that API only.
+    """
+    if source not in WEATHER_SOURCES:
+        raise ValueError(f"Unknown weather source '{source}', expected one of {WEATHER_SOURCES}")
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    if end < start:
+        return []
+    cutoff = pd.Timestamp(today or datetime.now()).normalize() - pd.Timedelta(days=ARCHIVE_LAG_DAYS)
+
+    segments = []
+    if source == "archive" or (source == "routed" and end <= cutoff):
+        segments.append((ARCHIVE_URL, start, end))
+    elif source == "forecast" or start > cutoff:
+        segments.append((FORECAST_URL, start, end))
+    else:
+        segments += [(ARCHIVE_URL, start, cutoff), (FORECAST_URL, cutoff + pd.Timedelta(days=1), end)]
+
+    chunks = []
+    for url, seg_start, seg_end in segments:
+        for year in range(seg_start.year, seg_end.year + 1):
+            chunk_start = max(seg_start, pd.Timestamp(year=year, month=1, day=1))
+            chunk_end = min(seg_end, pd.Timestamp(year=year, month=12, day=31))
+            chunks.append((url, str(chunk_start.date()), str(chunk_end.date())))
+    return chunks
+
+def stitch(frames: list, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    Concatenate chunk frames onto one hourly axis from start_date 00:00 to
+    end_date 23:00. Gaps and missing values up to MAX_GAP_HOURS are
+    interpolated; a longer one raises ValueError.
+    """
+    df = pd.concat(frames, ignore_index=True)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    df = df.drop_duplicates("datetime").set_index("datetime").sort_index()
+    expected = pd.date_range(pd.Timestamp(start_date).normalize(),
+                             pd.Timestamp(end_date).normalize() + pd.Timedelta(hours=23), freq="h")
+    df = df.reindex(expected)
 
-        if "hourly" not in data or "time" not in data["hourly"]:
-            raise ValueError("Invalid data format from API")
+    missing = df[["Tout", "G", "RH"]].isna().any(axis=1).to_numpy()
+    if missing.any():
+        # Longest run of consecutive missing hours
+        edges = np.flatnonzero(np.diff(np.r_[0, missing.astype(np.int8), 0]))
+        lengths = edges[1::2] - edges[::2]
+        longest = int(lengths.argmax())
+        if lengths[longest] > MAX_GAP_HOURS:
+            raise ValueError(f"Weather is missing {lengths[longest]} hours from {expected[edges[::2][longest]]}")
+        df = df.interpolate(method="time", limit_direction="both")
 
-        df = pd.DataFrame({
-            "datetime": pd.to_datetime(data["hourly"]["time"]),
-            "Tout": data["hourly"]["temperature_2m"],
-            "G": data["hourly"]["shortwave_radiation"],
-            "RH": np.array(data["hourly"].get("relativehumidity_2m", [50]*len(data["hourly"]["time"]))) / 100.0
-        })
+    return df.rename_axis("datetime").reset_index()[WEATHER_COLUMNS]
 
-        logging.info(f"Retrieved {len(df)} hourly entries.")
-        return df
+def get_weather(location: dict, start_date: str, end_date: str, timezone: str = "auto",
+                source: str = "routed", routed_on=None) -> pd.DataFrame:
+    """
+    Hourly weather for start_date..end_date (inclusive), from the archive for
+    days older than ARCHIVE_LAG_DAYS before `routed_on` (default today) and
+    the forecast API for later ones, fetched in concurrent year-sized chunks.
+    source="forecast" fetches everything from the forecast API, as runs
+    stored before the archive routing were. Returns an empty frame if any
+    chunk fails.
+    """
+    return _get_range(location, start_date, end_date, timezone, source, routed_on)
+
+def get_archive_weather(location: dict, start_date: str, end_date: str, timezone: str = "auto") -> pd.DataFrame:
+    """get_weather from the archive only, e.g. for past years in an ensemble."""
+    return _get_range(location, start_date, end_date, timezone, source="archive")
+
+def _get_range(location: dict, start_date: str, end_date: str, timezone: str, source: str = "routed",
+               routed_on=None) -> pd.DataFrame:
+    chunks = plan_chunks(start_date, end_date, today=routed_on, source=source)
+    if not chunks:
+        return pd.DataFrame(columns=WEATHER_COLUMNS)
+    if len(chunks) == 1:
+        frames = [_get_cached(chunks[0][0], location, chunks[0][1], chunks[0][2], timezone)]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(chunks)))) as pool:
+            frames = list(pool.map(lambda c: _get_cached(c[0], location, c[1], c[2], timezone), chunks))
+    if any(df.empty for df in frames):
+        return pd.DataFrame(columns=WEATHER_COLUMNS)
+
+    try:
+        return stitch(frames, start_date, end_date)
+    except ValueError as e:
+        logging.error(f"Weather for {start_date}..{end_date} rejected: {e}")
+        metrics.inc("greenhouse_weather_fetch_failures_total")
+        return pd.DataFrame(columns=WEATHER_COLUMNS)
+
+def _get_cached(base_url: str, location: dict, start_date: str, end_date: str, timezone: str) -> pd.DataFrame:
+    key = (base_url, location["lat"], location["lon"], str(start_date), str(end_date), timezone)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        df = _fetch_hourly(base_url, location, start_date, end_date, timezone)
 
     except Exception as e:
         logging.error(f"Failed to fetch weather data: {e}")
-        return pd.DataFrame(columns=["datetime", "Tout", "G", "RH"])
\ No newline at end of file
+        metrics.inc("greenhouse_weather_fetch_failures_total")
+        return pd.DataFrame(columns=WEATHER_COLUMNS)
+
+    _cache_put(key, df)
+    return df.copy()
+
+def iter_archive_weather(location: dict, start_date: str, end_date: str, timezone: str = "auto"):
+    """
+    Yield historical weather for [start_date, end_date] one calendar year at a time,
+    so multi-year and multi-decade runs never hold more than a year in memory.
+    Unlike get_weather, failures raise instead of yielding an empty frame, since a
+    silently missing year would corrupt a long continuous simulation. Each year is
+    put on a full hourly axis by stitch: short gaps are interpolated and one longer
+    than MAX_GAP_HOURS raises ValueError, so no hour is silently dropped.
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+
+    for year in range(start.year, end.year + 1):
+        chunk_start = max(start, pd.Timestamp(year=year, month=1, day=1))
+        chunk_end = min(end, pd.Timestamp(year=year, month=12, day=31))
+        df = _fetch_hourly(ARCHIVE_URL, location, chunk_start.date(), chunk_end.date(), timezone)
+        yield stitch([df], chunk_start, chunk_end)
+
+def synthetic_weather(start_date: str, hours: int, lat: float = 42.0, seed: int = 0) -> pd.DataFrame:
+    """
+    Deterministic hourly weather (seasonal + diurnal temperature, clear-sky solar
+    scaled by a daily cloudiness, humidity) for offline benchmarks and load tests.
+    The same arguments always give the same series.
+    """
+    idx = pd.date_range(start_date, periods=hours, freq="h")
+    doy = idx.dayofyear.to_numpy()
+    hour = idx.hour.to_numpy()
+    day = (idx.normalize() - idx[0].normalize()).days.to_numpy() if hours else np.zeros(0, dtype=int)
+
+    rng = np.random.default_rng(seed)
+    n_days = int(day.max()) + 1 if hours else 0
+    anomaly = np.convolve(rng.normal(0.0, 4.0, n_days + 4), np.ones(5) / 5, mode="valid")[:n_days]
+    clearness = rng.uniform(0.25, 1.0, n_days)
+
+    season = -np.cos(2 * np.pi * (doy - 20) / 365.0)
+    Tout = 9.0 + 13.0 * season + 5.0 * np.sin(2 * np.pi * (hour - 9) / 24.0) + anomaly[day]
+
+    decl = np.radians(23.44) * np.sin(2 * np.pi * (284 + doy) / 365.0)
+    hour_angle = np.radians(15.0 * (hour - 12))
+    phi = np.radians(lat)
+    sin_alt = np.sin(phi) * np.sin(decl) + np.cos(phi) * np.cos(decl) * np.cos(hour_angle)
+    G = 1000.0 * np.clip(sin_alt, 0.0, None) * clearness[day]
+
+    RH = np.clip(0.75 - 0.2 * np.sin(2 * np.pi * (hour - 9) / 24.0) + 0.1 * (1 - clearness[day]), 0.2, 1.0)
+
+    return pd.DataFrame({"datetime": idx, "Tout": Tout, "G": G, "RH": RH})